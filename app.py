@@ -5,9 +5,12 @@ import psutil
 import discord
 from datetime import datetime, timedelta
 from functools import wraps
-from pymongo import MongoClient
+from utils.mongo import get_client, DATABASE_NAME, MONGO_MAX_POOL_SIZE, command_stats as mongo_command_stats
+from utils.metrics import render_metrics, is_authorized as metrics_authorized
+from utils.watchdog import loop_watchdog
+from utils.tracing import tracer
 
-from flask import Flask, render_template, redirect, url_for, request, flash, jsonify, session
+from flask import Flask, Response, render_template, redirect, url_for, request, flash, jsonify, session
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -15,8 +18,8 @@ from werkzeug.security import generate_password_hash, check_password_hash
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create Flask app
-app = Flask(__name__)
+# Create Flask app (the page templates live in temp/templates)
+app = Flask(__name__, template_folder="temp/templates")
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-key-replace-in-production")
 
 # Configure Flask-Login
@@ -27,9 +30,9 @@ login_manager.login_view = 'login'
 # MongoDB connection
 MONGO_URI = os.getenv("MONGO_URI")
 try:
-    mongo_client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+    mongo_client = get_client(MONGO_URI)  # Shared with the bot when both run in one process
     mongo_client.server_info()  # Test connection
-    db = mongo_client['discord_economy']  # Use the database name explicitly
+    db = mongo_client[DATABASE_NAME]
     
     # Force access to a collection to validate connection further
     test_collection = db.list_collection_names()
@@ -401,11 +404,18 @@ def get_detailed_system_stats():
             stats["mongo_document_count"] = f"{db_stats.get('objects', 0):,}"
             stats["mongo_connection_type"] = "Direct"
             stats["mongo_host"] = MONGO_URI.split('@')[-1] if MONGO_URI else "Unknown"
-            stats["mongo_pool_size"] = 10  # Default value
+            stats["mongo_pool_size"] = MONGO_MAX_POOL_SIZE
             
-            # These would require custom monitoring in production
-            stats["mongo_avg_query_time"] = "-"
-            stats["mongo_queries_per_second"] = "-"
+            # Measured by the command listener on the shared Mongo client
+            histograms = mongo_command_stats.histograms().values()
+            query_count = sum(histogram.count for histogram in histograms)
+            if query_count:
+                total_time = sum(histogram.total for histogram in histograms)
+                stats["mongo_avg_query_time"] = f"{total_time / query_count * 1000:.1f} ms"
+                stats["mongo_queries_per_second"] = f"{mongo_command_stats.rate():.2f}"
+            else:
+                stats["mongo_avg_query_time"] = "-"
+                stats["mongo_queries_per_second"] = "-"
         except Exception as e:
             logger.error(f"Error getting MongoDB stats: {e}")
             stats["mongo_db_size"] = "- MB"
@@ -488,15 +498,46 @@ def server_stats():
         discord_channels_calls=stats["discord_channels_calls"],
         discord_channels_response=stats["discord_channels_response"],
         cpu_cores=stats["cpu_cores"],
-        system_events=system_events
+        system_events=system_events,
+        loop_blocking=loop_watchdog.stats(),
+        blocking_offenders=loop_watchdog.top_offenders()
     )
 
+@app.route('/api/blocking')
+@login_required
+@admin_required
+def api_blocking():
+    """Commands that blocked the bot's event loop, worst first, with their captured stacks"""
+    return jsonify({
+        **loop_watchdog.stats(),
+        "offenders": loop_watchdog.top_offenders(),
+        "recent": loop_watchdog.recent_blocks()
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint for this process (includes the bot when it runs here too)."""
+    if not metrics_authorized(request.headers.get("Authorization")):
+        return Response(status=401)
+    return Response(render_metrics(bot), mimetype="text/plain")
+
 @app.route('/commands')
 @login_required
 @admin_required
 def commands():
-    # In a real app, fetch command usage stats from MongoDB
-    return render_template('commands.html')
+    # Per-command latency breakdown from the bot's traces (empty unless the bot runs in this process)
+    return render_template('commands.html', commands=tracer.summary(), traced=tracer.traces)
+
+@app.route('/api/commands')
+@login_required
+@admin_required
+def api_commands():
+    """Per-command latency breakdown - used for AJAX updates"""
+    return jsonify({
+        "traced": tracer.traces,
+        "sample_rate": tracer.sample_rate,
+        "commands": tracer.summary()
+    })
 
 @app.route('/settings')
 @login_required
@@ -0,0 +1,446 @@
+"""
+Command throughput benchmark: drives the economy cogs end to end.
+
+Each command runs through the cog's own code path (Work, Daily, Steal, Deposit,
+Shop._buy_item, Leaderboard and Roulette) with fake Context/Interaction objects
+standing in for Discord, at a configurable concurrency. Runs against the
+in-memory backend by default, or a local MongoDB with --mongo-uri (a scratch
+database that is dropped afterwards). Command cooldowns are bypassed.
+
+Reports per command: commands/sec, p50/p99 latency, and MongoDB operations per
+command (from utils.mongo.command_stats). --save writes the results as a
+baseline; --compare checks them against one and exits non-zero if any command
+got slower or chattier than --tolerance allows.
+
+Usage:
+    python -m benchmarks.command_throughput [--commands 2000] [--concurrency 50] [--users 1000]
+        [--only work,steal] [--mongo-uri mongodb://localhost:27017]
+        [--save baseline.json] [--compare baseline.json] [--tolerance 0.2]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCHMARK_DATABASE = "command_benchmark"
+GUILD_ID = 1
+FIRST_USER_ID = 10**17
+SHOP_STOCK = 10**9  # Effectively unlimited, so every buy takes the purchase path
+ROULETTE_CHANNELS = 20  # Channels running roulette rounds side by side
+ROULETTE_PLAYERS = 100  # Roulette has its own well-funded players, so steal and buy can't drain them
+
+# --- Fake Discord objects -------------------------------------------------------
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f"user{user_id - FIRST_USER_ID}"
+        self.display_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+
+class FakeMessage:
+    _ids = itertools.count(1)
+
+    def __init__(self, channel):
+        self.id = next(self._ids)
+        self.channel = channel
+
+class FakeChannel:
+    """Text channel whose sends take `latency` seconds, like a Discord REST call."""
+    def __init__(self, guild, latency, channel_id=None):
+        self.id = channel_id or guild.id
+        self.guild = guild
+        self.latency = latency
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent += 1
+        return FakeMessage(self)
+
+class FakeGuild:
+    def __init__(self, guild_id, members):
+        self.id = guild_id
+        self.name = "Benchmark Guild"
+        self.members = members
+        self._members = {member.id: member for member in members}
+
+    def get_member(self, user_id):
+        return self._members.get(user_id)
+
+class FakeBot:
+    def __init__(self, guild):
+        self.guild = guild
+
+    def get_user(self, user_id):
+        return self.guild.get_member(user_id)
+
+    async def fetch_user(self, user_id):
+        return self.guild.get_member(user_id) or FakeUser(user_id)
+
+class FakeContext:
+    """Just enough of commands.Context for the cogs: author, guild, channel and send()."""
+    def __init__(self, author, channel):
+        self.author = author
+        self.guild = channel.guild
+        self.channel = channel
+
+    async def send(self, *args, **kwargs):
+        return await self.channel.send(*args, **kwargs)
+
+class FakeResponse:
+    def __init__(self, channel):
+        self.channel = channel
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def send_message(self, *args, **kwargs):
+        self._done = True
+        await self.channel.send(*args, **kwargs)
+
+    async def edit_message(self, *args, **kwargs):
+        self._done = True
+
+    async def defer(self, *args, **kwargs):
+        self._done = True
+
+def _fake_interaction_class():
+    import discord
+
+    class FakeInteraction(discord.Interaction):
+        """Passes the cogs' isinstance(..., discord.Interaction) checks without a gateway."""
+        def __init__(self, user, channel):
+            self.user = user
+            self.channel = channel
+            self.guild_id = channel.guild.id
+            self._fake_guild = channel.guild
+            self._fake_response = FakeResponse(channel)
+            self._fake_followup = channel
+            self._fake_message = None
+
+        @property
+        def guild(self):
+            return self._fake_guild
+
+        @property
+        def response(self):
+            return self._fake_response
+
+        @property
+        def followup(self):
+            return self._fake_followup
+
+        async def original_response(self):
+            if self._fake_message is None:
+                self._fake_message = FakeMessage(self.channel)
+            return self._fake_message
+
+    return FakeInteraction
+
+# --- Scenario ---------------------------------------------------------------------
+
+class Scenario:
+    def __init__(self, users, latency):
+        from commands.economy.daily import Daily
+        from commands.economy.deposit import Deposit
+        from commands.economy.leaderboard import Leaderboard
+        from commands.economy.roulette import Roulette
+        from commands.economy.shop import Shop
+        from commands.economy.steal import Steal
+        from commands.economy.work import Work
+
+        self.members = [FakeUser(FIRST_USER_ID + i) for i in range(users)]
+        # Ids far above the members and daily claimants
+        self.gamblers = [FakeUser(FIRST_USER_ID + 10**9 + i) for i in range(ROULETTE_PLAYERS)]
+        self.guild = FakeGuild(GUILD_ID, self.members)
+        self.channel = FakeChannel(self.guild, latency)
+        self.roulette_channels = [FakeChannel(self.guild, latency, 1000 + i) for i in range(ROULETTE_CHANNELS)]
+        self.bot = FakeBot(self.guild)
+        self.interaction_class = _fake_interaction_class()
+        self._calls = itertools.count()
+        self._claimants = itertools.count()
+
+        self.work = Work(self.bot)
+        self.daily = Daily(self.bot)
+        self.steal = Steal(self.bot)
+        self.deposit = Deposit(self.bot)
+        self.shop = Shop(self.bot)
+        self.leaderboard = Leaderboard(self.bot)
+        self.roulette = Roulette(self.bot)
+        self.shop_items = []
+
+    def invoker(self, user=None, channel=None):
+        """Alternate between prefix and slash invocations for a random (or given) member."""
+        user = user or random.choice(self.members)
+        channel = channel or self.channel
+        if next(self._calls) % 2:
+            return self.interaction_class(user, channel)
+        return FakeContext(user, channel)
+
+    async def seed(self):
+        from utils.database import DatabaseConnection
+        from utils.database_async import rebuild_rank_index, run_in_db_executor
+        from utils.shop_catalog import shop_catalog
+
+        economies = DatabaseConnection.get_instance().economies
+        accounts = []
+        for member in self.members:
+            pocket, bank = random.randint(50000, 500000), random.randint(0, 10000)
+            accounts.append({
+                "user_id": str(member.id), "pocket": pocket, "bank": bank, "bank_limit": 10000,
+                "luck": 1.0, "items": {}, "timed_items": [], "networth": pocket + bank
+            })
+        for gambler in self.gamblers:
+            accounts.append({
+                "user_id": str(gambler.id), "pocket": 10**12, "bank": 0, "bank_limit": 10000,
+                "luck": 1.0, "items": {}, "timed_items": [], "networth": 10**12
+            })
+        await run_in_db_executor(economies.insert_many, accounts, ordered=False)
+
+        # Restock everything so buys never run out mid-run
+        await shop_catalog.load()
+        items = await shop_catalog.items()
+        for item in items:
+            item["stock"] = SHOP_STOCK
+        shop = DatabaseConnection.get_instance().shop
+        await run_in_db_executor(shop.update_one, {"id": "current_shop"}, {"$set": {"items": items}})
+        self.shop_items = [item["id"] for item in items]
+
+        # The bot loads the rank index at startup; so does the benchmark
+        await rebuild_rank_index()
+
+    async def run_work(self):
+        invoker = self.invoker()
+        if isinstance(invoker, FakeContext):
+            await self.work.do_work_prefix(invoker)
+        else:
+            await self.work.do_work_slash(invoker)
+
+    async def run_daily(self):
+        # A new claimant each time, so every call takes the claim path past the daily cooldown
+        claimant = FakeUser(FIRST_USER_ID + len(self.members) + next(self._claimants))
+        await self.daily._claim_daily(self.invoker(claimant))
+
+    async def run_steal(self):
+        thief, target = random.sample(self.members, 2)
+        await self.steal._do_steal(self.invoker(thief), thief, target)
+
+    async def run_deposit(self):
+        await self.deposit._do_deposit(self.invoker(), str(random.randint(1, 1000)))
+
+    async def run_buy(self):
+        await self.shop._buy_item(self.invoker(), random.choice(self.shop_items))
+
+    async def run_leaderboard(self):
+        await self.leaderboard._show_leaderboard(self.invoker())
+
+    async def run_roulette(self):
+        from commands.economy.roulette import BetView
+
+        # Open or join the round in a random channel
+        channel = random.choice(self.roulette_channels)
+        user = random.choice(self.gamblers)
+        await self.roulette.start_roulette(self.invoker(user, channel), "100")
+
+        # Then place the bet through the select menus, as the player would
+        game = self.roulette.engine.get(channel.id)
+        if game is None:
+            return  # The round's timer fired while the start was being answered
+        view = BetView(self.bot, game, 100)
+        view.children[0]._values = [random.choice(["Red", "Black", "Green"])]
+        await view.select_callback(self.interaction_class(user, channel))
+
+    async def settle_roulette(self):
+        """Spin every open round at once instead of waiting out the betting window."""
+        rounds = list(self.roulette.engine.rounds.values())
+        bets = sum(len(bets) for game in rounds for bets in game.bets.values())
+        start = time.perf_counter()
+        await self.roulette.engine.settle(rounds)
+        return len(rounds), bets, time.perf_counter() - start
+
+COMMANDS = {
+    "work": Scenario.run_work,
+    "daily": Scenario.run_daily,
+    "steal": Scenario.run_steal,
+    "deposit": Scenario.run_deposit,
+    "buy": Scenario.run_buy,
+    "leaderboard": Scenario.run_leaderboard,
+    "roulette": Scenario.run_roulette,
+}
+
+# --- Measurement ------------------------------------------------------------------
+
+def db_operations():
+    from utils.mongo import command_stats
+    return sum(histogram.count for histogram in command_stats.histograms().values())
+
+async def run_command(scenario, name, count, concurrency):
+    from utils.query_stats import LatencyHistogram
+
+    run = COMMANDS[name]
+    histogram = LatencyHistogram()
+    remaining = iter(range(count))
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                await run(scenario)
+            except Exception as e:
+                errors += 1
+                print(f"{name} raised: {e!r}")
+            histogram.record(time.perf_counter() - start)
+
+    operations = db_operations()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "commands": count,
+        "errors": errors,
+        "throughput": count / elapsed,
+        "p50": histogram.percentile(0.50),
+        "p99": histogram.percentile(0.99),
+        "db_ops": (db_operations() - operations) / count,
+    }
+
+def print_results(results, baseline=None):
+    print(f"{'command':<14}{'cmds/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'db ops':>8}{'errors':>8}")
+    for name, result in results.items():
+        line = (
+            f"{name:<14}{result['throughput']:>10.0f}{result['p50'] * 1000:>10.2f}"
+            f"{result['p99'] * 1000:>10.2f}{result['db_ops']:>8.2f}{result['errors']:>8}"
+        )
+        previous = (baseline or {}).get(name)
+        if previous:
+            line += (
+                f"   vs baseline: {_change(result['throughput'], previous['throughput'])} cmds/s,"
+                f" {_change(result['p99'], previous['p99'])} p99,"
+                f" {result['db_ops'] - previous['db_ops']:+.2f} db ops"
+            )
+        print(line)
+
+def _change(current, previous):
+    return f"{(current / previous - 1) * 100:+.0f}%" if previous else "n/a"
+
+def find_regressions(results, baseline, tolerance):
+    """Commands that got slower, less scalable or chattier than the baseline allows."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if result["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous['throughput']:.0f} -> {result['throughput']:.0f} cmds/s")
+        if result["p99"] > previous["p99"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {previous['p99'] * 1000:.2f} -> {result['p99'] * 1000:.2f} ms")
+        # Random branches (e.g. getting caught stealing) make op counts jitter slightly
+        if result["db_ops"] > previous["db_ops"] * (1 + tolerance) + 0.1:
+            regressions.append(f"{name}: db ops/command {previous['db_ops']:.2f} -> {result['db_ops']:.2f}")
+    return regressions
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def bench(args, names):
+    scenario = Scenario(args.users, args.send_latency / 1000)
+    await scenario.seed()
+
+    results = {}
+    for name in names:
+        results[name] = await run_command(scenario, name, args.commands, args.concurrency)
+
+    if "roulette" in names:
+        rounds, bets, elapsed = await scenario.settle_roulette()
+        print(f"roulette settlement: {rounds} rounds, {bets} bets in {elapsed * 1000:.1f} ms")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--commands", type=int, default=2000, help="invocations per command")
+    parser.add_argument("--concurrency", type=int, default=50, help="commands in flight at once")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--only", help="comma-separated subset of: " + ", ".join(COMMANDS))
+    parser.add_argument("--send-latency", type=float, default=0.0, help="simulated Discord send latency (ms)")
+    parser.add_argument("--mongo-uri", help="benchmark a local MongoDB instead of the in-memory backend")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="baseline to check the results against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(COMMANDS)
+    unknown = [name for name in names if name not in COMMANDS]
+    if unknown:
+        parser.error(f"unknown commands: {', '.join(unknown)}")
+    random.seed(args.seed)
+
+    # Must be set before utils.mongo is imported
+    if args.mongo_uri:
+        os.environ["MONGO_BACKEND"] = "mongo"
+        os.environ["MONGO_URI"] = args.mongo_uri
+        os.environ["MONGO_DATABASE"] = BENCHMARK_DATABASE
+    else:
+        os.environ["MONGO_BACKEND"] = "memory"
+
+    from utils.mongo import get_database
+    from utils.database_async import shutdown
+
+    try:
+        results = asyncio.run(bench(args, names))
+    finally:
+        if args.mongo_uri:
+            get_database(BENCHMARK_DATABASE).client.drop_database(BENCHMARK_DATABASE)
+        shutdown()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"comparing against {args.compare} (commit {baseline.get('commit') or 'unknown'})")
+
+    print(f"backend: {'mongo' if args.mongo_uri else 'memory'}, concurrency {args.concurrency}, "
+          f"{args.commands} commands each, {args.users} users")
+    print_results(results, baseline and baseline["results"])
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({
+                "commit": current_commit(),
+                "created": time.time(),
+                "backend": "mongo" if args.mongo_uri else "memory",
+                "concurrency": args.concurrency,
+                "commands": args.commands,
+                "users": args.users,
+                "results": results
+            }, f, indent=2)
+        print(f"baseline saved to {args.save}")
+
+    if baseline:
+        regressions = find_regressions(results, baseline["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
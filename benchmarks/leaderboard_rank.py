@@ -0,0 +1,118 @@
+"""
+Leaderboard benchmark: in-memory rank index vs. the MongoDB leaderboard queries.
+
+Seeds a scratch database with random accounts, then times the top-10 and
+"your rank" lookups that Leaderboard._show_leaderboard performs, once through
+MongoDB and once through utils.rank_index. The MongoDB half runs against
+MONGO_URI when it is set and against the in-memory backend otherwise.
+
+Usage:
+    python -m benchmarks.leaderboard_rank [--users 100000] [--guild-size 20000] [--rounds 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.rank_index import RankIndex
+
+BENCHMARK_DATABASE = "rank_benchmark"
+
+def make_accounts(count):
+    return [
+        {
+            "user_id": str(10**17 + i),
+            "pocket": random.randint(0, 50000),
+            "bank": random.randint(0, 200000),
+        }
+        for i in range(count)
+    ]
+
+def report(label, timings):
+    timings = sorted(timings)
+    mean = sum(timings) / len(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{label:<32} mean {mean * 1e6:>10.1f} us   p99 {p99 * 1e6:>10.1f} us")
+
+def bench_rank_index(accounts, member_ids, rounds):
+    index = RankIndex()
+
+    start = time.perf_counter()
+    index.load(accounts)
+    print(f"rank index load: {len(accounts)} accounts in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    index.track_guild("1", member_ids)
+    print(f"rank index guild track: {len(member_ids)} members in {time.perf_counter() - start:.3f}s")
+
+    leaderboard, updates = [], []
+    for _ in range(rounds):
+        user_id = random.choice(member_ids)
+
+        start = time.perf_counter()
+        index.top(10, "1")
+        index.rank(user_id, "1")
+        index.networth(user_id)
+        leaderboard.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        index.update(user_id, random.randint(0, 50000), random.randint(0, 200000))
+        updates.append(time.perf_counter() - start)
+
+    report("rank index leaderboard", leaderboard)
+    report("rank index update", updates)
+
+async def bench_mongo(accounts, member_ids, rounds):
+    from pymongo import InsertOne
+    from utils.mongo import get_database
+    from commands.economy.leaderboard import Leaderboard
+
+    db = get_database(BENCHMARK_DATABASE)
+    db.economies.drop()
+    db.economies.bulk_write([
+        InsertOne({**account, "networth": account["pocket"] + account["bank"]}) for account in accounts
+    ], ordered=False)
+    db.economies.create_index([("user_id", 1)])
+    db.economies.create_index([("networth", -1), ("user_id", 1)])
+
+    # Drive the cog's own query path against the scratch database
+    cog = Leaderboard(bot=None)
+    cog.db = db
+    guild = SimpleNamespace(id=1)
+
+    try:
+        timings = []
+        for _ in range(rounds):
+            user_id = random.choice(member_ids)
+            start = time.perf_counter()
+            await cog._top_members(guild, member_ids, user_id)
+            timings.append(time.perf_counter() - start)
+        report("mongo leaderboard", timings)
+    finally:
+        db.economies.drop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--guild-size", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    accounts = make_accounts(args.users)
+    member_ids = [account["user_id"] for account in random.sample(accounts, min(args.guild_size, args.users))]
+
+    bench_rank_index(accounts, member_ids, args.rounds)
+
+    # Must be set before utils.mongo is imported
+    if not os.getenv("MONGO_URI"):
+        os.environ["MONGO_BACKEND"] = "memory"
+        print("MONGO_URI not set; timing the MongoDB leaderboard path on the in-memory backend")
+    asyncio.run(bench_mongo(accounts, member_ids, args.rounds))
+
+if __name__ == "__main__":
+    main()
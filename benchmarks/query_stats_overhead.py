@@ -0,0 +1,81 @@
+"""
+Overhead benchmark for utils.query_stats.QueryPerformanceTracker.
+
+Measures the per-call cost of record_query on the fast path (no slow-query
+capture), single-threaded and with several threads recording at once, and
+checks it against OVERHEAD_BUDGET_NS. Exits non-zero if the budget is exceeded.
+
+Usage:
+    python -m benchmarks.query_stats_overhead [--calls 200000] [--threads 4]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.query_stats import OVERHEAD_BUDGET_NS, QueryPerformanceTracker
+
+OPERATIONS = [("economies", "balance"), ("economies", "update"), ("shop", "items"), ("feedback", "insert")]
+
+def record_many(tracker, calls, durations):
+    details = lambda: {"args": "never built on the fast path"}
+    for i in range(calls):
+        collection, operation = OPERATIONS[i & 3]
+        tracker.record_query(collection, operation, durations[i & 1023], details)
+
+def loop_baseline(calls, durations):
+    for i in range(calls):
+        collection, operation = OPERATIONS[i & 3]
+        durations[i & 1023]
+
+def per_call_ns(func, calls):
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) / calls * 1e9
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    # Realistic latencies, all under the slow-query threshold
+    durations = [random.lognormvariate(-7, 1) for _ in range(1024)]
+
+    baseline = per_call_ns(lambda: loop_baseline(args.calls, durations), args.calls)
+
+    tracker = QueryPerformanceTracker()
+    single = per_call_ns(lambda: record_many(tracker, args.calls, durations), args.calls) - baseline
+
+    tracker = QueryPerformanceTracker()
+    threads = [
+        threading.Thread(target=record_many, args=(tracker, args.calls, durations))
+        for _ in range(args.threads)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    threaded = (time.perf_counter() - start) / (args.calls * args.threads) * 1e9 - baseline
+
+    start = time.perf_counter()
+    stats = tracker.get_stats()
+    merge_ms = (time.perf_counter() - start) * 1000
+
+    recorded = sum(entry["count"] for entry in stats.values())
+    assert recorded == args.calls * args.threads, f"lost samples: {recorded}"
+
+    print(f"record_query, 1 thread:        {single:8.0f} ns/call")
+    print(f"record_query, {args.threads} threads:       {threaded:8.0f} ns/call")
+    print(f"get_stats merge:               {merge_ms:8.2f} ms")
+    print(f"budget:                        {OVERHEAD_BUDGET_NS:8d} ns/call")
+
+    sys.exit(0 if single <= OVERHEAD_BUDGET_NS else 1)
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,182 @@
 import os
+import time
 import discord
 import aiohttp
+from discord import app_commands
 from discord.ext import commands
+from discord.webhook.async_ import async_context
 from dotenv import load_dotenv
 from utils.database import DatabaseConnection
+from utils import database_async
 from utils.webhook import WebhookManager
-from pymongo import MongoClient
+from utils.mongo import close_all as close_mongo_clients
+from utils.write_behind import write_behind
+from utils.prefixes import prefix_cache, DEFAULT_PREFIX
+from utils.shop_catalog import shop_catalog
+from utils import metrics
+from utils.watchdog import loop_watchdog, LOOP_WATCHDOG_ENABLED
+from utils.tracing import tracer
+from utils.cooldowns import CooldownUnavailable, SlashCooldownUnavailable
 
 load_dotenv()
 TOKEN = os.getenv("TOKEN")
-MONGO_URI = os.getenv("MONGO_URI")
 
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
+def _cog_name(cog):
+    return cog.qualified_name if cog else "none"
+
+class InstrumentedTree(app_commands.CommandTree):
+    """Command tree that traces slash commands and tells the loop watchdog which one is running."""
+    async def interaction_check(self, interaction):
+        command = interaction.command
+        if command is not None:
+            cog = _cog_name(getattr(command, "binding", None))
+            trace = tracer.start("slash")
+            trace.cog = cog
+            trace.command = command.qualified_name
+            loop_watchdog.command_started(cog, command.qualified_name)
+        return True
+
 class ExtendedBot(commands.Bot):
     """Custom Bot class with additional properties for webhook and session"""
     def __init__(self, command_prefix, **kwargs):
         super().__init__(command_prefix, **kwargs)
         self.webhook_manager = None
         self.session = None
+        # Time every REST call, including interaction responses sent through the webhook adapter
+        tracer.instrument_http(self.http)
+        tracer.instrument_http(async_context.get())
+
+    async def process_commands(self, message):
+        if message.author.bot:
+            return
+
+        trace = tracer.start("prefix")
+        ctx = await self.get_context(message)
+        if ctx.command is None:
+            tracer.discard()
+            await self.invoke(ctx)
+            return
+
+        trace.cog = _cog_name(ctx.cog)
+        trace.command = ctx.command.qualified_name
+        now = time.perf_counter()
+        tracer.add_span("prefix", trace.started, now - trace.started)
+        ctx.checks_started_at = now
+        try:
+            await self.invoke(ctx)
+        finally:
+            tracer.finish(error=ctx.command_failed)
+
+    async def setup_hook(self):
+        # Warm the prefix cache before any messages arrive and keep it in sync
+        try:
+            await prefix_cache.load()
+        except Exception as e:
+            print(f"Failed to load prefixes: {e}")
+        self.loop.create_task(prefix_cache.watch())
+
+        # Serve leaderboards and ranks from memory
+        try:
+            await database_async.rebuild_rank_index()
+        except Exception as e:
+            print(f"Failed to build rank index: {e}")
+            # Leaderboards fall back to MongoDB queries until a retry succeeds
+            self.loop.create_task(database_async.retry_rank_index())
+
+        self.loop.create_task(database_async.watch_expired_items())
+
+        # Serve the shop from memory; this task is the only one that restocks it
+        try:
+            await shop_catalog.load()
+        except Exception as e:
+            print(f"Failed to load shop: {e}")
+        self.loop.create_task(shop_catalog.watch())
 
-# Connect to MongoDB
-try:
-    mongo_client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-    mongo_client.server_info()  # Test connection
-    db = mongo_client['discord_economy']  # Use the database name explicitly
-    print("Connected to MongoDB successfully")
-except Exception as e:
-    print(f"Failed to connect to MongoDB: {e}")
-    db = None
+        self.loop.create_task(metrics.loop_lag.run())
+        if LOOP_WATCHDOG_ENABLED:
+            self.loop.create_task(loop_watchdog.run())
+        if metrics.METRICS_PORT:
+            try:
+                await metrics.start_metrics_server(self, metrics.METRICS_PORT)
+                print(f"Metrics available on port {metrics.METRICS_PORT}")
+            except Exception as e:
+                print(f"Failed to start metrics server: {e}")
 
 async def get_prefix(bot, message):
     try:
         if not message.guild:
-            return "d!"  # Use default prefix in DMs too
+            return DEFAULT_PREFIX  # Use default prefix in DMs too
 
-        # Get prefix from MongoDB
-        prefix_data = db.prefixes.find_one({"guild_id": str(message.guild.id)})
-        return prefix_data["prefix"] if prefix_data else "d!"
+        # Served from memory; only a guild's first message touches MongoDB
+        return await prefix_cache.resolve(message.guild.id)
     except Exception:
-        return "d!"  # Default fallback
+        return DEFAULT_PREFIX  # Default fallback
 
 # Create the bot with our extended class
 bot = ExtendedBot(command_prefix=get_prefix, 
                  intents=intents, 
-                 help_command=None)
+                 help_command=None,
+                 tree_cls=InstrumentedTree)
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.command_started_at = time.perf_counter()
+    checks_started = getattr(ctx, "checks_started_at", None)
+    if checks_started is not None:
+        tracer.add_span("checks", checks_started, ctx.command_started_at - checks_started)
+    loop_watchdog.command_started(_cog_name(ctx.cog), ctx.command.qualified_name)
+
+@bot.after_invoke
+async def record_command_time(ctx):
+    loop_watchdog.command_finished()
+    started = getattr(ctx, "command_started_at", None)
+    if started is None:
+        return
+    cog = _cog_name(ctx.cog)
+    elapsed = time.perf_counter() - started
+    tracer.add_span("callback", started, elapsed)
+    metrics.command_stats.record_query(cog, ctx.command.qualified_name, elapsed)
+    if ctx.command_failed:
+        metrics.record_command_error(cog, ctx.command.qualified_name)
+
+@bot.listen()
+async def on_app_command_completion(interaction, command):
+    # Slash commands have no invoke hooks; time them from the interaction's creation
+    elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+    metrics.command_stats.record_query(_cog_name(getattr(command, "binding", None)), command.qualified_name, elapsed)
+    # Listeners run in a copy of the invoking task's context, so this is the command's trace
+    tracer.finish()
+
+def _unavailable_embed(error):
+    return discord.Embed(title="⚠️ Try Again Later", description=str(error), color=discord.Color.red())
+
+@bot.event
+async def on_command_error(ctx, error):
+    # Cog error handlers only know their own errors, so a degraded database is answered here
+    if isinstance(error, CooldownUnavailable):
+        await ctx.send(embed=_unavailable_embed(error))
+        return
+    await commands.Bot.on_command_error(bot, ctx, error)
+
+_default_app_command_error = bot.tree.on_error
+
+@bot.tree.error
+async def on_app_command_error(interaction, error):
+    command = interaction.command
+    if command is not None:
+        metrics.record_command_error(_cog_name(getattr(command, "binding", None)), command.qualified_name)
+    tracer.finish(error=True)
+    if isinstance(error, SlashCooldownUnavailable):
+        if interaction.response.is_done():
+            await interaction.followup.send(embed=_unavailable_embed(error), ephemeral=True)
+        else:
+            await interaction.response.send_message(embed=_unavailable_embed(error), ephemeral=True)
+        return
+    await _default_app_command_error(interaction, error)
 
 @bot.event
 async def on_ready():
@@ -142,6 +272,10 @@ def run_bot():
             bot.loop.run_until_complete(bot.webhook_manager.set_offline())
         if bot.session:
             bot.loop.run_until_complete(bot.session.close())
+        # Flush buffered telemetry before the Mongo clients go away
+        write_behind.close()
+        database_async.shutdown()
+        close_mongo_clients()
 
 if __name__ == "__main__":
     run_bot()
\ No newline at end of file
@@ -2,7 +2,7 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from utils.database import get_balance
+from utils.database_async import get_balance
 
 class Balance(commands.Cog):
     def __init__(self, bot):
@@ -22,7 +22,7 @@ class Balance(commands.Cog):
             guild_id = ctx_or_interaction.guild.id
             
             try:
-                bal = get_balance(guild_id, user.id)
+                bal = await get_balance(guild_id, user.id, fields=("pocket", "bank", "bank_limit"))
             except Exception as db_error:
                 print(f"Database error for user {user.id} in guild {guild_id}: {db_error}")
                 error_embed = discord.Embed(
@@ -7,7 +7,8 @@ import os
 
 DATA_FILE = "data.json"  
 
-from utils.database import get_balance, update_balance
+from utils.database_async import get_balance, update_balance, transfer, InsufficientFunds
+from utils.cooldowns import prefix_cooldown, slash_cooldown
 
 suits = ['♠', '♥', '♦', '♣']  
 ranks = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']  
@@ -77,13 +78,13 @@ class BlackjackView(discord.ui.View):
             dealer_val = calculate_value(self.dealer_cards)  
             if dealer_val > 21:  
                 result = "Dealer busted! You win!"  
-                update_balance(interaction.guild.id, interaction.user.id, self.bet * 2, "pocket")  
+                await update_balance(interaction.guild.id, interaction.user.id, self.bet * 2, "pocket")  
             elif player_val > dealer_val:  
                 result = "You win!"  
-                update_balance(interaction.guild.id, interaction.user.id, self.bet * 2, "pocket")  
+                await update_balance(interaction.guild.id, interaction.user.id, self.bet * 2, "pocket")  
             elif player_val == dealer_val:  
                 result = "It's a tie!"  
-                update_balance(interaction.guild.id, interaction.user.id, self.bet, "pocket")  
+                await update_balance(interaction.guild.id, interaction.user.id, self.bet, "pocket")  
             else:  
                 result = "Dealer wins!"  
             await self.update_embed(interaction, result=result)  
@@ -91,12 +92,13 @@ class BlackjackView(discord.ui.View):
     @discord.ui.button(label="Double Down", style=discord.ButtonStyle.green)  
     async def double_down(self, interaction: discord.Interaction, button: discord.ui.Button):  
         if interaction.user.id == int(self.user_id):  
-            balance = get_balance(self.guild_id, self.user_id)  
-            if balance['pocket'] < self.bet:  
+            # The debit itself checks the pocket, so concurrent commands can't overdraw it
+            try:
+                await transfer([{"user_id": self.user_id, "location": "pocket", "amount": -self.bet}])
+            except InsufficientFunds:
                 await interaction.response.send_message("You don't have enough money to double down!", ephemeral=True)  
                 return  
 
-            update_balance(interaction.guild.id, self.user_id, -self.bet, "pocket")  
             self.bet *= 2  
             self.player_cards.append(self.deck.pop())  
             player_val = calculate_value(self.player_cards)  
@@ -109,13 +111,13 @@ class BlackjackView(discord.ui.View):
                 result = "You busted! Dealer wins!"  
             elif dealer_val > 21:  
                 result = "Dealer busted! You win!"  
-                update_balance(interaction.guild.id, interaction.user.id, self.bet * 2, "pocket")  
+                await update_balance(interaction.guild.id, interaction.user.id, self.bet * 2, "pocket")  
             elif player_val > dealer_val:  
                 result = "You win!"  
-                update_balance(interaction.guild.id, interaction.user.id, self.bet * 2, "pocket")  
+                await update_balance(interaction.guild.id, interaction.user.id, self.bet * 2, "pocket")  
             elif player_val == dealer_val:  
                 result = "It's a tie!"  
-                update_balance(interaction.guild.id, interaction.user.id, self.bet, "pocket")  
+                await update_balance(interaction.guild.id, interaction.user.id, self.bet, "pocket")  
             else:  
                 result = "Dealer wins!"  
 
@@ -126,12 +128,12 @@ class Blackjack(commands.Cog):
         self.bot = bot  
 
     @commands.command(help="BET URRRRR MONEYYYYY", aliases=['bj', '21'])
-    @commands.cooldown(1, 5, commands.BucketType.member)  
+    @prefix_cooldown("blackjack", 5)  
     async def blackjack(self, ctx, bet):  
         await self._play_blackjack(ctx, bet)  
 
     @app_commands.command(name="blackjack", description="Play blackjack and bet your money")
-    @app_commands.checks.cooldown(1, 5, key=lambda i: (i.guild_id, i.user.id))  
+    @slash_cooldown("blackjack", 5)  
     @app_commands.describe(bet="Amount to bet or 'all'")  
     async def blackjack_slash(self, interaction: discord.Interaction, bet: str):  
         await self._play_blackjack(interaction, bet)  
@@ -139,7 +141,7 @@ class Blackjack(commands.Cog):
     async def _play_blackjack(self, ctx_or_interaction, bet):  
         user_id = str(ctx_or_interaction.user.id if isinstance(ctx_or_interaction, discord.Interaction) else ctx_or_interaction.author.id)  
         guild_id = str(ctx_or_interaction.guild.id if isinstance(ctx_or_interaction, discord.Interaction) else ctx_or_interaction.guild.id)
-        balance = get_balance(guild_id, user_id)  
+        balance = await get_balance(guild_id, user_id, fields=("pocket",))  
 
         if bet.lower() == "all":  
             bet = balance['pocket']  
@@ -160,14 +162,16 @@ class Blackjack(commands.Cog):
                 await ctx_or_interaction.send("You must bet at least $1000.")  
             return  
 
-        if balance['pocket'] < bet:  
+        # Take the bet with a guarded debit; the balance read above may already be stale
+        try:
+            await transfer([{"user_id": user_id, "location": "pocket", "amount": -bet}])
+        except InsufficientFunds:
             if isinstance(ctx_or_interaction, discord.Interaction):  
                 await ctx_or_interaction.response.send_message("You don't have enough money to place that bet.")  
             else:  
                 await ctx_or_interaction.send("You don't have enough money to place that bet.")  
             return  
 
-        update_balance(guild_id, user_id, -bet, "pocket")
         deck = create_deck()  
         random.shuffle(deck)  
         player_cards = [deck.pop(), deck.pop()]  
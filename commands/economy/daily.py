@@ -2,17 +2,15 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import random
-from utils.database import update_balance, get_balance
-import time
+from utils.database_async import update_balance, get_balance
 import datetime
 from utils.feedback import add_feedback_buttons
+from utils.cooldowns import cooldowns
 
 class Daily(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.cooldowns = {}  # Guild ID -> {User ID -> last claim time}
         self.cooldown_time = 86400  # 24 hours in seconds
-        self.streaks = {}  # Guild ID -> {User ID -> streak count}
         
     @commands.command(name="daily", help="Claim your daily reward. Consecutive days build a streak for bonus rewards!")
     async def daily(self, ctx):
@@ -29,18 +27,13 @@ class Daily(commands.Cog):
             guild_id = ctx_or_interaction.guild.id
             user_id = user.id
             
-            # Initialize guild data in the cooldowns dict if not exists
-            if guild_id not in self.cooldowns:
-                self.cooldowns[guild_id] = {}
-                self.streaks[guild_id] = {}
-                
-            current_time = int(time.time())
-            last_claim = self.cooldowns[guild_id].get(user_id, 0)
-            time_passed = current_time - last_claim
+            # Start the cooldown and step the streak; claims within two days keep the streak going
+            remaining, current_streak = await cooldowns.claim_streak(
+                user_id, "daily", self.cooldown_time, self.cooldown_time * 2
+            )
             
             # Check if on cooldown
-            if time_passed < self.cooldown_time and last_claim > 0:
-                remaining = self.cooldown_time - time_passed
+            if remaining > 0:
                 next_reset = datetime.datetime.now() + datetime.timedelta(seconds=remaining)
                 next_reset_str = f"<t:{int(next_reset.timestamp())}:R>"
                 
@@ -56,25 +49,18 @@ class Daily(commands.Cog):
                     await ctx_or_interaction.send(embed=embed)
                 return
                 
-            # Calculate streak
-            current_streak = self.streaks[guild_id].get(user_id, 0)
-            
-            # If it's been between 1 and 2 days (a bit of leeway), maintain streak
-            # If it's been over 2 days, reset streak
-            if time_passed > self.cooldown_time * 2 and last_claim > 0:
-                current_streak = 0
-                
-            # Increment streak
-            current_streak += 1
-            self.streaks[guild_id][user_id] = current_streak
-            
             # Calculate bonus based on streak
             base_amount = random.randint(1000, 3000)
             streak_bonus = min(current_streak * 100, 1000)  # Cap at 1000 bonus
             total_reward = base_amount + streak_bonus
             
             # Update user's balance
-            update_balance(guild_id, user_id, total_reward)
+            try:
+                await update_balance(guild_id, user_id, total_reward)
+            except Exception:
+                # Nothing was paid out, so the claim doesn't count
+                await cooldowns.release(user_id, "daily", streak=True)
+                raise
             
             # Create embed
             embed = discord.Embed(
@@ -98,7 +84,7 @@ class Daily(commands.Cog):
             
             # Get current balance
             try:
-                balance = get_balance(guild_id, user_id)
+                balance = await get_balance(guild_id, user_id, fields=("pocket", "bank"))
                 embed.add_field(
                     name="Current Balance",
                     value=f"Pocket: **${balance.get('pocket', 0):,}**\nBank: **${balance.get('bank', 0):,}**",
@@ -114,9 +100,6 @@ class Daily(commands.Cog):
             else:
                 embed.set_footer(text=f"Come back tomorrow to start a streak and earn bonus rewards!")
                 
-            # Update cooldown
-            self.cooldowns[guild_id][user_id] = current_time
-            
             # Add feedback buttons
             feedback_view = add_feedback_buttons("daily", user_id)
             
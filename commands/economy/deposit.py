@@ -1,7 +1,7 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from utils.database import get_balance, update_balance
+from utils.database_async import get_balance, transfer, InsufficientFunds
   
 class Deposit(commands.Cog):  
     def __init__(self, bot):  
@@ -22,7 +22,7 @@ class Deposit(commands.Cog):
             
             try:
                 # Get global balance
-                balance = get_balance(None, user.id)
+                balance = await get_balance(None, user.id, fields=("pocket", "bank", "bank_limit"))
             except Exception as db_error:
                 print(f"Database error in deposit for user {user.id}: {db_error}")
                 error_embed = discord.Embed(
@@ -137,12 +137,26 @@ class Deposit(commands.Cog):
                     await ctx_or_interaction.send(embed=embed)
                 return
   
-        # Update balances
-        update_balance(None, user.id, -amount_to_deposit, "pocket")
-        update_balance(None, user.id, amount_to_deposit, "bank")
+        # Move the money from pocket to bank in one atomic write
+        try:
+            await transfer([
+                {"user_id": user.id, "location": "pocket", "amount": -amount_to_deposit},
+                {"user_id": user.id, "location": "bank", "amount": amount_to_deposit}
+            ])
+        except InsufficientFunds:
+            embed = discord.Embed(
+                title="❌ Deposit Failed",
+                description="Your balance changed while depositing. Please try again.",
+                color=0xE74C3C
+            )
+            if isinstance(ctx_or_interaction, discord.Interaction):  
+                await ctx_or_interaction.response.send_message(embed=embed)  
+            else:  
+                await ctx_or_interaction.send(embed=embed)
+            return
         
         # Get updated balance for display
-        updated_balance = get_balance(None, user.id)
+        updated_balance = await get_balance(None, user.id, fields=("pocket", "bank", "bank_limit"))
   
         embed = discord.Embed(  
             title="💸 Deposit Successful",  
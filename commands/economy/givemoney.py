@@ -1,7 +1,7 @@
 import discord
 from discord.ext import commands
 from discord import app_commands, Interaction
-from utils.database import get_balance, update_balance  
+from utils.database_async import get_balance, transfer, InsufficientFunds
   
 class ConfirmView(discord.ui.View):  
     def __init__(self, sender, receiver, amount):  
@@ -15,9 +15,19 @@ class ConfirmView(discord.ui.View):
         if interaction.user.id != self.sender.id:  
             await interaction.response.send_message("You can't confirm someone else's transfer.", ephemeral=True)  
             return  
-        guild_id = interaction.guild.id
-        update_balance(guild_id, self.sender.id, -self.amount)
-        update_balance(guild_id, self.receiver.id, self.amount)  
+        try:
+            await transfer([
+                {"user_id": self.sender.id, "location": "pocket", "amount": -self.amount},
+                {"user_id": self.receiver.id, "location": "pocket", "amount": self.amount}
+            ])
+        except InsufficientFunds:
+            embed = discord.Embed(
+                title="Transfer Failed",
+                description="You no longer have enough money to give!",
+                color=discord.Color.red()
+            )
+            await interaction.response.edit_message(embed=embed, view=None)
+            return
         embed = discord.Embed(  
             title="Money Sent!",  
             description=f"{self.sender.mention} gave ${self.amount} to {self.receiver.mention}.",  
@@ -53,7 +63,7 @@ class GiveMoney(commands.Cog):
         try:
             sender = ctx_or_inter.user if isinstance(ctx_or_inter, Interaction) else ctx_or_inter.author  
             try:
-                sender_balance = get_balance(ctx_or_inter.guild.id, sender.id)
+                sender_balance = await get_balance(ctx_or_inter.guild.id, sender.id, fields=("pocket",))
             except Exception as db_error:
                 print(f"Database error in givemoney for user {sender.id} in guild {ctx_or_inter.guild.id}: {db_error}")
                 error_embed = discord.Embed(
@@ -75,7 +85,7 @@ class GiveMoney(commands.Cog):
             return await ctx_or_inter.response.send_message(msg, ephemeral=True) if isinstance(ctx_or_inter, Interaction) else await ctx_or_inter.send(msg)  
   
         guild_id = ctx_or_inter.guild.id
-        sender_balance = get_balance(guild_id, sender.id)  
+        sender_balance = await get_balance(guild_id, sender.id, fields=("pocket",))  
   
         if sender_balance["pocket"] < amount or amount <= 0:  
             msg = "You don’t have enough money to give!"  
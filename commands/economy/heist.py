@@ -5,7 +5,9 @@ import random
 import asyncio
 import time
 import datetime
-from utils.database import update_balance, get_balance, save_balance
+from utils.database_async import get_balance, get_balances, transfer, InsufficientFunds
+
+HEIST_FEE = 2000  # Entry fee for heist
 
 class HeistButton(discord.ui.Button):
     def __init__(self, heist_manager):
@@ -25,22 +27,29 @@ class HeistView(discord.ui.View):
         await self.heist_manager.start_heist()
 
 class HeistManager:
-    def __init__(self, bot, ctx_or_interaction, target_user):
+    """
+    Runs one heist from recruitment to settlement.
+
+    Balances are read as little as possible: the target's bank is read once
+    when the heist is planned and kept for the recruitment embeds, entry fees
+    are taken with guarded debits instead of a read followed by a write, and at
+    launch the whole crew and the target are fetched in one query, the outcome
+    is worked out in memory and settled with a single transfer.
+    """
+    def __init__(self, bot, ctx_or_interaction, target_user, target_bank=0):
         self.bot = bot
         self.ctx_or_interaction = ctx_or_interaction
         self.target = target_user
         self.channel = ctx_or_interaction.channel
         self.initiator = ctx_or_interaction.author if hasattr(ctx_or_interaction, 'author') else ctx_or_interaction.user
         self.members = [self.initiator]  # List of participants
+        self.target_bank = target_bank   # Target's bank as of planning, shown while recruiting
         self.message = None
         self.view = HeistView(self)
         
     async def start_recruitment(self):
         # Check if target has money in bank
-        target_balance = get_balance(None, self.target.id)
-        target_bank = target_balance.get('bank', 0)
-        
-        if target_bank <= 0:
+        if self.target_bank <= 0:
             embed = discord.Embed(
                 title="🚫 Heist Cancelled",
                 description=f"{self.target.mention} doesn't have any money in the bank!",
@@ -56,16 +65,13 @@ class HeistManager:
                 await self.ctx_or_interaction.send(embed=embed)
             return False
         
-        # Check if initiator has money for the heist fee
-        initiator_balance = get_balance(None, self.initiator.id)
-        initiator_pocket = initiator_balance.get('pocket', 0)
-        
-        heist_fee = 2000  # Entry fee for heist
-        
-        if initiator_pocket < heist_fee:
+        # Deduct fee from initiator; the debit itself checks they can cover it
+        try:
+            await transfer([{"user_id": self.initiator.id, "location": "pocket", "amount": -HEIST_FEE}])
+        except InsufficientFunds:
             embed = discord.Embed(
                 title="🚫 Heist Cancelled",
-                description=f"You need ${heist_fee:,} in your pocket to initiate a heist!",
+                description=f"You need ${HEIST_FEE:,} in your pocket to initiate a heist!",
                 color=0xE74C3C
             )
             
@@ -77,16 +83,13 @@ class HeistManager:
             else:
                 await self.ctx_or_interaction.send(embed=embed)
             return False
-            
-        # Deduct fee from initiator
-        update_balance(None, self.initiator.id, -heist_fee)
         
         # Start recruitment
         embed = discord.Embed(
             title="🔫 BANK HEIST",
             description=(
                 f"{self.initiator.mention} is planning a heist on {self.target.mention}'s bank!\n\n"
-                f"**Target Bank Balance**: ${target_bank:,}\n\n"
+                f"**Target Bank Balance**: ${self.target_bank:,}\n\n"
                 "**Click the button below to join the heist!**\n"
                 "⚠️ There's a risk you could lose all your money if caught!\n"
                 "**Entry Fee**: $2,000\n\n"
@@ -123,27 +126,24 @@ class HeistManager:
             await interaction.response.send_message("You can't join a heist targeting yourself!", ephemeral=True)
             return
             
-        # Check if user has money for the heist fee
-        balance = get_balance(None, user.id)
-        pocket_balance = balance.get('pocket', 0)
-        
-        heist_fee = 2000  # Entry fee for heist
-        
-        if pocket_balance < heist_fee:
-            await interaction.response.send_message(f"You need ${heist_fee:,} in your pocket to join the heist!", ephemeral=True)
-            return
-            
         # Check if max members reached
         if len(self.members) >= 5:
             await interaction.response.send_message("This heist crew is full!", ephemeral=True)
             return
             
-        # Deduct fee from user
-        update_balance(None, user.id, -heist_fee)
-        
-        # Add user to members
+        # Hold their spot while the fee is taken so simultaneous joins can't overfill the crew
         self.members.append(user)
-        
+        try:
+            await transfer([{"user_id": user.id, "location": "pocket", "amount": -HEIST_FEE}])
+        except InsufficientFunds:
+            self.members.remove(user)
+            await interaction.response.send_message(f"You need ${HEIST_FEE:,} in your pocket to join the heist!", ephemeral=True)
+            return
+        except BaseException:
+            # The fee wasn't taken (database down, cancelled), so they mustn't be refunded or paid out later
+            self.members.remove(user)
+            raise
+
         # Update the embed
         members_text = "\n".join([f"• {member.mention}" for member in self.members])
         
@@ -151,7 +151,7 @@ class HeistManager:
             title="🔫 BANK HEIST",
             description=(
                 f"{self.initiator.mention} is planning a heist on {self.target.mention}'s bank!\n\n"
-                f"**Target Bank Balance**: ${get_balance(None, self.target.id).get('bank', 0):,}\n\n"
+                f"**Target Bank Balance**: ${self.target_bank:,}\n\n"
                 "**Click the button below to join the heist!**\n"
                 "⚠️ There's a risk you could lose all your money if caught!\n"
                 "**Entry Fee**: $2,000\n\n"
@@ -177,16 +177,11 @@ class HeistManager:
             )
             
             # Refund fees
-            for member in self.members:
-                update_balance(None, member.id, 2000)
+            await transfer([{"user_id": member.id, "location": "pocket", "amount": HEIST_FEE} for member in self.members])
                 
             await self.message.edit(embed=embed, view=None)
             return
             
-        # Get target's bank balance
-        target_balance = get_balance(None, self.target.id)
-        target_bank = target_balance.get('bank', 0)
-        
         # Begin heist animation
         loading_embed = discord.Embed(
             title="🔫 HEIST IN PROGRESS",
@@ -197,13 +192,17 @@ class HeistManager:
         await self.message.edit(embed=loading_embed, view=None)
         await asyncio.sleep(3)
         
+        # Fetch the target and the whole crew in one query; the outcome is worked out from this snapshot
+        balances = await get_balances([self.target.id] + [member.id for member in self.members], fields=("pocket", "bank", "luck"))
+        target_bank = balances[str(self.target.id)]["bank"]
+        
         # Determine success chance based on crew size and luck
         success_chance = 0.3 + (len(self.members) * 0.1)  # 40% for 1 member, up to 80% for 5 members
         
         # Add luck bonus
         crew_luck = 1.0
         for member in self.members:
-            member_luck = get_balance(None, member.id).get('luck', 1.0)
+            member_luck = balances[str(member.id)]["luck"]
             crew_luck += (member_luck - 1.0) / len(self.members)  # Average crew luck bonus
             
         success_chance *= crew_luck
@@ -218,7 +217,7 @@ class HeistManager:
             loot_amount = int(target_bank * loot_percentage)
             
             # Reduce target's bank balance
-            update_balance(None, self.target.id, -loot_amount, "bank")
+            settlement = [{"user_id": self.target.id, "location": "bank", "amount": -loot_amount}]
             
             # Distribute loot
             share_per_member = loot_amount // len(self.members)
@@ -239,14 +238,28 @@ class HeistManager:
                 survived = random.random() < 0.9  # 90% survival rate
                 if survived:
                     survivors.append(member)
-                    update_balance(None, member.id, share_per_member)
+                    settlement.append({"user_id": member.id, "location": "pocket", "amount": share_per_member})
                 else:
                     casualties.append({
                         "member": member,
                         "reason": random.choice(casualty_messages)
                     })
                     # Reset their balance to 0 in both pocket and bank
-                    save_balance(None, member.id, {"pocket": 0, "bank": 0})
+                    settlement.append({"user_id": member.id, "location": "pocket", "set": 0})
+                    settlement.append({"user_id": member.id, "location": "bank", "set": 0})
+            
+            # Settle the whole heist in one atomic write
+            try:
+                await transfer(settlement, balances)
+            except InsufficientFunds:
+                embed = discord.Embed(
+                    title="🚫 Heist Cancelled",
+                    description=f"{self.target.mention} moved their money before the crew got in!\nEntry fees have been refunded.",
+                    color=0xE74C3C
+                )
+                await transfer([{"user_id": member.id, "location": "pocket", "amount": HEIST_FEE} for member in self.members])
+                await self.message.edit(embed=embed)
+                return
             
             # Create success embed
             success_embed = discord.Embed(
@@ -303,12 +316,16 @@ class HeistManager:
             ]
             
             captured_text = ""
+            settlement = []
             for member in self.members:
                 reason = random.choice(capture_messages)
                 captured_text += f"• {member.mention} — {reason} **LOST EVERYTHING!**\n"
                 
                 # Reset their balance to 0 in both pocket and bank
-                save_balance(None, member.id, {"pocket": 0, "bank": 0})
+                settlement.append({"user_id": member.id, "location": "pocket", "set": 0})
+                settlement.append({"user_id": member.id, "location": "bank", "set": 0})
+            
+            await transfer(settlement, balances)
             
             failed_embed.add_field(
                 name="🚔 Captured Crew",
@@ -381,28 +398,27 @@ class Heist(commands.Cog):
             return
             
         # Check for shield
-        target_balance = get_balance(None, target.id)
-        target_inventory = target_balance.get("inventory", [])
+        target_balance = await get_balance(None, target.id, fields=("bank", "shield_expires"))
+        shield_expires = target_balance.get("shield_expires", 0)
         
-        for item in target_inventory:
-            if item.get("type") == "shield" and item.get("expires", 0) > time.time():
-                embed = discord.Embed(
-                    title="🛡️ Target Protected",
-                    description=f"{target.mention} is currently protected by a shield!",
-                    color=0xF39C12
-                )
-                
-                expiry_time = int(item.get("expires"))
-                embed.set_footer(text=f"Shield expires {discord.utils.format_dt(datetime.datetime.fromtimestamp(expiry_time), 'R')}")
-                
-                if isinstance(ctx_or_interaction, discord.Interaction):
-                    await ctx_or_interaction.response.send_message(embed=embed, ephemeral=True)
-                else:
-                    await ctx_or_interaction.send(embed=embed)
-                return
+        if shield_expires > time.time():
+            embed = discord.Embed(
+                title="🛡️ Target Protected",
+                description=f"{target.mention} is currently protected by a shield!",
+                color=0xF39C12
+            )
+            
+            expiry_time = int(shield_expires)
+            embed.set_footer(text=f"Shield expires {discord.utils.format_dt(datetime.datetime.fromtimestamp(expiry_time), 'R')}")
+            
+            if isinstance(ctx_or_interaction, discord.Interaction):
+                await ctx_or_interaction.response.send_message(embed=embed, ephemeral=True)
+            else:
+                await ctx_or_interaction.send(embed=embed)
+            return
             
         # Start heist
-        heist_manager = HeistManager(self.bot, ctx_or_interaction, target)
+        heist_manager = HeistManager(self.bot, ctx_or_interaction, target, target_balance["bank"])
         self.active_heists[channel.id] = heist_manager
         
         success = await heist_manager.start_recruitment()
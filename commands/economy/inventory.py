@@ -1,7 +1,19 @@
+import time
 import discord
 from discord.ext import commands
 from discord import app_commands
-from utils.database import get_balance
+from utils.database_async import get_balance
+
+# Display name and description for each item id stored in inventories
+ITEM_INFO = {
+    "banknote": ("🏦 Bank Note", "Increases your bank limit by $5,000"),
+    "luck_boost": ("🍀 Luck Boost", "Increases your luck by 10% for steal and heist commands"),
+    "luckboost": ("🍀 Luck Boost", "Increases your luck by 10% for steal and heist commands"),
+    "shield": ("🛡️ Theft Shield", "Protects your money from theft for 24 hours"),
+    "theftshield": ("🛡️ Theft Shield", "Protects your money from being stolen (one-time use)"),
+    "medal": ("🥇 Prestige Medal", "A rare collectible to show your wealth"),
+    "mystery_box": ("📦 Mystery Box", "Contains a random reward")
+}
 
 class Inventory(commands.Cog):
     def __init__(self, bot):
@@ -21,8 +33,9 @@ class Inventory(commands.Cog):
             guild_id = ctx_or_interaction.guild.id
             
             try:
-                bal = get_balance(guild_id, user.id)
-                inventory = bal.get('inventory', [])
+                bal = await get_balance(guild_id, user.id)
+                inventory = bal.get('inventory', {})
+                timed_items = [item for item in bal.get('timed_items', []) if item['expires'] > time.time()]
             except Exception as db_error:
                 print(f"Database error for user {user.id} in guild {guild_id}: {db_error}")
                 error_embed = discord.Embed(
@@ -41,27 +54,26 @@ class Inventory(commands.Cog):
 
             embed = discord.Embed(title=f"{user.name}'s Inventory", color=discord.Color.blue())
             
-            if not inventory:
+            if not any(inventory.values()) and not timed_items:
                 embed.description = "Your inventory is empty. Buy items from the shop!"
             else:
-                # Group the same items and count them
-                item_counts = {}
-                for item in inventory:
-                    item_id = item.get('id', 'unknown')
-                    if item_id in item_counts:
-                        item_counts[item_id]['count'] += 1
-                    else:
-                        item_counts[item_id] = {
-                            'name': item.get('name', 'Unknown Item'),
-                            'description': item.get('description', 'No description'),
-                            'count': 1
-                        }
-                
-                # Add each item to the embed
-                for item_id, data in item_counts.items():
+                # Inventories are stored as item id -> count
+                for item_id, count in inventory.items():
+                    if count <= 0:
+                        continue
+                    name, description = ITEM_INFO.get(item_id, ("Unknown Item", "No description"))
+                    embed.add_field(
+                        name=f"{name} (x{count})",
+                        value=description,
+                        inline=False
+                    )
+
+                # Timed items are kept sorted by expiry
+                for item in timed_items:
+                    name, description = ITEM_INFO.get(item['type'], ("Unknown Item", "No description"))
                     embed.add_field(
-                        name=f"{data['name']} (x{data['count']})",
-                        value=data['description'],
+                        name=name,
+                        value=f"{description}\nExpires <t:{int(item['expires'])}:R>",
                         inline=False
                     )
 
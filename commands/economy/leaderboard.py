@@ -1,16 +1,65 @@
 import discord
-import pymongo
-import os
 from discord.ext import commands
 from discord import app_commands
-from pymongo import MongoClient
+from utils.mongo import get_database
+from utils.database_async import run_in_db_executor
+from utils.rank_index import rank_index
+from utils.users import user_names
 
 class Leaderboard(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        # Connect to MongoDB
-        self.mongo_client = MongoClient(os.environ.get("MONGO_URI"))
-        self.db = self.mongo_client['discord_economy']
+        self.db = get_database()
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        rank_index.add_member(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        rank_index.remove_member(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        rank_index.forget_guild(guild.id)
+
+    async def _top_members(self, guild, member_ids, user_id):
+        """Top 10 members and the caller's (rank, networth), from memory when the rank index is loaded."""
+        if rank_index.ready:
+            if not rank_index.is_tracked(guild.id):
+                rank_index.track_guild(guild.id, member_ids)
+            rank = rank_index.rank(user_id, guild.id)
+            user_rank = (rank, rank_index.networth(user_id)) if rank is not None else None
+            return rank_index.top(10, guild.id), user_rank
+
+        # Top 10 members by networth; the (networth, user_id) index serves the sort and limit
+        user_totals = await run_in_db_executor(
+            lambda: list(
+                self.db.economies.find(
+                    {"user_id": {"$in": member_ids}},
+                    {"_id": 0, "user_id": 1, "pocket": 1, "bank": 1, "networth": 1}
+                ).sort("networth", -1).limit(10)
+            )
+        )
+
+        # Find the user's position in this server's leaderboard
+        user_rank = None
+        user_data = await run_in_db_executor(
+            self.db.economies.find_one,
+            {"user_id": str(user_id)},
+            {"_id": 0, "networth": 1}
+        )
+        if user_data:
+            user_total = user_data.get('networth', 0)
+
+            # Count server members with more money than this user in a single indexed query
+            richer_members = await run_in_db_executor(
+                self.db.economies.count_documents,
+                {"user_id": {"$in": member_ids}, "networth": {"$gt": user_total}}
+            )
+            user_rank = (richer_members + 1, user_total)
+
+        return user_totals, user_rank
 
     @commands.command(help="Ranks users based on their networth (only top 10.)", aliases=['lb', 'top', 'rich'])
     async def leaderboard(self, ctx):
@@ -41,20 +90,8 @@ class Leaderboard(commands.Cog):
             # Get a list of all member IDs in the server
             member_ids = [str(member.id) for member in guild.members]
             
-            # Find all economy records for members in this server
-            user_data_list = list(self.db.economies.find(
-                {"user_id": {"$in": member_ids}}
-            ))
-            
-            # Calculate total money and sort
-            for user_data in user_data_list:
-                user_data['total'] = user_data.get('pocket', 0) + user_data.get('bank', 0)
-            
-            # Sort by total money (descending)
-            user_totals = sorted(user_data_list, key=lambda x: x.get('total', 0), reverse=True)
-            
-            # Limit to top 10
-            user_totals = user_totals[:10]
+            user_id = ctx_or_interaction.author.id if hasattr(ctx_or_interaction, 'author') else ctx_or_interaction.user.id
+            user_totals, user_rank = await self._top_members(guild, member_ids, user_id)
             
             embed = discord.Embed(
                 title=f"🏆 Richest Users in {guild.name}",
@@ -69,10 +106,15 @@ class Leaderboard(commands.Cog):
                     inline=False
                 )
             else:
+                # Cached names first; anyone unknown is fetched concurrently
+                names = await user_names.resolve(self.bot, [user_data["user_id"] for user_data in user_totals], guild)
+
                 for i, user_data in enumerate(user_totals, 1):
                     try:
-                        user = await self.bot.fetch_user(int(user_data["user_id"]))
-                        total = user_data.get('total', 0)
+                        name = names.get(int(user_data["user_id"]))
+                        if name is None:
+                            continue
+                        total = user_data.get('networth', 0)
                         pocket = user_data.get('pocket', 0)
                         bank = user_data.get('bank', 0)
                         
@@ -88,39 +130,20 @@ class Leaderboard(commands.Cog):
                             prefix = f"{i}. "
                             
                         embed.add_field(
-                            name=f"{prefix}{user.name}",
+                            name=f"{prefix}{name}",
                             value=f"**Total**: ${total:,}\n**Pocket**: ${pocket:,} | **Bank**: ${bank:,}",
                             inline=False
                         )
                     except Exception as e:
-                        print(f"Error fetching user for leaderboard: {e}")
+                        print(f"Error rendering leaderboard row: {e}")
                         continue
                         
             # Add footer with user's rank if they're not in top 10
-            user_id = ctx_or_interaction.author.id if hasattr(ctx_or_interaction, 'author') else ctx_or_interaction.user.id
-            
-            # Check if user is already in the displayed leaderboard
             user_in_top = any(int(user_data.get("user_id")) == user_id for user_data in user_totals)
             
-            if not user_in_top:
-                # Find the user's position in this server's leaderboard
-                user_data = self.db.economies.find_one({"user_id": str(user_id)})
-                if user_data:
-                    user_total = user_data.get('pocket', 0) + user_data.get('bank', 0)
-                    
-                    # Count server members with more money than this user
-                    server_rank = 1
-                    for member_id in member_ids:
-                        if member_id == str(user_id):
-                            continue
-                            
-                        member_data = self.db.economies.find_one({"user_id": member_id})
-                        if member_data:
-                            member_total = member_data.get('pocket', 0) + member_data.get('bank', 0)
-                            if member_total > user_total:
-                                server_rank += 1
-                    
-                    embed.set_footer(text=f"Your server rank: #{server_rank} with ${user_total:,}")
+            if not user_in_top and user_rank:
+                server_rank, user_total = user_rank
+                embed.set_footer(text=f"Your server rank: #{server_rank} with ${user_total:,}")
 
             if isinstance(ctx_or_interaction, discord.Interaction):
                 await ctx_or_interaction.response.send_message(embed=embed)
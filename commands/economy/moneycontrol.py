@@ -1,7 +1,7 @@
 import discord
 from discord.ext import commands
 from discord import app_commands, Interaction
-from utils.database import update_balance, get_balance
+from utils.database_async import update_balance, transfer, InsufficientFunds
 
 class MoneyControl(commands.Cog):
     def __init__(self, bot):
@@ -42,7 +42,7 @@ class MoneyControl(commands.Cog):
                 await ctx.send("Please provide a valid number or 'infinity'", ephemeral=True)
                 return
 
-        update_balance(ctx.guild.id, user.id, amount, "pocket")
+        await update_balance(ctx.guild.id, user.id, amount, "pocket")
         display_amount = "∞" if amount == self.MAX_MONEY else f"${amount:,}"
         await ctx.send(f"Added {display_amount} to {user.mention}'s pocket.")
 
@@ -66,7 +66,7 @@ class MoneyControl(commands.Cog):
                 await interaction.response.send_message("Please provide a valid number or 'infinity'", ephemeral=True)
                 return
 
-        update_balance(interaction.guild.id, user.id, amount, "pocket")
+        await update_balance(interaction.guild.id, user.id, amount, "pocket")
         display_amount = "∞" if amount == self.MAX_MONEY else f"${amount:,}"
         await interaction.response.send_message(f"Added {display_amount} to {user.mention}'s pocket.", ephemeral=True)
 
@@ -76,21 +76,26 @@ class MoneyControl(commands.Cog):
             await ctx.send("You don't have permission to use this command.", ephemeral=True)
             return
 
-        balance = get_balance(ctx.guild.id, user.id)
-
         if amount == "all":
-            amount = balance["pocket"]
-        else:
-            try:
-                amount = int(amount)
-                if amount <= 0:
-                    await ctx.send("Amount must be positive!", ephemeral=True)
-                    return
-            except ValueError:
-                await ctx.send("Please provide a valid number or 'all'", ephemeral=True)
+            # Emptied in one write, whatever the pocket holds by then
+            await transfer([{"user_id": user.id, "location": "pocket", "set": 0}])
+            await ctx.send(f"Removed everything from {user.mention}'s pocket.")
+            return
+
+        try:
+            amount = int(amount)
+            if amount <= 0:
+                await ctx.send("Amount must be positive!", ephemeral=True)
                 return
+        except ValueError:
+            await ctx.send("Please provide a valid number or 'all'", ephemeral=True)
+            return
 
-        update_balance(ctx.guild.id, user.id, -amount, "pocket")
+        try:
+            await transfer([{"user_id": user.id, "location": "pocket", "amount": -amount}])
+        except InsufficientFunds:
+            await ctx.send(f"{user.mention} doesn't have ${amount:,} in their pocket. Use 'all' to empty it.")
+            return
         await ctx.send(f"Removed ${amount:,} from {user.mention}'s pocket.")
 
     @app_commands.command(name="removemoney", description="Remove pocket money from a user.")
@@ -100,26 +105,28 @@ class MoneyControl(commands.Cog):
             await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
             return
 
-        balance = get_balance(interaction.guild.id, user.id)
+        if amount.lower() in ["all", "infinity", "inf"]:
+            # Emptied in one write, whatever the pocket holds by then
+            await transfer([{"user_id": user.id, "location": "pocket", "set": 0}])
+            await interaction.response.send_message(f"Removed everything from {user.mention}'s pocket.", ephemeral=True)
+            return
 
-        if amount.lower() == "all":
-            amount = balance["pocket"]
-        elif amount.lower() in ["infinity", "inf"]:
-            amount = self.MAX_MONEY
-        else:
-            try:
-                amount = int(amount)
-                if amount <= 0:
-                    await interaction.response.send_message("Amount must be positive!", ephemeral=True)
-                    return
-                amount = min(amount, self.MAX_MONEY)
-            except ValueError:
-                await interaction.response.send_message("Please provide a valid number, 'all', or 'infinity'", ephemeral=True)
+        try:
+            amount = int(amount)
+            if amount <= 0:
+                await interaction.response.send_message("Amount must be positive!", ephemeral=True)
                 return
+            amount = min(amount, self.MAX_MONEY)
+        except ValueError:
+            await interaction.response.send_message("Please provide a valid number, 'all', or 'infinity'", ephemeral=True)
+            return
 
-        update_balance(interaction.guild.id, user.id, -amount, "pocket")
-        display_amount = "∞" if amount == self.MAX_MONEY else f"${amount:,}"
-        await interaction.response.send_message(f"Removed {display_amount} from {user.mention}'s pocket.", ephemeral=True)
+        try:
+            await transfer([{"user_id": user.id, "location": "pocket", "amount": -amount}])
+        except InsufficientFunds:
+            await interaction.response.send_message(f"{user.mention} doesn't have ${amount:,} in their pocket. Use 'all' to empty it.", ephemeral=True)
+            return
+        await interaction.response.send_message(f"Removed ${amount:,} from {user.mention}'s pocket.", ephemeral=True)
 
 async def setup(bot):
     await bot.add_cog(MoneyControl(bot))
\ No newline at end of file
@@ -16,14 +16,139 @@ WIN_MULTIPLIERS = {
 RED_NUMBERS = [1, 3, 5, 7, 9, 12, 14, 16, 18, 19, 21, 23, 25, 27, 30, 32, 34, 36]
 BLACK_NUMBERS = [2, 4, 6, 8, 10, 11, 13, 15, 17, 20, 22, 24, 26, 28, 29, 31, 33, 35]
 
-from utils.database import get_balance, update_balance
+ROUND_DURATION = 20  # seconds of betting before the wheel spins
+
+from utils.database_async import get_balance, transfer, InsufficientFunds
+from utils.cooldowns import prefix_cooldown, slash_cooldown
+from utils.timer_wheel import TimerWheel
+
+def spin():
+    """Spin the wheel; returns the number and the choices it pays out on."""
+    number = random.randint(0, 36)
+    if number in RED_NUMBERS:
+        return number, ["Red", str(number)]
+    if number in BLACK_NUMBERS:
+        return number, ["Black", str(number)]
+    return number, ["Green", str(number)]
+
+class RouletteRound:
+    """One channel's round: the bet book and where to announce the result."""
+    def __init__(self, channel):
+        self.channel = channel
+        self.bets = {}       # user_id -> [(amount, choices)], one entry per bet placed
+        self.open = True     # False once the wheel has spun
+        self.timer = None    # TimerWheel handle for the spin
+
+    def place(self, user_id, amount, choices):
+        self.bets.setdefault(str(user_id), []).append((amount, list(choices)))
+
+    def payouts(self, result):
+        """user_id -> winnings; each bet's stake is split evenly across its choices."""
+        payouts = {}
+        for user_id, bets in self.bets.items():
+            total_winnings = 0
+            for amount, choices in bets:
+                share = amount // len(choices)
+                total_winnings += sum(share * WIN_MULTIPLIERS[choice] for choice in choices if choice in result)
+            if total_winnings > 0:
+                payouts[user_id] = total_winnings
+        return payouts
+
+class RouletteEngine:
+    """
+    Roulette rounds keyed by channel.
+
+    Every round's spin is a timer on one shared TimerWheel rather than a
+    sleeping task per round. All rounds that come due on the same tick are
+    settled together, paying every winner across them in a single bulk write.
+    """
+    def __init__(self, duration=ROUND_DURATION):
+        self.duration = duration
+        self.rounds = {}  # channel id -> open RouletteRound
+        self.wheel = TimerWheel(self.settle)
+
+    def get(self, channel_id):
+        return self.rounds.get(channel_id)
+
+    def open_round(self, channel):
+        """The channel's open round, starting one if there is none; returns (round, started)."""
+        game = self.rounds.get(channel.id)
+        if game is not None:
+            return game, False
+        game = self.rounds[channel.id] = RouletteRound(channel)
+        game.timer = self.wheel.schedule(self.duration, game)
+        return game, True
+
+    async def settle(self, rounds):
+        """Spin and pay out a batch of rounds."""
+        outcomes = []
+        legs = []
+        for game in rounds:
+            game.open = False
+            self.wheel.cancel(game.timer)  # No-op when the wheel is what fired
+            if self.rounds.get(game.channel.id) is game:
+                del self.rounds[game.channel.id]
+            number, result = spin()
+            payouts = game.payouts(result)
+            legs.extend({"user_id": user_id, "amount": amount} for user_id, amount in payouts.items())
+            outcomes.append((game, number, result, payouts))
+
+        paid = True
+        if legs:
+            try:
+                await transfer(legs)
+            except Exception as e:
+                print(f"Error paying out {len(legs)} roulette winnings: {e}")
+                paid = False
+
+        await asyncio.gather(
+            *(self._announce(game, number, result, payouts, paid) for game, number, result, payouts in outcomes),
+            return_exceptions=True
+        )
+
+    async def close(self):
+        """Stop the wheel and refund every stake in rounds that haven't spun, in one bulk write."""
+        self.wheel.stop()
+        rounds = list(self.rounds.values())
+        self.rounds.clear()
+        stakes = {}
+        for game in rounds:
+            game.open = False
+            self.wheel.cancel(game.timer)
+            for user_id, bets in game.bets.items():
+                stakes[user_id] = stakes.get(user_id, 0) + sum(amount for amount, _ in bets)
+        if not stakes:
+            return
+
+        try:
+            await transfer([{"user_id": user_id, "amount": amount} for user_id, amount in stakes.items()])
+        except Exception as e:
+            print(f"Error refunding {len(stakes)} roulette stakes: {e}")
+            return
+
+        await asyncio.gather(
+            *(game.channel.send("Roulette was stopped before the wheel spun; all bets were refunded.")
+              for game in rounds if game.bets),
+            return_exceptions=True
+        )
+
+    async def _announce(self, game, number, result, payouts, paid):
+        result_embed = discord.Embed(
+            title="Roulette Result", 
+            description=f"The ball landed on **{number}** ({result[0]})!", 
+            color=discord.Color.green()
+        )
+        
+        if payouts and not paid:
+            result_embed.add_field(name="Payout Failed", value="Winnings couldn't be paid out. Please contact an admin.", inline=False)
+        elif payouts:
+            winners = [f"<@{user_id}> won ${amount}" for user_id, amount in payouts.items()]
+            result_embed.add_field(name="Winners", value="\n".join(winners), inline=False)
+        else:
+            result_embed.add_field(name="No Winners", value="Better luck next time!", inline=False)
+
+        await game.channel.send(embed=result_embed)
 
-active_game = {
-    "message_id": None,
-    "bets": {},
-    "participants": set(),
-    "status": "idle"
-}
 
 class ColorSelect(discord.ui.Select):
     def __init__(self):
@@ -43,9 +168,10 @@ class NumberSelect(discord.ui.Select):
         super().__init__(placeholder=f"Choose numbers {start}-{end}...", min_values=0, max_values=len(options), options=options)
 
 class BetView(discord.ui.View):
-    def __init__(self, bot, bet_amount):
+    def __init__(self, bot, game, bet_amount):
         super().__init__(timeout=180)
         self.bot = bot
+        self.game = game
         self.bet_amount = bet_amount
         self.selected_bets = set()
         
@@ -68,13 +194,8 @@ class BetView(discord.ui.View):
             await interaction.response.send_message("Please select at least one bet option.", ephemeral=True)
             return
 
-        user = interaction.user
-        user_id = str(user.id)
-        guild_id = interaction.guild.id
-        bal = get_balance(guild_id, user_id)
-
-        if bal["pocket"] < self.bet_amount:
-            await interaction.response.send_message("You don't have enough money.", ephemeral=True)
+        if not self.game.open:
+            await interaction.response.send_message("This round has already spun.", ephemeral=True)
             return
 
         split_amount = self.bet_amount // len(self.selected_bets)
@@ -82,9 +203,20 @@ class BetView(discord.ui.View):
             await interaction.response.send_message("Your bet is too small to split.", ephemeral=True)
             return
 
-        update_balance(guild_id, user.id, -self.bet_amount, "pocket")
-        active_game["bets"][user_id] = {"amount": self.bet_amount, "choices": list(self.selected_bets)}
-        active_game["participants"].add(interaction.user)
+        user = interaction.user
+        try:
+            await transfer([{"user_id": user.id, "location": "pocket", "amount": -self.bet_amount}])
+        except InsufficientFunds:
+            await interaction.response.send_message("You don't have enough money.", ephemeral=True)
+            return
+
+        # The wheel may have spun while the stake was being taken
+        if not self.game.open:
+            await transfer([{"user_id": user.id, "location": "pocket", "amount": self.bet_amount}])
+            await interaction.response.send_message("This round has already spun; your bet was refunded.", ephemeral=True)
+            return
+
+        self.game.place(user.id, self.bet_amount, self.selected_bets)
 
         await interaction.response.send_message(
             f"Your bet of ${self.bet_amount} was split across: {', '.join(self.selected_bets)}", ephemeral=True
@@ -93,14 +225,19 @@ class BetView(discord.ui.View):
 class Roulette(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.engine = RouletteEngine()
+
+    async def cog_unload(self):
+        # Stakes were taken when the bets were placed, so open rounds must not just vanish
+        await self.engine.close()
 
     @commands.command(aliases=['spin', 'bet'])
-    @commands.cooldown(1, 5, commands.BucketType.member)
+    @prefix_cooldown("roulette", 5)
     async def roulette(self, ctx, bet: str):
         await self.start_roulette(ctx, bet)
 
     @app_commands.command(name="roulette", description="Bet on a roulette spin (use 'all' to bet everything)")
-    @app_commands.checks.cooldown(1, 5, key=lambda i: (i.guild_id, i.user.id))
+    @slash_cooldown("roulette", 5)
     @app_commands.describe(bet="Amount to bet or type 'all'")
     async def roulette_slash(self, interaction: discord.Interaction, bet: str):
         await self.start_roulette(interaction, bet)
@@ -109,7 +246,7 @@ class Roulette(commands.Cog):
         user = ctx_or_interaction.user if isinstance(ctx_or_interaction, discord.Interaction) else ctx_or_interaction.author
         user_id = str(user.id)
         guild_id = ctx_or_interaction.guild.id if isinstance(ctx_or_interaction, discord.Interaction) else ctx_or_interaction.guild.id
-        balance = get_balance(str(guild_id), str(user_id))
+        balance = await get_balance(str(guild_id), str(user_id), fields=("pocket",))
 
         if bet.lower() == "all":
             bet_amount = balance["pocket"]
@@ -123,76 +260,29 @@ class Roulette(commands.Cog):
             await self._send(ctx_or_interaction, "Insufficient pocket balance.", True)
             return
 
-        if active_game["status"] == "active":
-            await self.join_existing_game(ctx_or_interaction, bet_amount)
+        # Each channel runs its own round; the engine spins it when betting closes
+        game, started = self.engine.open_round(ctx_or_interaction.channel)
+        if not started:
+            await self.join_existing_game(ctx_or_interaction, game, bet_amount)
             return
 
-        active_game["bets"].clear()
-        active_game["participants"].clear()
-        active_game["status"] = "active"
-
         embed = discord.Embed(title="Roulette Started", description="Select your bets from the menus below.", color=discord.Color.blurple())
-        embed.set_footer(text="Others can join for 20 seconds.")
+        embed.set_footer(text=f"Others can join for {ROUND_DURATION} seconds.")
 
-        view = BetView(self.bot, bet_amount)
+        view = BetView(self.bot, game, bet_amount)
         if isinstance(ctx_or_interaction, discord.Interaction):
             await ctx_or_interaction.response.send_message(embed=embed, view=view)
-            sent = await ctx_or_interaction.original_response()
         else:
-            sent = await ctx_or_interaction.send(embed=embed, view=view)
-
-        active_game["message_id"] = sent.id
-        await asyncio.sleep(20)
-        await self.run_roulette(sent.channel)
+            await ctx_or_interaction.send(embed=embed, view=view)
 
-    async def join_existing_game(self, ctx_or_interaction, bet_amount):
+    async def join_existing_game(self, ctx_or_interaction, game, bet_amount):
         embed = discord.Embed(title="Join Roulette", description="You joined the current round. Pick your bets:", color=discord.Color.blurple())
-        view = BetView(self.bot, bet_amount)
+        view = BetView(self.bot, game, bet_amount)
         if isinstance(ctx_or_interaction, discord.Interaction):
             await ctx_or_interaction.response.send_message(embed=embed, view=view, ephemeral=True)
         else:
             await ctx_or_interaction.send(embed=embed, view=view)
 
-    async def run_roulette(self, channel):
-        result_number = random.randint(0, 36)
-        if result_number in RED_NUMBERS:
-            result = ["Red", str(result_number)]
-        elif result_number in BLACK_NUMBERS:
-            result = ["Black", str(result_number)]
-        else:
-            result = ["Green", str(result_number)]
-
-        winners = []
-        for user_id, info in active_game["bets"].items():
-            user = self.bot.get_user(int(user_id))
-            guild = channel.guild
-            
-            winning_choices = [choice for choice in info["choices"] if choice in result]
-            if winning_choices:
-                share = info["amount"] // len(info["choices"])
-                total_winnings = 0
-                for choice in winning_choices:
-                    winnings = share * WIN_MULTIPLIERS[choice]
-                    total_winnings += winnings
-                
-                if total_winnings > 0:
-                    update_balance(str(guild.id), str(user.id), total_winnings, "pocket")
-                    winners.append(f"<@{user_id}> won ${total_winnings}")
-
-        result_embed = discord.Embed(
-            title="Roulette Result", 
-            description=f"The ball landed on **{result_number}** ({result[0]})!", 
-            color=discord.Color.green()
-        )
-        
-        if winners:
-            result_embed.add_field(name="Winners", value="\n".join(winners), inline=False)
-        else:
-            result_embed.add_field(name="No Winners", value="Better luck next time!", inline=False)
-
-        await channel.send(embed=result_embed)
-        active_game["status"] = "idle"
-
     async def _send(self, ctx_or_interaction, content, ephemeral=False):
         if isinstance(ctx_or_interaction, discord.Interaction):
             await ctx_or_interaction.response.send_message(content, ephemeral=ephemeral)
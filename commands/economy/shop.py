@@ -1,12 +1,12 @@
 import discord
-import os
 from discord.ext import commands
 from discord import app_commands
 import datetime
 import time
 import random
-from utils.database import update_balance, get_balance, get_shop_items, update_item_stock, update_bank_limit, update_luck, add_to_inventory
+from utils.database_async import update_balance, get_balance, purchase_item, update_bank_limit, update_luck, add_to_inventory, InsufficientFunds, OutOfStock
 from utils.feedback import add_feedback_buttons
+from utils.shop_catalog import shop_catalog
 
 class Shop(commands.Cog):
     def __init__(self, bot):
@@ -33,17 +33,11 @@ class Shop(commands.Cog):
         # Get user ID
         user_id = ctx_or_interaction.author.id if hasattr(ctx_or_interaction, 'author') else ctx_or_interaction.user.id
         
-        # Get shop items
-        items = get_shop_items()
+        # Get shop items; served from memory, restocked in the background
+        items = await shop_catalog.items()
         
         # Determine when shop refreshes
-        from pymongo import MongoClient
-        mongo_client = MongoClient(os.environ.get("MONGO_URI"))
-        db = mongo_client['discord_economy']
-        shop_data = db.shop.find_one({"id": "current_shop"})
-        last_reset = shop_data.get("last_reset", time.time()) if shop_data else time.time()
-        next_reset = last_reset + 10800  # 3 hours in seconds
-        next_reset_timestamp = int(next_reset)
+        next_reset_timestamp = int(shop_catalog.next_reset)
         
         # Create embed with fancy styling
         embed = discord.Embed(
@@ -77,7 +71,7 @@ class Shop(commands.Cog):
             
         # Get user balance
         try:
-            balance = get_balance(None, user_id)
+            balance = await get_balance(None, user_id, fields=("pocket", "bank", "bank_limit"))
             pocket_balance = balance.get('pocket', 0)
             bank_balance = balance.get('bank', 0)
             bank_limit = balance.get('bank_limit', 10000)
@@ -108,15 +102,8 @@ class Shop(commands.Cog):
         user = ctx_or_interaction.author if hasattr(ctx_or_interaction, 'author') else ctx_or_interaction.user
         user_id = user.id
         
-        # Get shop items
-        items = get_shop_items()
-        
-        # Find the requested item
-        target_item = None
-        for item in items:
-            if item["id"] == item_id:
-                target_item = item
-                break
+        # Find the requested item in the in-memory catalog
+        target_item = await shop_catalog.get(item_id)
                 
         # Check if the item exists
         if not target_item:
@@ -146,7 +133,7 @@ class Shop(commands.Cog):
             
         # Check if user has enough money
         try:
-            balance = get_balance(None, user_id)
+            balance = await get_balance(None, user_id, fields=("pocket", "bank_limit", "luck"))
             pocket_balance = balance.get('pocket', 0)
             
             if pocket_balance < target_item["price"]:
@@ -161,22 +148,29 @@ class Shop(commands.Cog):
                     await ctx_or_interaction.send(embed=embed)
                 return
                 
-            # Process purchase
-            success = update_balance(None, user_id, -target_item["price"])
-            if not success:
-                embed = discord.Embed(
-                    title="❌ Transaction Failed",
-                    description="There was an error processing your transaction. Please try again.",
-                    color=0xE74C3C
-                )
+            # Take one unit and debit the price together; neither lands if the other can't
+            try:
+                purchased, new_balance = await purchase_item(user_id, target_item["id"])
+            except (OutOfStock, InsufficientFunds) as e:
+                if isinstance(e, OutOfStock):
+                    shop_catalog.set_stock(target_item["id"], 0)
+                    embed = discord.Embed(
+                        title="❌ Out of Stock",
+                        description=f"Sorry, **{target_item['name']}** just sold out. Check back after the next restock!",
+                        color=0xE74C3C
+                    )
+                else:
+                    embed = discord.Embed(
+                        title="❌ Transaction Failed",
+                        description="Your balance changed before the purchase went through. Please try again.",
+                        color=0xE74C3C
+                    )
                 if isinstance(ctx_or_interaction, discord.Interaction):
                     await ctx_or_interaction.response.send_message(embed=embed, ephemeral=True)
                 else:
                     await ctx_or_interaction.send(embed=embed)
                 return
-                
-            # Update item stock
-            update_item_stock(target_item["id"], -1)
+            shop_catalog.set_stock(purchased["id"], purchased["stock"])
             
             # Handle item effects
             effect_description = ""
@@ -184,14 +178,14 @@ class Shop(commands.Cog):
                 # Increase bank limit by 5000
                 current_limit = balance.get("bank_limit", 10000)
                 new_limit = current_limit + 5000
-                update_bank_limit(user_id, new_limit)
+                await update_bank_limit(user_id, new_limit)
                 effect_description = f"Your bank limit has increased from ${current_limit:,} to ${new_limit:,}!"
                 
             elif target_item["id"] == "luck_boost":
                 # Increase luck by 10%
                 current_luck = balance.get("luck", 1.0)
                 new_luck = current_luck + 0.1
-                update_luck(user_id, new_luck)
+                await update_luck(user_id, new_luck)
                 effect_description = f"Your luck has increased from {current_luck:.1f}x to {new_luck:.1f}x!"
                 
             elif target_item["id"] == "shield":
@@ -201,7 +195,7 @@ class Shop(commands.Cog):
                     "acquired": time.time(),
                     "expires": time.time() + 86400  # 24 hours
                 }
-                add_to_inventory(user_id, shield_data)
+                await add_to_inventory(user_id, shield_data)
                 expiry_time = int(shield_data["expires"])
                 effect_description = f"You are now protected from theft for 24 hours! Expires <t:{expiry_time}:R>."
                 
@@ -211,7 +205,7 @@ class Shop(commands.Cog):
                     "type": target_item["id"],
                     "acquired": time.time()
                 }
-                add_to_inventory(user_id, item_data)
+                await add_to_inventory(user_id, item_data)
                 if target_item["id"] == "mystery_box":
                     # Random reward from mystery box
                     rewards = [
@@ -223,7 +217,7 @@ class Shop(commands.Cog):
                     ]
                     import random
                     reward = random.choice(rewards)
-                    update_balance(None, user_id, reward["amount"])
+                    await update_balance(None, user_id, reward["amount"])
                     effect_description = f"You opened the mystery box and {reward['text']}"
                 else:
                     effect_description = "The medal has been added to your collection!"
@@ -238,8 +232,7 @@ class Shop(commands.Cog):
             if effect_description:
                 embed.add_field(name="✨ Item Effect", value=effect_description, inline=False)
                 
-            new_balance = pocket_balance - target_item["price"]
-            embed.set_footer(text=f"Remaining balance: ${new_balance:,}")
+            embed.set_footer(text=f"Remaining balance: ${new_balance['pocket']:,}")
             
             # Add feedback buttons for purchase
             feedback_view = add_feedback_buttons("buy", user.id)
@@ -2,7 +2,7 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import random
-from utils.database import update_balance
+from utils.database_async import update_balance
   
 class Slut(commands.Cog):  
     def __init__(self, bot):  
@@ -37,7 +37,7 @@ class Slut(commands.Cog):
   
         result_message = random.choice(messages)  
         guild_id = ctx_or_interaction.guild.id
-        update_balance(guild_id, user_id, earnings)  
+        await update_balance(guild_id, user_id, earnings)  
   
         embed = discord.Embed(title="U MADE SOME MONEY DIRTY SLUTTTTT",   
                             description=result_message,  
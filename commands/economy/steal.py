@@ -3,19 +3,20 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import random
-from utils.database import get_balance, update_balance
+from utils.database_async import get_balance, update_balance, transfer, InsufficientFunds
+from utils.cooldowns import prefix_cooldown, slash_cooldown
 
 class Steal(commands.Cog):  
     def __init__(self, bot):  
         self.bot = bot  
 
     @commands.command(help="Attempt to steal money from another user.", aliases=['rob', 'thief'])  
-    @commands.cooldown(1, 1800, commands.BucketType.member)  # 30 minutes  
+    @prefix_cooldown("steal", 1800)  # 30 minutes  
     async def steal(self, ctx, target: discord.Member):  
         await self._do_steal(ctx, ctx.author, target)  
 
     @app_commands.command(name="steal", description="Attempt to steal money from another user.")  
-    @app_commands.checks.cooldown(1, 1800, key=lambda i: (i.guild_id, i.user.id))  
+    @slash_cooldown("steal", 1800)  
     async def steal_slash(self, interaction: discord.Interaction, target: discord.Member):  
         await self._do_steal(interaction, interaction.user, target)  
 
@@ -30,8 +31,8 @@ class Steal(commands.Cog):
                 )  
                 return await self._send(ctx_or_interaction, embed, True)  
 
-            thief_bal = get_balance(guild_id, thief.id)
-            target_bal = get_balance(guild_id, target.id)  
+            thief_bal = await get_balance(guild_id, thief.id, fields=("pocket",))
+            target_bal = await get_balance(guild_id, target.id, fields=("pocket",))  
 
             if target_bal["pocket"] <= 0:  
                 embed = discord.Embed(  
@@ -43,8 +44,8 @@ class Steal(commands.Cog):
 
             if random.random() < 0.2:  # 20% chance to get caught  
                 fine = random.randint(100, 10000)
-                thief_bal = get_balance(guild_id, thief.id)
-                update_balance(guild_id, thief.id, -fine)
+                thief_bal = await get_balance(guild_id, thief.id, fields=("pocket",))
+                await update_balance(guild_id, thief.id, -fine)
                 new_balance = thief_bal["pocket"] - fine
                 in_debt = new_balance < 0
                 
@@ -59,8 +60,18 @@ class Steal(commands.Cog):
 
             steal_percent = random.uniform(0.03, 1.0)  
             amount_stolen = max(1, int(target_bal["pocket"] * steal_percent))  
-            update_balance(guild_id, thief.id, amount_stolen)
-            update_balance(guild_id, target.id, -amount_stolen)  
+            try:
+                await transfer([
+                    {"user_id": target.id, "location": "pocket", "amount": -amount_stolen},
+                    {"user_id": thief.id, "location": "pocket", "amount": amount_stolen}
+                ])
+            except InsufficientFunds:
+                embed = discord.Embed(
+                    title="Oops!",
+                    description=f"{target.display_name} spent their cash before you could grab it!",
+                    color=discord.Color.red()
+                )
+                return await self._send(ctx_or_interaction, embed, True)
 
             embed = discord.Embed(  
                 title="Success! **You stole some cash!**",  
@@ -2,7 +2,7 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from utils.database import get_balance, save_balance
+from utils.database_async import get_balance, transfer, InsufficientFunds
 
 class Withdraw(commands.Cog):
     def __init__(self, bot):
@@ -23,7 +23,7 @@ class Withdraw(commands.Cog):
             guild_id = ctx_or_interaction.guild.id
             
             try:
-                balance = get_balance(guild_id, user.id)
+                balance = await get_balance(guild_id, user.id, fields=("bank",))
             except Exception as db_error:
                 print(f"Database error in withdraw for user {user.id} in guild {guild_id}: {db_error}")
                 error_embed = discord.Embed(
@@ -80,14 +80,22 @@ class Withdraw(commands.Cog):
                 color=discord.Color.red()
             )
         else:
-            balance["bank"] -= amount_to_withdraw
-            balance["pocket"] += amount_to_withdraw
-            save_balance(guild_id, user.id, balance)
-            embed = discord.Embed(
-                title="Withdrawal Successful",
-                description=f"Withdrew ${amount_to_withdraw} from your bank!",
-                color=discord.Color.green()
-            )
+            try:
+                await transfer([
+                    {"user_id": user.id, "location": "bank", "amount": -amount_to_withdraw},
+                    {"user_id": user.id, "location": "pocket", "amount": amount_to_withdraw}
+                ])
+                embed = discord.Embed(
+                    title="Withdrawal Successful",
+                    description=f"Withdrew ${amount_to_withdraw} from your bank!",
+                    color=discord.Color.green()
+                )
+            except InsufficientFunds:
+                embed = discord.Embed(
+                    title="Error",
+                    description="You don't have that much money in your bank!",
+                    color=discord.Color.red()
+                )
 
         if isinstance(ctx_or_interaction, discord.Interaction):
             await ctx_or_interaction.response.send_message(embed=embed)
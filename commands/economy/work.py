@@ -2,19 +2,20 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import random
-from utils.database import update_balance
+from utils.database_async import update_balance
+from utils.cooldowns import prefix_cooldown, slash_cooldown
 
 class Work(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
     @commands.command(help="Work for money, cooldown = 10 minutes.", aliases=['w'])
-    @commands.cooldown(1, 600, commands.BucketType.member)
+    @prefix_cooldown("work", 600)
     async def work(self, ctx):
         await self.do_work_prefix(ctx)
 
     @app_commands.command(name="work", description="Work for money (10 min cooldown)")
-    @app_commands.checks.cooldown(1, 600, key=lambda i: (i.guild_id, i.user.id))
+    @slash_cooldown("work", 600)
     async def work_slash(self, interaction: discord.Interaction):
         await self.do_work_slash(interaction)
 
@@ -22,7 +23,7 @@ class Work(commands.Cog):
         try:
             earnings = random.randint(1000, 5000)
             try:
-                update_balance(ctx.guild.id, ctx.author.id, earnings)
+                await update_balance(ctx.guild.id, ctx.author.id, earnings)
             except Exception as db_error:
                 print(f"Database error in work for user {ctx.author.id} in guild {ctx.guild.id}: {db_error}")
                 error_embed = discord.Embed(
@@ -42,7 +43,7 @@ class Work(commands.Cog):
 
     async def do_work_slash(self, interaction: discord.Interaction):
         earnings = random.randint(1000, 5000)
-        update_balance(interaction.guild.id, interaction.user.id, earnings)
+        await update_balance(interaction.guild.id, interaction.user.id, earnings)
         msg = f"You worked hard and earned ${earnings}!"
         embed = discord.Embed(title="You finally did a job pig!", description=msg, color=discord.Color.orange())
         
@@ -2,7 +2,7 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from utils.database import db
+from utils.prefixes import prefix_cache
 
 class Prefix(commands.Cog):
     def __init__(self, bot):
@@ -15,14 +15,13 @@ class Prefix(commands.Cog):
             user.id == user.guild.owner_id
         )
 
-    def get_prefix(self, guild_id: str):
-        prefix_data = db.prefixes.find_one({"guild_id": str(guild_id)})
-        return prefix_data["prefix"] if prefix_data else "?"
+    async def get_prefix(self, guild_id: str):
+        return await prefix_cache.resolve(guild_id)
 
     @commands.command(help="Change the bot's prefix for this server")
     async def prefix(self, ctx, new_prefix: str = None):
         if not new_prefix:
-            current = self.get_prefix(ctx.guild.id)
+            current = await self.get_prefix(ctx.guild.id)
             await ctx.send(f"Current prefix is: `{current}`")
             return
 
@@ -30,11 +29,7 @@ class Prefix(commands.Cog):
             await ctx.send("You don't have permission to change the prefix!")
             return
 
-        db.prefixes.update_one(
-            {"guild_id": str(ctx.guild.id)},
-            {"$set": {"prefix": new_prefix}},
-            upsert=True
-        )
+        await prefix_cache.set(ctx.guild.id, new_prefix)
         await ctx.send(f"Prefix changed to: `{new_prefix}`")
 
 async def setup(bot):
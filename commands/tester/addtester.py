@@ -1,9 +1,7 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import pymongo
-import os
-from pymongo import MongoClient
+from utils.mongo import get_database
 
 def is_owner():
     """Check if the user is the owner (545609811354583040)"""
@@ -15,13 +13,8 @@ class AddTester(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.owner_id = 545609811354583040
-        # Connect to MongoDB for storing testers
-        self.mongo_client = MongoClient(os.environ.get("MONGO_URI"))
-        self.db = self.mongo_client['discord_economy']
-        
-        # Create testers collection if it doesn't exist
-        if "testers" not in self.db.list_collection_names():
-            self.db.create_collection("testers")
+        # Testers are stored in the shared database (collection is created on first insert)
+        self.db = get_database()
     
     @commands.command(name="addtester", help="Add a user as a tester (Owner only)")
     @is_owner()
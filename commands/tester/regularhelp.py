@@ -1,15 +1,13 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import os
-from pymongo import MongoClient
+from utils.mongo import get_database
 
 # The owner ID
 OWNER_ID = 545609811354583040
 
 # MongoDB connection for checking testers
-mongo_client = MongoClient(os.environ.get("MONGO_URI"))
-db = mongo_client['discord_economy']
+db = get_database()
 
 def is_tester():
     """Check if user is a tester or the owner"""
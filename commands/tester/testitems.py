@@ -1,16 +1,15 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import pymongo
-import os
-from pymongo import MongoClient
+from utils.mongo import get_database
+from utils.database import invalidate_balance
+from utils.database_async import add_to_inventory, run_in_db_executor
 
 # The owner ID
 OWNER_ID = 545609811354583040
 
 # MongoDB connection
-mongo_client = MongoClient(os.environ.get("MONGO_URI"))
-db = mongo_client['discord_economy']
+db = get_database()
 
 def is_tester():
     """Check if user is a tester or the owner"""
@@ -38,9 +37,7 @@ def is_tester_interaction(interaction):
 class TestItems(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        # Connect to MongoDB
-        self.mongo_client = MongoClient(os.environ.get("MONGO_URI"))
-        self.db = self.mongo_client['discord_economy']
+        self.db = get_database()
         
         # List of test items that can be added
         self.test_items = {
@@ -106,11 +103,7 @@ class TestItems(commands.Cog):
         item_details = self.test_items[item_name]
         
         # Add item to user's inventory
-        self.db.economies.update_one(
-            {"user_id": str(user_id)},
-            {"$push": {"inventory": item_name}},
-            upsert=True
-        )
+        await add_to_inventory(user_id, item_name)
         
         # Create response embed
         embed = discord.Embed(
@@ -146,11 +139,14 @@ class TestItems(commands.Cog):
         user_id = ctx_or_interaction.author.id if hasattr(ctx_or_interaction, 'author') else ctx_or_interaction.user.id
         
         # Reset user's inventory
-        self.db.economies.update_one(
+        await run_in_db_executor(
+            self.db.economies.update_one,
             {"user_id": str(user_id)},
-            {"$set": {"inventory": []}},
+            {"$set": {"items": {}, "timed_items": []}, "$unset": {"shield_expires": ""}},
             upsert=True
         )
+        # Only items changed, so the cached pocket and bank (and the user's rank) are still good
+        invalidate_balance(user_id, ("inventory", "timed_items", "shield_expires"))
         
         # Create response embed
         embed = discord.Embed(
@@ -1,16 +1,14 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import pymongo
-import os
-from pymongo import MongoClient
+from utils.mongo import get_database
+from utils.database_async import increment_balance, save_balance
 
 # The owner ID
 OWNER_ID = 545609811354583040
 
 # MongoDB connection
-mongo_client = MongoClient(os.environ.get("MONGO_URI"))
-db = mongo_client['discord_economy']
+db = get_database()
 
 def is_tester():
     """Check if user is a tester or the owner"""
@@ -38,9 +36,7 @@ def is_tester_interaction(interaction):
 class TestMoney(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        # Connect to MongoDB
-        self.mongo_client = MongoClient(os.environ.get("MONGO_URI"))
-        self.db = self.mongo_client['discord_economy']
+        self.db = get_database()
     
     @commands.command(name="testmoney", help="Get money for testing purposes (Testers only)")
     @is_tester()
@@ -81,28 +77,8 @@ class TestMoney(commands.Cog):
         # Get user ID
         user_id = ctx_or_interaction.author.id if hasattr(ctx_or_interaction, 'author') else ctx_or_interaction.user.id
         
-        # Add money to user's pocket
-        user_data = self.db.economies.find_one({"user_id": str(user_id)})
-        
-        if user_data:
-            # Update existing user
-            current_pocket = user_data.get("pocket", 0)
-            new_pocket = current_pocket + amount
-            
-            self.db.economies.update_one(
-                {"user_id": str(user_id)},
-                {"$set": {"pocket": new_pocket}}
-            )
-        else:
-            # Create new user entry
-            self.db.economies.insert_one({
-                "user_id": str(user_id),
-                "pocket": amount,
-                "bank": 0,
-                "bank_limit": 10000,  # Default bank limit
-                "luck": 0,            # Default luck factor
-                "inventory": []
-            })
+        # Add money to user's pocket (creating the account if needed); keeps networth, cache and ranks in step
+        await increment_balance(user_id, {"pocket": amount})
             
         # Create response embed
         embed = discord.Embed(
@@ -136,11 +112,7 @@ class TestMoney(commands.Cog):
         user_id = ctx_or_interaction.author.id if hasattr(ctx_or_interaction, 'author') else ctx_or_interaction.user.id
         
         # Reset user's money
-        self.db.economies.update_one(
-            {"user_id": str(user_id)},
-            {"$set": {"pocket": 0, "bank": 0, "bank_limit": 10000, "luck": 0}},
-            upsert=True
-        )
+        await save_balance(None, user_id, {"pocket": 0, "bank": 0, "bank_limit": 10000, "luck": 0})
         
         # Create response embed
         embed = discord.Embed(
@@ -1,14 +1,12 @@
 import discord
 from discord.ext import commands
-import os
-from pymongo import MongoClient
+from utils.mongo import get_database
 
 # The owner ID
 OWNER_ID = 545609811354583040
 
 # MongoDB connection
-mongo_client = MongoClient(os.environ.get("MONGO_URI"))
-db = mongo_client['discord_economy']
+db = get_database()
 
 def is_tester():
     """Check if user is a tester or the owner"""
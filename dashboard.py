@@ -3,7 +3,7 @@ import time
 import json
 import datetime
 from functools import wraps
-from pymongo import MongoClient
+from utils.mongo import get_client, DATABASE_NAME
 from flask import Flask, render_template, redirect, url_for, request, flash, jsonify, session
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from dotenv import load_dotenv
@@ -23,8 +23,8 @@ login_manager.login_view = 'login'
 
 # Connect to MongoDB
 MONGO_URI = os.environ.get("MONGO_URI")
-mongo_client = MongoClient(MONGO_URI)
-db = mongo_client['discord_economy']
+mongo_client = get_client(MONGO_URI)
+db = mongo_client[DATABASE_NAME]
 
 # Ensure admin user exists
 OWNER_ID = "545609811354583040"  # Your Discord ID
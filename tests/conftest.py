@@ -0,0 +1,27 @@
+"""
+Shared test setup: every test runs against the in-memory MongoDB backend.
+
+MONGO_BACKEND is read when utils.mongo is first imported, so it is set here
+before any test module imports the bot's utilities.
+"""
+import os
+import sys
+
+os.environ["MONGO_BACKEND"] = "memory"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+@pytest.fixture
+def economy():
+    """The economies database with no accounts, shop or cooldowns, and cold caches."""
+    from utils import database
+    from utils.rank_index import rank_index
+
+    db_conn = database.DatabaseConnection.get_instance()
+    for collection in (db_conn.economies, db_conn.shop, db_conn.db.cooldowns):
+        collection.delete_many({})
+    database.balance_cache.invalidate()
+    rank_index.load([])
+    yield database
+    database.balance_cache.invalidate()
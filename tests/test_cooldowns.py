@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.cooldowns import CooldownStore
+
+DAY = 86400
+
+@pytest.fixture
+def store(economy):
+    return CooldownStore()
+
+def test_start_only_succeeds_once_the_previous_cooldown_ended(store):
+    now = 1_000_000.0
+    assert store._start("work:1", now, 60) == (None, None)
+
+    until, _ = store._start("work:1", now + 10, 60)
+    assert until == pytest.approx(now + 60)
+
+    assert store._start("work:1", now + 60, 60) == (None, None)
+    assert store.collection.count_documents({"_id": "work:1"}) == 1
+
+def test_cooldowns_are_per_user_and_command(store):
+    now = 1_000_000.0
+    assert store._start("work:1", now, 60)[0] is None
+    assert store._start("work:2", now, 60)[0] is None
+    assert store._start("daily:1", now, 60)[0] is None
+
+def test_streak_grows_within_the_window_and_resets_after(store):
+    now = 1_000_000.0
+    assert store._start("daily:1", now, DAY, 2 * DAY) == (None, 1)
+    assert store._start("daily:1", now + DAY, DAY, 2 * DAY) == (None, 2)
+    # Claimed again too early: rejected, streak untouched
+    assert store._start("daily:1", now + DAY + 5, DAY, 2 * DAY)[1] is None
+    assert store._start("daily:1", now + 2 * DAY, DAY, 2 * DAY) == (None, 3)
+    # Missed the window
+    assert store._start("daily:1", now + 5 * DAY, DAY, 2 * DAY) == (None, 1)
+
+def test_release_ends_the_cooldown_and_undoes_the_streak(store):
+    now = time.time()
+    store._start("daily:1", now - DAY, DAY, 2 * DAY)
+    store._start("daily:1", now, DAY, 2 * DAY)
+
+    asyncio.run(store.release(1, "daily", streak=True))
+    assert store._start("daily:1", time.time(), DAY, 2 * DAY) == (None, 2)
+
+def test_acquire_answers_running_cooldowns_from_the_cache(store):
+    async def main():
+        assert await store.acquire(1, "work", 60) == 0
+        first = await store.acquire(1, "work", 60)
+        second = await store.acquire(1, "work", 60)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert 0 < second <= first <= 60
+    assert store.stats()["hits"] == 2
+
+def test_acquire_sees_cooldowns_started_by_another_process(store):
+    other = CooldownStore()
+
+    async def main():
+        assert await other.acquire(1, "work", 60) == 0
+        return await store.acquire(1, "work", 60)
+
+    assert 0 < asyncio.run(main()) <= 60
+    assert store.stats()["misses"] == 1
+
+def test_claim_streak(store):
+    async def main():
+        first = await store.claim_streak(1, "daily", DAY, 2 * DAY)
+        again = await store.claim_streak(1, "daily", DAY, 2 * DAY)
+        return first, again
+
+    first, again = asyncio.run(main())
+    assert first == (0, 1)
+    assert again[0] > 0 and again[1] is None
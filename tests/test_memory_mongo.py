@@ -0,0 +1,133 @@
+import pytest
+from pymongo import ReturnDocument, UpdateOne, errors
+
+from utils.memory_mongo import MemoryClient
+
+@pytest.fixture
+def collection():
+    return MemoryClient()["test"]["things"]
+
+def ids(cursor):
+    return [doc["_id"] for doc in cursor]
+
+def test_queries_through_and_around_indexes(collection):
+    collection.create_index([("user_id", 1)])
+    collection.insert_many([{"_id": i, "user_id": str(i % 3), "score": i} for i in range(9)])
+
+    assert ids(collection.find({"user_id": "1"})) == [1, 4, 7]
+    assert ids(collection.find({"user_id": {"$in": ["0", "2"]}, "score": {"$gte": 5}}).sort("score", -1)) == [8, 6, 5]
+    assert ids(collection.find({"score": {"$nin": list(range(2, 9))}})) == [0, 1]
+    assert collection.count_documents({"$or": [{"score": 0}, {"user_id": "2"}]}) == 4
+    assert ids(collection.find({}).sort("score", -1).skip(1).limit(2)) == [7, 6]
+
+def test_updates_keep_indexes_current(collection):
+    collection.create_index([("user_id", 1)])
+    collection.insert_one({"_id": 1, "user_id": "a", "pocket": 5})
+
+    collection.update_one({"user_id": "a"}, {"$set": {"user_id": "b"}, "$inc": {"pocket": 10}})
+    assert collection.find_one({"user_id": "a"}) is None
+    assert collection.find_one({"user_id": "b"}) == {"_id": 1, "user_id": "b", "pocket": 15}
+
+    collection.delete_one({"user_id": "b"})
+    assert collection.find_one({"user_id": "b"}) is None
+
+def test_upsert_seeds_from_the_filter(collection):
+    result = collection.update_one({"user_id": "a"}, {"$inc": {"pocket": 5}}, upsert=True)
+    assert result.upserted_id is not None
+    assert collection.find_one({"user_id": "a"}, {"_id": 0}) == {"user_id": "a", "pocket": 5}
+
+def test_pipeline_updates(collection):
+    collection.insert_one({"_id": 1, "pocket": 10})
+    collection.update_one({"_id": 1}, [{"$set": {"pocket": {"$max": [0, {"$add": ["$pocket", -25]}]}}}])
+    assert collection.find_one({"_id": 1})["pocket"] == 0
+
+def test_find_one_and_update_returns_before_or_after(collection):
+    collection.insert_one({"_id": 1, "stock": 1})
+    before = collection.find_one_and_update({"_id": 1, "stock": {"$gt": 0}}, {"$inc": {"stock": -1}})
+    assert before["stock"] == 1
+    assert collection.find_one_and_update({"_id": 1, "stock": {"$gt": 0}}, {"$inc": {"stock": -1}}) is None
+
+    after = collection.find_one_and_update({"_id": 1}, {"$inc": {"stock": 3}}, return_document=ReturnDocument.AFTER)
+    assert after["stock"] == 3
+
+def test_unique_index(collection):
+    collection.create_index([("id", 1)], unique=True)
+    collection.insert_one({"id": "shop"})
+    with pytest.raises(errors.DuplicateKeyError):
+        collection.insert_one({"id": "shop"})
+    with pytest.raises(errors.DuplicateKeyError):
+        collection.update_one({"id": "other"}, {"$set": {"id": "shop"}}, upsert=True)
+    assert collection.count_documents({}) == 1
+
+def test_bulk_write_counts(collection):
+    collection.insert_many([{"_id": 1, "n": 0}, {"_id": 2, "n": 0}])
+    result = collection.bulk_write([
+        UpdateOne({"_id": 1}, {"$inc": {"n": 1}}),
+        UpdateOne({"_id": 3}, {"$inc": {"n": 1}}, upsert=True),
+        UpdateOne({"_id": 4, "n": {"$gt": 0}}, {"$inc": {"n": 1}}),
+    ])
+    assert (result.matched_count, result.modified_count, result.upserted_count) == (1, 1, 1)
+
+def test_failed_transaction_rolls_back_only_what_it_touched(collection):
+    client = collection.database.client
+    other = client["test"]["others"]
+    collection.create_index([("user_id", 1)])
+    collection.insert_many([{"_id": i, "user_id": str(i), "pocket": 10} for i in range(5)])
+
+    def transaction(session):
+        collection.update_one({"_id": 1}, {"$inc": {"pocket": 5}}, session=session)
+        collection.update_one({"_id": 1}, {"$inc": {"pocket": 5}}, session=session)
+        collection.delete_one({"_id": 2}, session=session)
+        collection.insert_one({"_id": 9, "user_id": "9"}, session=session)
+        other.insert_one({"x": 1}, session=session)
+        collection.create_index([("pocket", 1)])
+        raise RuntimeError("abort")
+
+    with client.start_session() as session:
+        with pytest.raises(RuntimeError):
+            session.with_transaction(transaction)
+
+    # The deleted document comes back; the updated one keeps its place
+    assert list(collection.find()) == [{"_id": i, "user_id": str(i), "pocket": 10} for i in (0, 1, 3, 4, 2)]
+    assert collection.find_one({"user_id": "2"})["_id"] == 2
+    assert collection.find_one({"user_id": "9"}) is None
+    assert list(other.find()) == []
+    assert "pocket_1" not in collection.index_information()
+    assert client._undo is None
+
+def test_committed_transaction_keeps_its_writes(collection):
+    client = collection.database.client
+    collection.insert_one({"_id": 1, "pocket": 10})
+
+    def transaction(session):
+        collection.update_one({"_id": 1}, {"$inc": {"pocket": 5}}, session=session)
+        return "done"
+
+    with client.start_session() as session:
+        assert session.with_transaction(transaction) == "done"
+    assert collection.find_one({"_id": 1})["pocket"] == 15
+
+def test_nested_transaction_rolls_back_with_the_outer_one(collection):
+    client = collection.database.client
+    collection.insert_one({"_id": 1, "pocket": 10})
+    session = client.start_session()
+
+    def inner(session):
+        collection.update_one({"_id": 1}, {"$inc": {"pocket": 5}})
+
+    def outer(session):
+        session.with_transaction(inner)
+        raise RuntimeError("abort")
+
+    with pytest.raises(RuntimeError):
+        session.with_transaction(outer)
+    assert collection.find_one({"_id": 1})["pocket"] == 10
+
+def test_aggregate(collection):
+    collection.insert_many([{"user_id": str(i % 2), "amount": i} for i in range(6)])
+    result = collection.aggregate([
+        {"$match": {"amount": {"$gt": 0}}},
+        {"$group": {"_id": "$user_id", "total": {"$sum": "$amount"}, "count": {"$sum": 1}}},
+        {"$sort": {"_id": 1}},
+    ])
+    assert list(result) == [{"_id": "0", "total": 6, "count": 2}, {"_id": "1", "total": 9, "count": 3}]
@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+from utils.rank_index import OrderedKeys, RankIndex
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    # Tiny blocks so a few hundred keys exercise block splits, empty blocks and the Fenwick tree
+    monkeypatch.setattr(OrderedKeys, "BLOCK_SIZE", 4)
+
+def test_count_before_matches_sorted_list(small_blocks):
+    rng = random.Random(1)
+    keys = OrderedKeys(rng.sample(range(1000), 50))
+    expected = sorted(keys.head(50))
+
+    for _ in range(2000):
+        key = rng.randrange(1000)
+        if key in expected:
+            assert keys.remove(key)
+            expected.remove(key)
+        else:
+            keys.add(key)
+            expected.append(key)
+            expected.sort()
+        probe = rng.randrange(-1, 1001)
+        assert keys.count_before(probe) == sum(1 for existing in expected if existing < probe)
+        assert len(keys) == len(expected)
+
+    assert keys.head(len(expected) + 5) == expected
+
+def test_remove_missing_key(small_blocks):
+    keys = OrderedKeys([1, 2, 3])
+    assert not keys.remove(5)
+    assert not keys.remove(0)
+    assert keys.remove(2)
+    assert not keys.remove(2)
+    assert keys.head(10) == [1, 3]
+
+def test_emptied_blocks_are_dropped(small_blocks):
+    keys = OrderedKeys(range(20))
+    for key in range(4, 12):
+        keys.remove(key)
+    assert keys.count_before(12) == 4
+    assert keys.count_before(100) == 12
+    keys.add(7)
+    assert keys.count_before(8) == 5
+
+def test_rank_counts_strictly_richer_accounts(small_blocks):
+    index = RankIndex()
+    index.load([
+        {"user_id": "a", "pocket": 100, "bank": 0},
+        {"user_id": "b", "pocket": 50, "bank": 50},
+        {"user_id": "c", "pocket": 10, "bank": 0},
+        {"user_id": "d", "pocket": 500, "bank": 500},
+    ])
+    # Ties share a rank, like the leaderboard
+    assert [index.rank(user_id) for user_id in "dabc"] == [1, 2, 2, 4]
+    assert [row["user_id"] for row in index.top(3)] == ["d", "a", "b"]
+    assert index.rank("nobody") is None
+
+    index.update("c", 0, 2000)
+    assert index.rank("c") == 1
+    assert index.rank("d") == 2
+    assert index.networth("c") == 2000
+    assert index.stats()["accounts"] == 4
+
+def test_guild_ranks_follow_updates_and_membership(small_blocks):
+    index = RankIndex()
+    index.load([{"user_id": str(i), "pocket": i * 10, "bank": 0} for i in range(10)])
+    index.track_guild(1, ["2", "5", "7"])
+
+    assert [row["user_id"] for row in index.top(10, guild_id=1)] == ["7", "5", "2"]
+    assert index.rank("5", guild_id=1) == 2
+    assert index.rank("9", guild_id=1) is None
+
+    index.update("2", 1000, 0)
+    assert index.rank("2", guild_id=1) == 1
+    assert index.rank("2") == 1
+
+    index.add_member(1, "9")
+    assert index.rank("9", guild_id=1) == 2
+    index.remove_member(1, "2")
+    assert index.rank("2", guild_id=1) is None
+    assert [row["user_id"] for row in index.top(10, guild_id=1)] == ["9", "7", "5"]
+
+    index.forget_guild(1)
+    assert not index.is_tracked(1)
+    with pytest.raises(KeyError):
+        index.top(guild_id=1)
+
+def test_reload_rebuilds_tracked_guilds():
+    index = RankIndex()
+    index.track_guild(1, ["a", "b"])
+    assert index.top(guild_id=1) == []
+
+    index.load([{"user_id": "a", "pocket": 5, "bank": 0}, {"user_id": "b", "pocket": 9, "bank": 0}])
+    assert index.ready
+    assert [row["user_id"] for row in index.top(guild_id=1)] == ["b", "a"]
@@ -0,0 +1,184 @@
+import asyncio
+
+import pytest
+from pymongo import errors
+
+from utils.resilience import CircuitBreaker, CircuitOpenError, RetryBudget, RetryPolicy
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr("utils.resilience.time.monotonic", clock)
+    return clock
+
+def policy(max_attempts=3, threshold=3, budget=None):
+    breaker = CircuitBreaker(failure_threshold=threshold, reset_timeout=10)
+    return RetryPolicy(max_attempts=max_attempts, base_delay=0, max_delay=0,
+                       budget=budget or RetryBudget(), breaker=breaker)
+
+def failing(calls, error=errors.AutoReconnect):
+    def func():
+        calls.append(1)
+        raise error("down")
+    return func
+
+def test_breaker_opens_after_threshold_and_fails_fast(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.stats()["rejected"] == 1
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.before_call()
+    breaker.record_failure()
+
+    clock.now += 10
+    assert breaker.before_call() is True
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.before_call() is False
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=10)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 9
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now += 1
+    assert breaker.before_call() is True
+
+def test_cancelled_async_probe_frees_the_probe(clock):
+    retry = policy(max_attempts=1, threshold=1)
+    retry.breaker.record_failure()
+    clock.now += 10
+
+    @retry
+    async def hang():
+        await asyncio.sleep(10)
+
+    @retry
+    async def ping():
+        return "pong"
+
+    async def main():
+        task = asyncio.ensure_future(hang())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return await ping()
+
+    assert asyncio.run(main()) == "pong"
+    assert retry.breaker.state == CircuitBreaker.CLOSED
+
+def test_interrupted_sync_probe_frees_the_probe(clock):
+    retry = policy(max_attempts=1, threshold=1)
+    retry.breaker.record_failure()
+    clock.now += 10
+
+    @retry
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        interrupted()
+    assert retry.breaker.before_call() is True
+
+def test_connection_failures_are_retried_up_to_max_attempts(clock):
+    retry = policy(max_attempts=3, threshold=10)
+    calls = []
+    with pytest.raises(errors.AutoReconnect):
+        retry(failing(calls))()
+    assert len(calls) == 3
+
+def test_other_errors_are_not_retried_and_count_as_success(clock):
+    retry = policy(threshold=1)
+    calls = []
+    with pytest.raises(errors.OperationFailure):
+        retry(failing(calls, errors.OperationFailure))()
+    assert len(calls) == 1
+    assert retry.breaker.state == CircuitBreaker.CLOSED
+
+def test_single_attempt_policy_never_reruns(clock):
+    retry = policy(max_attempts=1, threshold=10)
+    calls = []
+    wrapped = retry(failing(calls))
+    assert wrapped.retries is False
+    with pytest.raises(errors.AutoReconnect):
+        wrapped()
+    assert len(calls) == 1
+
+def test_async_retries(clock):
+    retry = policy(max_attempts=3, threshold=10)
+    calls = []
+
+    @retry
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise errors.AutoReconnect("down")
+        return "ok"
+
+    assert asyncio.run(flaky()) == "ok"
+    assert len(calls) == 3
+    assert flaky.retries is True
+
+def test_nested_calls_make_a_single_attempt(clock):
+    retry = policy(max_attempts=3, threshold=10)
+    inner_calls = []
+    inner = retry(failing(inner_calls))
+
+    @retry
+    def outer():
+        return inner()
+
+    with pytest.raises(errors.AutoReconnect):
+        outer()
+    # The outer call retries; the inner one doesn't multiply the attempts
+    assert len(inner_calls) == 3
+
+def test_retry_budget_limits_retries(clock):
+    retry = policy(max_attempts=5, threshold=100, budget=RetryBudget(ratio=0, max_tokens=2))
+    calls = []
+    with pytest.raises(errors.AutoReconnect):
+        retry(failing(calls))()
+    assert len(calls) == 3
+    assert retry.budget.stats()["exhausted"] == 1
+
+def test_open_circuit_rejects_without_calling(clock):
+    retry = policy(max_attempts=3, threshold=1)
+    calls = []
+    # The first failure opens the circuit, so the retry is rejected instead of run
+    with pytest.raises(CircuitOpenError):
+        retry(failing(calls))()
+    assert len(calls) == 1
+
+    with pytest.raises(CircuitOpenError):
+        retry(failing(calls))()
+    assert len(calls) == 1
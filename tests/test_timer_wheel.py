@@ -0,0 +1,92 @@
+import asyncio
+
+from utils.timer_wheel import TimerWheel
+
+TICK = 0.01
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_timers_fire_in_order_and_batch_per_tick():
+    batches = []
+
+    async def on_expire(items):
+        batches.append(sorted(items))
+
+    async def main():
+        wheel = TimerWheel(on_expire, tick=TICK, slots=8)
+        wheel.schedule(2 * TICK, "a")
+        wheel.schedule(2 * TICK, "b")
+        wheel.schedule(5 * TICK, "c")
+        await asyncio.sleep(20 * TICK)
+        return wheel
+
+    wheel = run(main())
+    assert batches == [["a", "b"], ["c"]]
+    assert len(wheel) == 0
+
+def test_timers_longer_than_the_ring_wait_full_turns():
+    fired = []
+
+    async def on_expire(items):
+        fired.extend(items)
+
+    async def main():
+        wheel = TimerWheel(on_expire, tick=TICK, slots=4)
+        wheel.schedule(10 * TICK, "late")
+        await asyncio.sleep(7 * TICK)
+        assert fired == []
+        await asyncio.sleep(20 * TICK)
+
+    run(main())
+    assert fired == ["late"]
+
+def test_cancelled_timers_never_fire():
+    fired = []
+
+    async def on_expire(items):
+        fired.extend(items)
+
+    async def main():
+        wheel = TimerWheel(on_expire, tick=TICK, slots=8)
+        keep = wheel.schedule(2 * TICK, "keep")
+        drop = wheel.schedule(2 * TICK, "drop")
+        assert wheel.cancel(drop)
+        assert not wheel.cancel(drop)
+        await asyncio.sleep(20 * TICK)
+        assert not wheel.cancel(keep)
+
+    run(main())
+    assert fired == ["keep"]
+
+def test_a_failing_batch_doesnt_stop_the_wheel():
+    fired = []
+
+    async def on_expire(items):
+        fired.extend(items)
+        if "bad" in items:
+            raise RuntimeError("boom")
+
+    async def main():
+        wheel = TimerWheel(on_expire, tick=TICK, slots=8)
+        wheel.schedule(TICK, "bad")
+        wheel.schedule(4 * TICK, "good")
+        await asyncio.sleep(20 * TICK)
+
+    run(main())
+    assert fired == ["bad", "good"]
+
+def test_stop_cancels_the_ticking_task():
+    fired = []
+
+    async def on_expire(items):
+        fired.extend(items)
+
+    async def main():
+        wheel = TimerWheel(on_expire, tick=TICK, slots=8)
+        wheel.schedule(3 * TICK, "never")
+        wheel.stop()
+        await asyncio.sleep(6 * TICK)
+
+    run(main())
+    assert fired == []
@@ -0,0 +1,146 @@
+import threading
+
+import pytest
+
+from utils.rank_index import rank_index
+
+def account(economy, user_id, pocket=0, bank=0, bank_limit=10000):
+    economy.save_balance(None, user_id, {"pocket": pocket, "bank": bank, "bank_limit": bank_limit, "luck": 1.0})
+
+def stored(economy, user_id):
+    doc = economy.db.economies.find_one({"user_id": str(user_id)})
+    return doc["pocket"], doc["bank"], doc["networth"]
+
+def test_transfer_moves_money_and_keeps_networth(economy):
+    account(economy, 1, pocket=500)
+    account(economy, 2, pocket=100)
+
+    economy.transfer([
+        {"user_id": 1, "amount": -200},
+        {"user_id": 2, "amount": 200},
+        {"user_id": 2, "location": "bank", "amount": 50},
+    ])
+
+    assert stored(economy, 1) == (300, 0, 300)
+    assert stored(economy, 2) == (300, 50, 350)
+    assert rank_index.networth(2) == 350
+    assert economy.get_balance(None, 2, ("pocket", "bank")) == {"pocket": 300, "bank": 50}
+
+def test_overdraw_aborts_every_leg(economy):
+    account(economy, 1, pocket=500)
+    account(economy, 2, pocket=100)
+    economy.get_balance(None, 1)
+
+    with pytest.raises(economy.InsufficientFunds):
+        economy.transfer([
+            {"user_id": 1, "amount": 150},
+            {"user_id": 2, "amount": -150},
+        ])
+
+    assert stored(economy, 1) == (500, 0, 500)
+    assert stored(economy, 2) == (100, 0, 100)
+    assert economy.get_balance(None, 1, ("pocket",)) == {"pocket": 500}
+    assert rank_index.networth(1) == 500
+
+def test_bank_credit_over_limit_aborts(economy):
+    account(economy, 1, pocket=5000, bank=9000)
+
+    with pytest.raises(economy.InsufficientFunds):
+        economy.transfer([
+            {"user_id": 1, "amount": -2000},
+            {"user_id": 1, "location": "bank", "amount": 2000},
+        ])
+    assert stored(economy, 1) == (5000, 9000, 14000)
+
+def test_debit_of_missing_account_aborts(economy):
+    account(economy, 1, pocket=100)
+    with pytest.raises(economy.InsufficientFunds):
+        economy.transfer([{"user_id": 1, "amount": 50}, {"user_id": 404, "amount": -50}])
+    assert stored(economy, 1) == (100, 0, 100)
+    assert economy.db.economies.find_one({"user_id": "404"}) is None
+
+def test_set_wipes_an_account(economy):
+    account(economy, 1, pocket=700, bank=300)
+    economy.transfer([{"user_id": 1, "set": 0}, {"user_id": 1, "location": "bank", "set": 0}])
+    assert stored(economy, 1) == (0, 0, 0)
+
+def test_set_and_change_of_one_field_is_rejected(economy):
+    with pytest.raises(ValueError):
+        economy.transfer([{"user_id": 1, "set": 0}, {"user_id": 1, "amount": 5}])
+
+def test_concurrent_debits_never_overdraw(economy):
+    account(economy, 1, pocket=5000)
+    results = []
+
+    def bet():
+        try:
+            economy.transfer([{"user_id": 1, "amount": -2000}])
+            results.append(True)
+        except economy.InsufficientFunds:
+            results.append(False)
+
+    threads = [threading.Thread(target=bet) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 2
+    assert stored(economy, 1) == (1000, 0, 1000)
+
+def stock_shop(economy, stock, price=100):
+    economy.db.shop.insert_one({
+        "id": "current_shop",
+        "items": [{"id": "medal", "name": "Medal", "price": price, "stock": stock}],
+        "version": 1,
+    })
+
+def test_purchase_takes_stock_and_money(economy):
+    stock_shop(economy, stock=2)
+    account(economy, 1, pocket=250)
+
+    item, balance = economy.purchase_item(1, "medal")
+    assert item["stock"] == 1
+    assert balance["pocket"] == 150
+    assert stored(economy, 1) == (150, 0, 150)
+
+def test_purchase_without_funds_leaves_stock(economy):
+    stock_shop(economy, stock=1)
+    account(economy, 1, pocket=50)
+
+    with pytest.raises(economy.InsufficientFunds):
+        economy.purchase_item(1, "medal")
+    # The stock decrement ran first and was rolled back with the transaction
+    assert economy.db.shop.find_one({"id": "current_shop"})["items"][0]["stock"] == 1
+    assert stored(economy, 1) == (50, 0, 50)
+
+def test_purchase_of_sold_out_item(economy):
+    stock_shop(economy, stock=0)
+    account(economy, 1, pocket=500)
+    with pytest.raises(economy.OutOfStock):
+        economy.purchase_item(1, "medal")
+    assert stored(economy, 1) == (500, 0, 500)
+
+def test_concurrent_buyers_never_oversell(economy):
+    stock_shop(economy, stock=3)
+    buyers = [f"buyer{i}" for i in range(10)]
+    for i, user_id in enumerate(buyers):
+        account(economy, user_id, pocket=0 if i < 2 else 100)
+    results = []
+
+    def buy(user_id):
+        try:
+            economy.purchase_item(user_id, "medal")
+            results.append("ok")
+        except (economy.InsufficientFunds, economy.OutOfStock) as e:
+            results.append(type(e).__name__)
+
+    threads = [threading.Thread(target=buy, args=(user_id,)) for user_id in buyers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count("ok") == 3
+    assert economy.db.shop.find_one({"id": "current_shop"})["items"][0]["stock"] == 0
+    assert sum(stored(economy, user_id)[0] for user_id in buyers) == 8 * 100 - 3 * 100
@@ -0,0 +1,221 @@
+"""
+Persistent per-user command cooldowns and streaks.
+
+Each cooldown is one small `cooldowns` document keyed by "<command>:<user_id>".
+It holds when the cooldown ends (`until`) and, for streak commands like daily,
+the streak count. A TTL index on `expires` lets MongoDB delete entries once they
+can no longer matter, so the collection only holds live cooldowns and streaks.
+Since the state lives in MongoDB, cooldowns survive restarts and are shared by
+every bot process.
+
+Starting a cooldown is a single conditional upsert that only succeeds once the
+previous one has ended, so two processes can't both let the same invocation
+through. Running cooldowns are also kept in a bounded LRU cache, so attempts
+made while cooling down are rejected without a database round-trip.
+
+prefix_cooldown() and slash_cooldown() replace commands.cooldown and
+app_commands.checks.cooldown. They raise the same CommandOnCooldown errors, so
+existing error handlers keep working. If MongoDB can't be reached they raise
+CooldownUnavailable (or SlashCooldownUnavailable), check failures that bot.py
+answers with an error embed.
+"""
+import datetime
+import os
+import time
+from collections import OrderedDict
+
+from discord import app_commands
+from discord.ext import commands
+from pymongo import ReturnDocument, errors
+
+from utils.database_async import run_in_db_executor
+from utils.mongo import get_database
+from utils.resilience import single_attempt
+
+COOLDOWN_CACHE_SIZE = int(os.getenv("COOLDOWN_CACHE_SIZE", "10000"))
+
+UNAVAILABLE_MESSAGE = "The economy database is having trouble right now. Please try again in a moment."
+
+class CooldownUnavailable(commands.CheckFailure):
+    """A prefix command's cooldown couldn't be checked because MongoDB is unreachable."""
+    def __init__(self):
+        super().__init__(UNAVAILABLE_MESSAGE)
+
+class SlashCooldownUnavailable(app_commands.CheckFailure):
+    """A slash command's cooldown couldn't be checked because MongoDB is unreachable."""
+    def __init__(self):
+        super().__init__(UNAVAILABLE_MESSAGE)
+
+def _date(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+def _timestamp(date):
+    # pymongo hands back naive UTC datetimes
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return date.timestamp()
+
+class CooldownStore:
+    def __init__(self, max_size=COOLDOWN_CACHE_SIZE):
+        self.max_size = max_size
+        self._until = OrderedDict()  # key -> when the running cooldown ends (epoch seconds)
+        self._indexed = False
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def collection(self):
+        return get_database().cooldowns
+
+    @staticmethod
+    def _key(user_id, command):
+        return f"{command}:{user_id}"
+
+    def _cached(self, key):
+        until = self._until.get(key)
+        if until is not None and until <= time.time():
+            del self._until[key]
+            until = None
+        if until is None:
+            self.misses += 1
+            return None
+        self._until.move_to_end(key)
+        self.hits += 1
+        return until
+
+    def _remember(self, key, until):
+        self._until[key] = until
+        self._until.move_to_end(key)
+        while len(self._until) > self.max_size:
+            self._until.popitem(last=False)
+
+    # A re-run after a start that did land would report the caller's own cooldown as running
+    @single_attempt
+    def _start(self, key, now, duration, streak_window=None):
+        """
+        Start a cooldown in MongoDB unless one is running.
+
+        Returns:
+            (until, streak) where until is when the running cooldown ends if one
+            was already running (None if this call started it), and streak is
+            the new streak count for streak commands
+        """
+        if not self._indexed:
+            self.collection.create_index([("expires", 1)], expireAfterSeconds=0)
+            self._indexed = True
+
+        update = {"until": _date(now + duration), "expires": _date(now + max(duration, streak_window or 0))}
+        if streak_window:
+            # The streak carries on if the previous claim's window (its `expires`) hasn't passed
+            update["streak"] = {"$cond": [
+                {"$gt": ["$expires", _date(now)]},
+                {"$add": [{"$ifNull": ["$streak", 0]}, 1]},
+                1
+            ]}
+
+        for _ in range(2):
+            try:
+                doc = self.collection.find_one_and_update(
+                    {"_id": key, "until": {"$lte": _date(now)}},
+                    [{"$set": update}],
+                    projection={"_id": 0, "streak": 1},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                return None, doc.get("streak")
+            except errors.DuplicateKeyError:
+                # Still cooling down, maybe started by another process
+                doc = self.collection.find_one({"_id": key}, {"_id": 0, "until": 1})
+                if doc is not None:
+                    return _timestamp(doc["until"]), None
+                # Deleted by the TTL monitor in between; try again
+        return None, None
+
+    async def acquire(self, user_id, command, duration):
+        """
+        Start a user's cooldown for a command.
+
+        Returns:
+            0 if the cooldown was started, otherwise the seconds left on the running one
+        """
+        key = self._key(user_id, command)
+        until = self._cached(key)
+        if until is None:
+            now = time.time()
+            until, _ = await run_in_db_executor(self._start, key, now, duration)
+            if until is None:
+                self._remember(key, now + duration)
+                return 0
+            self._remember(key, until)
+        return max(0.0, until - time.time())
+
+    async def claim_streak(self, user_id, command, duration, window):
+        """
+        Start a cooldown and extend the user's streak, which resets unless the
+        previous claim was at most `window` seconds ago.
+
+        Returns:
+            (retry_after, streak): retry_after is 0 and streak the new count if
+            the claim went through, otherwise retry_after is the seconds left
+            and streak is None
+        """
+        key = self._key(user_id, command)
+        until = self._cached(key)
+        if until is None:
+            now = time.time()
+            until, streak = await run_in_db_executor(self._start, key, now, duration, window)
+            if until is None:
+                self._remember(key, now + duration)
+                return 0, streak or 1
+            self._remember(key, until)
+        return max(0.0, until - time.time()), None
+
+    async def release(self, user_id, command, streak=False):
+        """End a cooldown early, e.g. when the command failed; `streak` also undoes the streak step."""
+        key = self._key(user_id, command)
+        self._until.pop(key, None)
+        await run_in_db_executor(self._end, key, time.time(), streak)
+
+    @single_attempt
+    def _end(self, key, now, streak):
+        # Undoing the streak step is a decrement, so it must not be re-run
+        update = {"until": _date(now)}
+        if streak:
+            update["streak"] = {"$max": [0, {"$subtract": [{"$ifNull": ["$streak", 1]}, 1]}]}
+        self.collection.update_one({"_id": key}, [{"$set": update}])
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._until),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+cooldowns = CooldownStore()
+
+def prefix_cooldown(command, duration):
+    """Per-user cooldown check for prefix commands, shared across processes and restarts."""
+    async def predicate(ctx):
+        try:
+            retry_after = await cooldowns.acquire(ctx.author.id, command, duration)
+        except errors.ConnectionFailure as e:
+            raise CooldownUnavailable() from e
+        if retry_after > 0:
+            raise commands.CommandOnCooldown(commands.Cooldown(1, duration), retry_after, commands.BucketType.user)
+        return True
+    return commands.check(predicate)
+
+def slash_cooldown(command, duration):
+    """Per-user cooldown check for slash commands, sharing state with prefix_cooldown."""
+    async def predicate(interaction):
+        try:
+            retry_after = await cooldowns.acquire(interaction.user.id, command, duration)
+        except errors.ConnectionFailure as e:
+            raise SlashCooldownUnavailable() from e
+        if retry_after > 0:
+            raise app_commands.CommandOnCooldown(app_commands.Cooldown(1, duration), retry_after)
+        return True
+    return app_commands.check(predicate)
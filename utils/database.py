@@ -1,33 +1,172 @@
 
 import os
 import random
-from pymongo import MongoClient, errors
+from pymongo import ReturnDocument, UpdateOne, errors
 from dotenv import load_dotenv
 import time
-from functools import wraps
+import threading
+from collections import OrderedDict
+from utils.mongo import get_client, require_mongo_uri, DATABASE_NAME
+from utils.rank_index import rank_index
+from utils.resilience import retrying, single_attempt
 
 load_dotenv()
 
 # Connect to MongoDB
 MONGO_URI = os.getenv("MONGO_URI")
-if not MONGO_URI:
-    raise Exception("MONGO_URI environment variable not found")
+require_mongo_uri()
 
-MAX_RETRIES = 3
-RETRY_DELAY = 1  # seconds
+# Largest value a balance field can hold (BSON int64)
+MAX_BALANCE = 2**63-1
 
-def with_retry(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        for attempt in range(MAX_RETRIES):
-            try:
-                return func(*args, **kwargs)
-            except errors.ConnectionFailure as e:
-                if attempt == MAX_RETRIES - 1:
-                    raise
-                time.sleep(RETRY_DELAY * (attempt + 1))
-        return None
-    return wrapper
+# Balance cache settings
+BALANCE_CACHE_SIZE = int(os.getenv("BALANCE_CACHE_SIZE", "10000"))
+BALANCE_CACHE_TTL = float(os.getenv("BALANCE_CACHE_TTL", "300"))  # seconds
+
+# Last stage of every balance pipeline: recompute the indexed networth from the new pocket and bank
+_NETWORTH_STAGE = {"$set": {
+    "networth": {"$add": [{"$ifNull": ["$pocket", 0]}, {"$ifNull": ["$bank", 0]}]}
+}}
+
+# Jittered retries on connection failures behind the shared circuit breaker (see utils.resilience)
+with_retry = retrying
+# Non-idempotent writes ($inc, bulk writes, transactions) get one attempt; pymongo's retryWrites covers them
+without_retry = single_attempt
+
+class InsufficientFunds(Exception):
+    """Raised when a transfer leg would overdraw an account or overflow a bank."""
+    pass
+
+class OutOfStock(Exception):
+    """Raised when a shop item sold out (or left the shop) before a purchase landed."""
+    pass
+
+# Fields of the balance dict returned by get_balance
+BALANCE_FIELDS = ("pocket", "bank", "bank_limit", "luck", "inventory", "timed_items", "shield_expires")
+
+class BalanceCache:
+    """
+    Bounded in-process LRU cache of balance documents keyed by user_id.
+
+    Entries may be partial (only the fields a projected read fetched) and a
+    lookup only hits when every requested field is present. Entries expire
+    after `ttl` seconds so writes made by other processes are eventually picked
+    up. All mutators in this module write through to it.
+    """
+    def __init__(self, max_size=BALANCE_CACHE_SIZE, ttl=BALANCE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # user_id -> (expires_at, balance)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _copy(balance):
+        # Callers are free to mutate what they get back, so never hand out our own dicts
+        copied = dict(balance)
+        if "inventory" in copied:
+            copied["inventory"] = dict(copied["inventory"])
+        if "timed_items" in copied:
+            copied["timed_items"] = list(copied["timed_items"])
+        return copied
+
+    def get(self, user_id, fields=BALANCE_FIELDS):
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[user_id]
+                entry = None
+            if entry is None or not all(field in entry[1] for field in fields):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return self._copy({field: entry[1][field] for field in fields})
+
+    def put(self, user_id, balance):
+        """Store freshly read fields, merging them into a live entry for the same user."""
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] >= time.monotonic():
+                # Keep the older expiry so fields already cached don't outlive their TTL
+                entry[1].update(self._copy(balance))
+            else:
+                self._entries[user_id] = (time.monotonic() + self.ttl, self._copy(balance))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def update(self, user_id, fields):
+        """Merge changed fields into a cached entry; uncached users are left alone."""
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry[1].update(self._copy(fields))
+
+    def add_item(self, user_id, item_id, expires=None):
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            # Only touch fields that are cached; a partial entry must not grow a made-up inventory
+            balance = entry[1]
+            if expires is None:
+                if "inventory" in balance:
+                    inventory = dict(balance["inventory"])
+                    inventory[item_id] = inventory.get(item_id, 0) + 1
+                    balance["inventory"] = inventory
+            else:
+                if "timed_items" in balance:
+                    timed_items = balance["timed_items"] + [{"type": item_id, "expires": expires}]
+                    balance["timed_items"] = sorted(timed_items, key=lambda item: item["expires"])
+                if item_id == "shield" and "shield_expires" in balance:
+                    balance["shield_expires"] = max(balance["shield_expires"], expires)
+
+    def invalidate(self, user_id=None, fields=None):
+        """Drop one user's entry (or just `fields` of it), or the whole cache when no user_id is given."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            elif fields is None:
+                self._entries.pop(str(user_id), None)
+            else:
+                entry = self._entries.get(str(user_id))
+                if entry is not None:
+                    for field in fields:
+                        entry[1].pop(field, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+balance_cache = BalanceCache()
+
+def invalidate_balance(user_id=None, fields=None):
+    """
+    Forget cached balance data after a write that bypassed this module.
+
+    Pass `fields` to drop only those from the user's entry; ranks are only
+    re-read when pocket or bank may have changed.
+    """
+    balance_cache.invalidate(user_id, fields)
+    if user_id is not None and (fields is None or {"pocket", "bank"} & set(fields)):
+        _refresh_ranks([user_id])
+
+def get_balance_cache_stats():
+    return balance_cache.stats()
 
 class DatabaseConnection:
     _instance = None
@@ -51,8 +190,8 @@ class DatabaseConnection:
     
     def connect(self):
         try:
-            self.client = MongoClient(MONGO_URI)
-            self.db = self.client['discord_economy']
+            self.client = get_client(MONGO_URI)
+            self.db = self.client[DATABASE_NAME]
             # Initialize collection references
             self.economies = self.db.economies
             self.shop = self.db.shop
@@ -61,83 +200,416 @@ class DatabaseConnection:
         except Exception as e:
             print(f"Failed to connect to database: {e}")
             raise
+        self._create_indexes()
+
+    def _create_indexes(self):
+        # Each step runs on its own so one failure doesn't skip the ones after it
+        self._migrate()
+
+        try:
+            self.economies.create_index([("user_id", 1)])
+            # Leaderboards walk this index in networth order and stop after the top rows
+            self.economies.create_index([("networth", -1), ("user_id", 1)])
+            # Active shields and expired timed items are found without scanning inventories
+            self.economies.create_index([("shield_expires", 1)], sparse=True)
+            self.economies.create_index([("timed_items.expires", 1)], sparse=True)
+        except Exception as e:
+            print(f"Error creating economy indexes: {e}")
+
+        try:
+            # One shop document; concurrent first restocks can't create two (needs the dedupe migration)
+            self.shop.create_index([("id", 1)], unique=True)
+        except Exception as e:
+            print(f"Error creating shop index: {e}")
+
+    def _migrate(self):
+        """
+        Run the one-off data migrations this database hasn't recorded yet.
+
+        Applied migrations are listed in the `meta` collection's schema
+        document, so a steady-state connect costs one read instead of a scan of
+        `economies`. A failed migration isn't recorded and runs again on the
+        next connect; every migration is safe to re-run.
+        """
+        migrations = (
+            ("dedupe_shop", self._dedupe_shop),
+            # Documents written before networth was maintained
+            ("backfill_networth", lambda: self.economies.update_many({"networth": {"$exists": False}}, [_NETWORTH_STAGE])),
+            ("compact_inventories", self._compact_inventories),
+        )
+        try:
+            schema = self.db.meta.find_one({"_id": "schema"}) or {}
+        except Exception as e:
+            print(f"Error reading the schema version: {e}")
+            return
+        applied = set(schema.get("migrations", []))
+
+        for name, migrate in migrations:
+            if name in applied:
+                continue
+            try:
+                migrate()
+                self.db.meta.update_one({"_id": "schema"}, {"$addToSet": {"migrations": name}}, upsert=True)
+                print(f"Applied database migration {name}")
+            except Exception as e:
+                print(f"Error running database migration {name}: {e}")
+
+    def _dedupe_shop(self):
+        """Drop all but the newest copy of each shop document; the old unguarded reset could write two."""
+        seen = set()
+        for doc in self.shop.find({}, {"id": 1}).sort([("version", -1), ("last_reset", -1)]):
+            if doc.get("id") in seen:
+                self.shop.delete_one({"_id": doc["_id"]})
+            seen.add(doc.get("id"))
+
+    def _compact_inventories(self):
+        """Convert documents still holding the old per-purchase inventory array."""
+        for doc in self.economies.find({"inventory": {"$exists": True}}, {"user_id": 1, "inventory": 1}):
+            counts, timed_items = {}, []
+            for item in doc.get("inventory") or []:
+                if isinstance(item, dict):
+                    item_id = item.get("type") or item.get("id", "unknown")
+                    if "expires" in item:
+                        timed_items.append({"type": item_id, "expires": item["expires"]})
+                        continue
+                else:
+                    item_id = str(item)
+                counts[item_id] = counts.get(item_id, 0) + 1
+
+            update = {"$unset": {"inventory": ""}}
+            if counts:
+                update["$inc"] = {f"items.{item_id}": count for item_id, count in counts.items()}
+            if timed_items:
+                update["$push"] = {"timed_items": {"$each": timed_items, "$sort": {"expires": 1}}}
+                shields = [item["expires"] for item in timed_items if item["type"] == "shield"]
+                if shields:
+                    update["$max"] = {"shield_expires": max(shields)}
+            # Another process may be compacting the same document; only the first $inc may land
+            self.economies.update_one({"_id": doc["_id"], "inventory": {"$exists": True}}, update)
 
     def reconnect(self):
-        if self.client:
-            self.client.close()
+        # The client is shared process-wide and reconnects by itself, so
+        # closing it would break every other module; just re-check the link
         self.connect()
 
 db_connection = DatabaseConnection.get_instance()
 db = db_connection
 
 @with_retry
-def get_balance(guild_id, user_id):
+def get_balance(guild_id, user_id, fields=None):
+    """
+    Get a user's balance, creating a default account if none exists.
+
+    Args:
+        guild_id: Unused; the currency is global
+        user_id: The user's Discord ID
+        fields: Optional subset of BALANCE_FIELDS to fetch. Only those fields
+            are read from MongoDB (and returned), so hot paths that need just
+            the pocket don't pull the whole inventory.
+
+    Returns:
+        Dict of the requested balance fields
+    """
+    fields = tuple(fields) if fields else BALANCE_FIELDS
+    cached = balance_cache.get(user_id, fields)
+    if cached is not None:
+        return cached
+
     try:
         # Get a fresh db connection
         db_conn = DatabaseConnection.get_instance()
         
         # Global currency - only use user_id
         query = {"user_id": str(user_id)}
-        user_data = db_conn.economies.find_one(query)
+        user_data = db_conn.economies.find_one(query, _projection(fields))
         
-        if not user_data:
+        # A projected read of an existing account can legitimately come back empty
+        if user_data is None:
             user_data = {
                 "user_id": str(user_id),
                 "pocket": 0,
                 "bank": 0,
                 "bank_limit": 10000,  # Default bank limit
                 "luck": 1.0,          # Default luck multiplier for steal/heist
-                "inventory": []       # User's inventory of purchased items
+                "items": {},          # Purchased item id -> count
+                "timed_items": [],    # Items that expire, sorted by expiry
+                "networth": 0         # pocket + bank, kept in step by every balance mutation
             }
             db_conn.economies.insert_one(user_data)
-            return {"pocket": 0, "bank": 0, "bank_limit": 10000, "luck": 1.0, "inventory": []}
-        
-        return {
-            "pocket": user_data.get("pocket", 0),
-            "bank": user_data.get("bank", 0),
-            "bank_limit": user_data.get("bank_limit", 10000),
-            "luck": user_data.get("luck", 1.0),
-            "inventory": user_data.get("inventory", [])
-        }
+
+        balance = _to_balance(user_data, fields)
+        balance_cache.put(user_id, balance)
+        if "pocket" in balance and "bank" in balance:
+            rank_index.update(user_id, balance["pocket"], balance["bank"])
+        return balance
     except Exception as e:
         print(f"Database error in get_balance: {e}")
         raise
 
 @with_retry
-def update_balance(guild_id, user_id, amount, location="pocket"):
-    # Get a fresh db connection
+def get_balances(user_ids, fields=None):
+    """
+    Get several users' balances, fetching every uncached one in a single $in query.
+
+    Unlike get_balance, missing accounts are not created; they get default values.
+
+    Args:
+        user_ids: The users' Discord IDs
+        fields: Optional subset of BALANCE_FIELDS to fetch
+
+    Returns:
+        Dict of str user_id -> balance dict of the requested fields
+    """
+    fields = tuple(fields) if fields else BALANCE_FIELDS
+    balances = {}
+    missing = []
+    for user_id in dict.fromkeys(str(user_id) for user_id in user_ids):
+        cached = balance_cache.get(user_id, fields)
+        if cached is None:
+            missing.append(user_id)
+        else:
+            balances[user_id] = cached
+
+    if missing:
+        db_conn = DatabaseConnection.get_instance()
+        projection = {**_projection(fields), "user_id": 1}
+        for user_data in db_conn.economies.find({"user_id": {"$in": missing}}, projection):
+            balance = _to_balance(user_data, fields)
+            balance_cache.put(user_data["user_id"], balance)
+            if "pocket" in balance and "bank" in balance:
+                rank_index.update(user_data["user_id"], balance["pocket"], balance["bank"])
+            balances[user_data["user_id"]] = balance
+        for user_id in missing:
+            balances.setdefault(user_id, _to_balance(None, fields))
+    return balances
+
+# Balance fields stored under a different name in the economies document
+_STORED_FIELDS = {"inventory": "items"}
+
+_FIELD_DEFAULTS = {
+    "pocket": 0,
+    "bank": 0,
+    "bank_limit": 10000,
+    "luck": 1.0,
+    "shield_expires": 0
+}
+
+def _projection(fields):
+    return {"_id": 0, **{_STORED_FIELDS.get(field, field): 1 for field in fields}}
+
+def _to_balance(user_data, fields=BALANCE_FIELDS):
+    """
+    Normalize a raw economies document into the balance dict handed to cogs.
+
+    `inventory` maps item id to count, `timed_items` lists unexpired timed items
+    soonest first and `shield_expires` is the end of the active shield (0 if none).
+    Only `fields` are included.
+    """
+    user_data = user_data or {}
+    balance = {}
+    for field in fields:
+        if field == "inventory":
+            balance[field] = user_data.get("items", {})
+        elif field == "timed_items":
+            now = time.time()
+            balance[field] = [item for item in user_data.get("timed_items", []) if item["expires"] > now]
+        else:
+            balance[field] = user_data.get(field, _FIELD_DEFAULTS[field])
+    return balance
+
+# Fields an increment reads back: enough to mirror the clamping rules
+_INCREMENT_FIELDS = ("pocket", "bank", "bank_limit")
+
+# Pipeline $set fields that give upserted documents the same defaults as get_balance
+_DEFAULT_FIELDS = {
+    "bank_limit": {"$ifNull": ["$bank_limit", 10000]},
+    "luck": {"$ifNull": ["$luck", 1.0]},
+    "items": {"$ifNull": ["$items", {"$literal": {}}]},
+    "timed_items": {"$ifNull": ["$timed_items", []]}
+}
+
+def _clamped_value(field, amount):
+    """
+    Aggregation expression for `field + amount`, floored at 0 and capped at
+    MAX_BALANCE. Bank deposits are additionally capped at bank_limit, but never
+    pull an already over-limit bank down.
+    """
+    current = {"$ifNull": ["$" + field, 0]}
+    value = {"$add": [current, amount]}
+    if field == "bank" and amount > 0:
+        value = {"$max": [current, {"$min": [{"$ifNull": ["$bank_limit", 10000]}, value]}]}
+    return {"$min": [MAX_BALANCE, {"$max": [0, value]}]}
+
+def _apply_increments(balance, changes):
+    """Python mirror of _clamped_value, applied to a pre-image balance."""
+    result = dict(balance)
+    for field, amount in changes.items():
+        current = balance.get(field, 0)
+        value = current + amount
+        if field == "bank" and amount > 0:
+            value = max(current, min(balance.get("bank_limit", 10000), value))
+        result[field] = min(MAX_BALANCE, max(0, value))
+    return result
+
+def _increment(user_id, changes):
+    """
+    Apply clamped increments to a user's balance in a single find_one_and_update.
+
+    The update is an aggregation pipeline evaluated on the server, so concurrent
+    mutations of the same user can't lose each other's writes. The pre-image is
+    returned and the post-image is derived from it with the same clamping rules,
+    which lets callers tell how much of an increment actually landed.
+
+    Returns:
+        (before, after) balance dicts
+    """
     db_conn = DatabaseConnection.get_instance()
-    
-    MAX_VALUE = 2**63-1
-    # Global currency - only use user_id
-    query = {"user_id": str(user_id)}
-    
-    current = db_conn.economies.find_one(query)
-    if current is None:
-        current = {
-            "pocket": 0,
-            "bank": 0,
-            "bank_limit": 10000,
-            "luck": 1.0,
-            "inventory": []
-        }
-    
-    # If depositing to bank, ensure it doesn't exceed the limit
-    if location == "bank":
-        bank_limit = current.get("bank_limit", 10000)
-        current_bank = current.get("bank", 0)
-        
-        # Limit how much can be added based on bank limit
-        if amount > 0:
-            amount = min(amount, bank_limit - current_bank)
-            if amount <= 0:  # Bank is full
-                return False
-    
-    new_amount = min(MAX_VALUE, max(0, current.get(location, 0) + amount))
-    update = {"$set": {location: new_amount}}
-    db_conn.economies.update_one(query, update, upsert=True)
+
+    pipeline = [{"$set": {
+        **_DEFAULT_FIELDS,
+        **{field: _clamped_value(field, amount) for field, amount in changes.items()}
+    }}, _NETWORTH_STAGE]
+    previous = db_conn.economies.find_one_and_update(
+        {"user_id": str(user_id)},
+        pipeline,
+        projection=_projection(_INCREMENT_FIELDS),
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
+    )
+
+    before = _to_balance(previous, _INCREMENT_FIELDS)
+    after = _apply_increments(before, changes)
+    balance_cache.put(user_id, after)
+    rank_index.update(user_id, after["pocket"], after["bank"])
+    return before, after
+
+@without_retry
+def increment_balance(user_id, changes):
+    """
+    Atomically add amounts to balance fields in one round-trip.
+
+    Args:
+        user_id: The user's Discord ID
+        changes: Mapping of field ("pocket"/"bank") to amount to add (negative to subtract)
+
+    Returns:
+        The user's pocket, bank and bank_limit after the update
+    """
+    return _increment(user_id, changes)[1]
+
+@without_retry
+def update_balance(guild_id, user_id, amount, location="pocket"):
+    before, _ = _increment(user_id, {location: amount})
+
+    # Depositing into a bank that is already at its limit changes nothing
+    if location == "bank" and amount > 0 and before["bank"] >= before["bank_limit"]:
+        return False
     return True
 
+@without_retry
+def transfer(moves, balances=None):
+    """
+    Apply several balance changes atomically in a single bulk write.
+
+    Args:
+        moves: List of legs, each a dict with "user_id", "location" ("pocket" or
+            "bank", default "pocket") and either "amount" (added, negative to
+            debit) or "set" (an absolute value, e.g. 0 to wipe an account).
+        balances: Optional str user_id -> balance the caller just read, e.g.
+            from get_balances. New ranks of users whose pocket and bank (and
+            bank_limit, for bank credits) are in it are derived locally instead
+            of being read back after the write.
+
+    Debits must be covered by the current balance and bank credits must fit
+    under bank_limit. If any leg fails that check InsufficientFunds is raised and
+    the transaction is aborted, so money is never created or destroyed by a
+    partially applied transfer.
+    """
+    db_conn = DatabaseConnection.get_instance()
+
+    # Merge legs per user so every account is touched by exactly one update
+    accounts = {}
+    for move in moves:
+        location = move.get("location", "pocket")
+        if location not in ("pocket", "bank"):
+            raise ValueError(f"Invalid location: {location}")
+
+        account = accounts.setdefault(str(move["user_id"]), {"changes": {}, "sets": {}})
+        if "set" in move:
+            if location in account["changes"]:
+                raise ValueError(f"Cannot both set and change {location} for user {move['user_id']}")
+            account["sets"][location] = move["set"]
+        else:
+            if location in account["sets"]:
+                raise ValueError(f"Cannot both set and change {location} for user {move['user_id']}")
+            account["changes"][location] = account["changes"].get(location, 0) + move["amount"]
+
+    operations = []
+    for user_id, account in accounts.items():
+        query = {"user_id": user_id}
+        bank_guards = []
+        for location, amount in account["changes"].items():
+            if amount < 0:
+                query[location] = {"$gte": -amount}
+            elif amount > 0 and location == "bank":
+                bank_guards.append({"$lte": [
+                    {"$add": [{"$ifNull": ["$bank", 0]}, amount]},
+                    {"$ifNull": ["$bank_limit", 10000]}
+                ]})
+        if bank_guards:
+            query["$expr"] = {"$and": bank_guards}
+
+        update = [{"$set": {
+            **_DEFAULT_FIELDS,
+            **{location: _clamped_value(location, amount) for location, amount in account["changes"].items()},
+            **{location: {"$literal": value} for location, value in account["sets"].items()}
+        }}, _NETWORTH_STAGE]
+        # Guarded legs must match an existing document; only plain credits may create one
+        operations.append(UpdateOne(query, update, upsert=len(query) == 1))
+
+    def apply(session):
+        result = db_conn.economies.bulk_write(operations, ordered=True, session=session)
+        if result.matched_count + result.upserted_count != len(operations):
+            raise InsufficientFunds("A transfer leg would overdraw an account or exceed a bank limit")
+
+    try:
+        with db_conn.client.start_session() as session:
+            session.with_transaction(apply)
+
+        unknown = []
+        for user_id, account in accounts.items():
+            before = (balances or {}).get(user_id, {})
+            needed = {"pocket", "bank"} - set(account["sets"])
+            if account["changes"].get("bank", 0) > 0:
+                needed.add("bank_limit")
+            if not needed <= set(before):
+                unknown.append(user_id)
+                continue
+            after = {**_apply_increments(before, account["changes"]), **account["sets"]}
+            rank_index.update(user_id, after["pocket"], after["bank"])
+        if unknown:
+            _refresh_ranks(unknown)
+    finally:
+        # Guards may have failed because our cached view was stale; reload either way
+        for user_id in accounts:
+            balance_cache.invalidate(user_id)
+
+def _refresh_ranks(user_ids):
+    """Re-read pocket and bank for users whose new balances we can't derive locally."""
+    db_conn = DatabaseConnection.get_instance()
+    docs = db_conn.economies.find(
+        {"user_id": {"$in": [str(user_id) for user_id in user_ids]}},
+        {"_id": 0, "user_id": 1, "pocket": 1, "bank": 1}
+    )
+    for doc in docs:
+        rank_index.update(doc["user_id"], doc.get("pocket", 0), doc.get("bank", 0))
+
+@with_retry
+def rebuild_rank_index():
+    """Load every account into the in-memory rank index; called at startup."""
+    db_conn = DatabaseConnection.get_instance()
+    rank_index.load(db_conn.economies.find({}, {"_id": 0, "user_id": 1, "pocket": 1, "bank": 1}))
+
 @with_retry
 def save_balance(guild_id, user_id, balance):
     # Get a fresh db connection
@@ -145,8 +617,15 @@ def save_balance(guild_id, user_id, balance):
     
     # Global currency - only use user_id
     query = {"user_id": str(user_id)}
-    update = {"$set": balance}
+    # Balance dicts call the stored `items` counts "inventory"
+    fields = {("items" if field == "inventory" else field): value for field, value in balance.items()}
+    update = [{"$set": {field: {"$literal": value} for field, value in fields.items()}}, _NETWORTH_STAGE]
     db_conn.economies.update_one(query, update, upsert=True)
+    balance_cache.update(user_id, balance)
+    if "pocket" in balance and "bank" in balance:
+        rank_index.update(user_id, balance["pocket"], balance["bank"])
+    else:
+        _refresh_ranks([user_id])
     
 @with_retry
 def update_bank_limit(user_id, new_limit):
@@ -156,6 +635,7 @@ def update_bank_limit(user_id, new_limit):
     query = {"user_id": str(user_id)}
     update = {"$set": {"bank_limit": new_limit}}
     db_conn.economies.update_one(query, update, upsert=True)
+    balance_cache.update(user_id, {"bank_limit": new_limit})
     
 @with_retry
 def update_luck(user_id, new_luck):
@@ -165,78 +645,178 @@ def update_luck(user_id, new_luck):
     query = {"user_id": str(user_id)}
     update = {"$set": {"luck": new_luck}}
     db_conn.economies.update_one(query, update, upsert=True)
+    balance_cache.update(user_id, {"luck": new_luck})
     
-@with_retry
+@without_retry
 def add_to_inventory(user_id, item):
+    """
+    Add one item to a user's inventory.
+
+    Args:
+        user_id: The user's Discord ID
+        item: Item id, or a dict with "type" (or "id") and, for timed items
+            such as shields, an "expires" timestamp
+    """
     # Get a fresh db connection
     db_conn = DatabaseConnection.get_instance()
-    
+
+    if isinstance(item, dict):
+        item_id = item.get("type") or item.get("id")
+        expires = item.get("expires")
+    else:
+        item_id, expires = item, None
+
     query = {"user_id": str(user_id)}
-    update = {"$push": {"inventory": item}}
+    if expires is None:
+        update = {"$inc": {f"items.{item_id}": 1}}
+    else:
+        # Timed items stay sorted by expiry; shields also raise the indexed shield_expires
+        update = {"$push": {"timed_items": {"$each": [{"type": item_id, "expires": expires}], "$sort": {"expires": 1}}}}
+        if item_id == "shield":
+            update["$max"] = {"shield_expires": expires}
     db_conn.economies.update_one(query, update, upsert=True)
-    
+    balance_cache.add_item(user_id, item_id, expires)
+
 @with_retry
-def get_shop_items():
-    # Get a fresh db connection
+def prune_expired_items():
+    """Drop expired timed items and shields; returns the number of documents changed."""
     db_conn = DatabaseConnection.get_instance()
-    
-    # Get the current shop items with stock
-    shop_data = db_conn.shop.find_one({"id": "current_shop"})
-    
-    if not shop_data or time.time() - shop_data.get("last_reset", 0) > 10800:  # 3 hours in seconds
-        # Time to reset the shop
-        items = [
-            # Always included items with minimum stock of 5
-            {"id": "banknote", "name": "🏦 Bank Note", "price": 5000, "description": "Increases your bank limit by $5,000", "stock": random.randint(5, 10)},
-            {"id": "luck_boost", "name": "🍀 Luck Boost", "price": 7500, "description": "Increases your luck by 10% for steal and heist commands", "stock": random.randint(5, 8)},
-            {"id": "shield", "name": "🛡️ Theft Shield", "price": 100000, "description": "Protects your money from theft for 24 hours", "stock": random.randint(5, 7)},
-            
-            # Optional items
-            {"id": "medal", "name": "🥇 Prestige Medal", "price": 50000, "description": "A rare collectible to show your wealth", "stock": random.randint(0, 3)},
-            {"id": "mystery_box", "name": "📦 Mystery Box", "price": 15000, "description": "Contains a random reward", "stock": random.randint(3, 8)}
-        ]
-        
-        # The first 3 items are guaranteed to be in stock (bank notes, luck boost, shield)
-        guaranteed_items = items[:3]
-        
-        # For the remaining items, randomly determine if they'll be in stock
-        optional_items = []
-        for item in items[3:]:
-            if random.random() > 0.3:  # 70% chance to include each optional item
-                optional_items.append(item)
-        
-        # Combine guaranteed and optional items
-        available_items = guaranteed_items + optional_items
-        
-        # Save to database
-        db_conn.shop.update_one(
-            {"id": "current_shop"}, 
-            {"$set": {"items": available_items, "last_reset": time.time()}}, 
-            upsert=True
+    now = time.time()
+
+    # Both filters are indexed and fixed to `now`, so this is every document the updates can touch
+    expired = db_conn.economies.find(
+        {"$or": [{"timed_items.expires": {"$lte": now}}, {"shield_expires": {"$lte": now}}]},
+        {"_id": 0, "user_id": 1}
+    )
+    user_ids = [doc["user_id"] for doc in expired if "user_id" in doc]
+    if not user_ids:
+        return 0
+
+    try:
+        result = db_conn.economies.update_many(
+            {"timed_items.expires": {"$lte": now}},
+            {"$pull": {"timed_items": {"expires": {"$lte": now}}}}
+        )
+        db_conn.economies.update_many(
+            {"shield_expires": {"$lte": now}},
+            {"$unset": {"shield_expires": ""}}
         )
+    finally:
+        # Cached timed_items and shield_expires of these users are now stale
+        for user_id in user_ids:
+            balance_cache.invalidate(user_id)
+    return result.modified_count
+    
+def _roll_shop_items():
+    items = [
+        # Always included items with minimum stock of 5
+        {"id": "banknote", "name": "🏦 Bank Note", "price": 5000, "description": "Increases your bank limit by $5,000", "stock": random.randint(5, 10)},
+        {"id": "luck_boost", "name": "🍀 Luck Boost", "price": 7500, "description": "Increases your luck by 10% for steal and heist commands", "stock": random.randint(5, 8)},
+        {"id": "shield", "name": "🛡️ Theft Shield", "price": 100000, "description": "Protects your money from theft for 24 hours", "stock": random.randint(5, 7)},
         
-        return available_items
+        # Optional items
+        {"id": "medal", "name": "🥇 Prestige Medal", "price": 50000, "description": "A rare collectible to show your wealth", "stock": random.randint(0, 3)},
+        {"id": "mystery_box", "name": "📦 Mystery Box", "price": 15000, "description": "Contains a random reward", "stock": random.randint(3, 8)}
+    ]
+    
+    # The first 3 items are guaranteed to be in stock (bank notes, luck boost, shield)
+    guaranteed_items = items[:3]
     
-    return shop_data.get("items", [])
+    # For the remaining items, randomly determine if they'll be in stock
+    optional_items = []
+    for item in items[3:]:
+        if random.random() > 0.3:  # 70% chance to include each optional item
+            optional_items.append(item)
     
+    # Combine guaranteed and optional items
+    return guaranteed_items + optional_items
+
 @with_retry
-def update_item_stock(item_id, change):
-    # Get a fresh db connection
+def load_shop():
+    """The current shop document, or None if the shop has never been stocked."""
+    db_conn = DatabaseConnection.get_instance()
+    return db_conn.shop.find_one({"id": "current_shop"}, {"_id": 0})
+
+@with_retry
+def restock_shop(version):
+    """
+    Replace the shop's stock, unless it was restocked since `version` was read.
+
+    Args:
+        version: The shop version the caller last saw (0 if it saw none)
+
+    Returns:
+        The new shop document, or None if the stored version no longer matches
+        because another process restocked first
+    """
     db_conn = DatabaseConnection.get_instance()
+    shop = {"id": "current_shop", "items": _roll_shop_items(), "last_reset": time.time(), "version": version + 1}
+    try:
+        # Documents from before versioning have no version field, which matches None
+        result = db_conn.shop.update_one(
+            {"id": "current_shop", "version": version or None},
+            {"$set": shop},
+            upsert=not version
+        )
+    except errors.DuplicateKeyError:
+        return None  # Someone else created the shop first
+    if not result.matched_count and result.upserted_id is None:
+        return None
+    return shop
     
-    shop_data = db_conn.shop.find_one({"id": "current_shop"})
-    if not shop_data:
-        return False
-        
-    items = shop_data.get("items", [])
-    for item in items:
-        if item["id"] == item_id:
-            new_stock = item["stock"] + change
-            if new_stock < 0:
-                return False
-                
-            item["stock"] = new_stock
-            db_conn.shop.update_one({"id": "current_shop"}, {"$set": {"items": items}})
-            return True
-            
-    return False
+@without_retry
+def purchase_item(user_id, item_id):
+    """
+    Take one unit of a shop item and debit its price in a single transaction.
+
+    The stock decrement is a positional $inc that only matches while the item
+    has stock left, and the debit only matches while the pocket covers the
+    price, so concurrent buyers can neither oversell an item nor overdraw. If
+    either guard fails nothing is written.
+
+    Returns:
+        (item, balance) where item is the shop item after the decrement and
+        balance is the buyer's pocket, bank and bank_limit after the debit
+
+    Raises:
+        OutOfStock: The item is sold out or not in the current shop
+        InsufficientFunds: The buyer's pocket doesn't cover the price
+    """
+    db_conn = DatabaseConnection.get_instance()
+
+    def apply(session):
+        shop = db_conn.shop.find_one_and_update(
+            {"id": "current_shop", "items": {"$elemMatch": {"id": item_id, "stock": {"$gt": 0}}}},
+            {"$inc": {"items.$.stock": -1}},
+            projection={"_id": 0, "items": 1},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if shop is None:
+            raise OutOfStock(f"{item_id} is out of stock")
+        item = next(item for item in shop["items"] if item["id"] == item_id)
+
+        previous = db_conn.economies.find_one_and_update(
+            {"user_id": str(user_id), "pocket": {"$gte": item["price"]}},
+            [{"$set": {"pocket": _clamped_value("pocket", -item["price"])}}, _NETWORTH_STAGE],
+            projection=_projection(_INCREMENT_FIELDS),
+            return_document=ReturnDocument.BEFORE,
+            session=session
+        )
+        if previous is None:
+            raise InsufficientFunds(f"Pocket doesn't cover {item_id}")
+        return item, previous
+
+    try:
+        with db_conn.client.start_session() as session:
+            item, previous = session.with_transaction(apply)
+    except InsufficientFunds:
+        # The guard may have failed because our cached view was stale
+        balance_cache.invalidate(user_id)
+        raise
+
+    before = _to_balance(previous, _INCREMENT_FIELDS)
+    after = _apply_increments(before, {"pocket": -item["price"]})
+    balance_cache.put(user_id, after)
+    rank_index.update(user_id, after["pocket"], after["bank"])
+    return item, after
@@ -0,0 +1,119 @@
+"""
+Awaitable variant of the utils.database API for use inside cogs.
+
+Every function mirrors its synchronous counterpart in utils.database (same name,
+same arguments) but runs the blocking pymongo call on a dedicated thread pool,
+so a slow Mongo round-trip for one guild never stalls the discord.py event loop
+for every other guild.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import database
+from utils.database import InsufficientFunds, OutOfStock
+from utils.resilience import retrying, single_attempt
+from utils.tracing import tracer
+
+# Size of the thread pool reserved for database calls
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "16"))
+
+# How often (seconds) expired shields and timed items are pruned
+ITEM_PRUNE_INTERVAL = int(os.getenv("ITEM_PRUNE_INTERVAL", "600"))
+
+# First wait (seconds) before retrying a failed rank index build; doubles up to RANK_INDEX_RETRY_MAX
+RANK_INDEX_RETRY_INTERVAL = int(os.getenv("RANK_INDEX_RETRY_INTERVAL", "5"))
+RANK_INDEX_RETRY_MAX = int(os.getenv("RANK_INDEX_RETRY_MAX", "300"))
+
+_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="mongo")
+
+async def _run_in_db_executor(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context over so Mongo command spans land in the current trace
+    context = contextvars.copy_context()
+    with tracer.span(f"db {func.__name__}"):
+        return await loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
+
+_run_retrying = retrying(_run_in_db_executor)
+_run_once = single_attempt(_run_in_db_executor)
+
+async def run_in_db_executor(func, *args, **kwargs):
+    """
+    Run a blocking database callable on the database thread pool and await its result.
+
+    Connection failures are retried here, backing off with asyncio.sleep, so a
+    retrying call doesn't hold a pool thread while it waits. Callables marked
+    as single attempt (non-idempotent writes, see utils.resilience) are never
+    re-run.
+    """
+    run = _run_retrying if getattr(func, "retries", True) else _run_once
+    return await run(func, *args, **kwargs)
+
+async def get_balance(guild_id, user_id, fields=None):
+    return await run_in_db_executor(database.get_balance, guild_id, user_id, fields)
+
+async def get_balances(user_ids, fields=None):
+    return await run_in_db_executor(database.get_balances, user_ids, fields)
+
+async def update_balance(guild_id, user_id, amount, location="pocket"):
+    return await run_in_db_executor(database.update_balance, guild_id, user_id, amount, location)
+
+async def increment_balance(user_id, changes):
+    return await run_in_db_executor(database.increment_balance, user_id, changes)
+
+async def transfer(moves, balances=None):
+    return await run_in_db_executor(database.transfer, moves, balances)
+
+async def save_balance(guild_id, user_id, balance):
+    return await run_in_db_executor(database.save_balance, guild_id, user_id, balance)
+
+async def update_bank_limit(user_id, new_limit):
+    return await run_in_db_executor(database.update_bank_limit, user_id, new_limit)
+
+async def update_luck(user_id, new_luck):
+    return await run_in_db_executor(database.update_luck, user_id, new_luck)
+
+async def add_to_inventory(user_id, item):
+    return await run_in_db_executor(database.add_to_inventory, user_id, item)
+
+async def prune_expired_items():
+    return await run_in_db_executor(database.prune_expired_items)
+
+async def watch_expired_items(interval=ITEM_PRUNE_INTERVAL):
+    """Background task that periodically drops expired shields and timed items."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await prune_expired_items()
+        except Exception as e:
+            print(f"Error pruning expired items: {e}")
+
+async def load_shop():
+    return await run_in_db_executor(database.load_shop)
+
+async def restock_shop(version):
+    return await run_in_db_executor(database.restock_shop, version)
+
+async def purchase_item(user_id, item_id):
+    return await run_in_db_executor(database.purchase_item, user_id, item_id)
+
+async def rebuild_rank_index():
+    return await run_in_db_executor(database.rebuild_rank_index)
+
+async def retry_rank_index(interval=RANK_INDEX_RETRY_INTERVAL, max_interval=RANK_INDEX_RETRY_MAX):
+    """Background task that keeps retrying a rank index build that failed at startup."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await rebuild_rank_index()
+            print("Rank index built")
+            return
+        except Exception as e:
+            print(f"Failed to build rank index, retrying in {min(interval * 2, max_interval)}s: {e}")
+        interval = min(interval * 2, max_interval)
+
+def shutdown():
+    """Wait for in-flight database calls to finish and release the thread pool."""
+    _executor.shutdown(wait=True)
@@ -7,11 +7,17 @@ import functools
 from datetime import datetime
 from typing import Optional, Dict, Any, List, Tuple, Union, Callable
 
-from pymongo import MongoClient, errors
+from bson import ObjectId
+from pymongo import errors
 from pymongo.collection import Collection
 from pymongo.database import Database
 from dotenv import load_dotenv
 
+from utils.mongo import get_client, require_mongo_uri, DATABASE_NAME
+from utils.query_stats import QueryPerformanceTracker
+from utils.write_behind import write_behind
+from utils.resilience import retrying, single_attempt, CircuitOpenError
+
 # Load environment variables
 load_dotenv()
 
@@ -24,72 +30,19 @@ logger = logging.getLogger('database')
 
 # Configuration
 MONGO_URI = os.getenv("MONGO_URI")
-if not MONGO_URI:
-    raise Exception("MONGO_URI environment variable not found")
-
-MAX_RETRIES = 5
-RETRY_DELAY = 1  # seconds base delay
-
-class QueryPerformanceTracker:
-    """
-    Track and analyze database query performance.
-    """
-    def __init__(self):
-        self.query_stats = {}
-        self.slow_query_threshold = 0.5  # seconds
-        
-    def record_query(self, collection: str, operation: str, duration: float, query_details: Optional[Dict] = None) -> None:
-        """
-        Record a database query for performance tracking.
-        
-        Args:
-            collection: Collection name
-            operation: Operation type (find, update, insert, etc.)
-            duration: Query duration in seconds
-            query_details: Optional query details for slow query analysis
-        """
-        key = f"{collection}.{operation}"
-        
-        if key not in self.query_stats:
-            self.query_stats[key] = {
-                "count": 0,
-                "total_time": 0.0,
-                "avg_time": 0.0,
-                "min_time": float('inf'),
-                "max_time": 0.0,
-                "slow_queries": 0
-            }
-            
-        stats = self.query_stats[key]
-        stats["count"] += 1
-        stats["total_time"] += duration
-        stats["avg_time"] = stats["total_time"] / stats["count"]
-        stats["min_time"] = min(stats["min_time"], duration)
-        stats["max_time"] = max(stats["max_time"], duration)
-        
-        if duration > self.slow_query_threshold:
-            stats["slow_queries"] += 1
-            logger.warning(
-                f"Slow query: {collection}.{operation} took {duration:.4f}s. "
-                f"Details: {query_details or 'not provided'}"
-            )
-    
-    def get_stats(self) -> Dict[str, Dict[str, Union[int, float]]]:
-        """Get all recorded query statistics."""
-        return self.query_stats
-    
-    def get_slow_queries(self) -> Dict[str, Dict[str, Union[int, float]]]:
-        """Get statistics for slow queries only."""
-        return {k: v for k, v in self.query_stats.items() if v["slow_queries"] > 0}
-    
-    def reset_stats(self) -> None:
-        """Reset all statistics."""
-        self.query_stats = {}
+require_mongo_uri()
 
 def with_performance_tracking(func):
     """
-    Decorator to track query performance and handle retries with exponential backoff.
+    Decorator to track query performance and record failures.
+
+    Connection failures are retried by the shared retry policy, which backs off
+    with jitter, respects the process-wide retry budget and fails fast while the
+    MongoDB circuit breaker is open. Other errors are not retried. Functions
+    marked @single_attempt (non-idempotent writes) are never re-run.
     """
+    guarded = (retrying if getattr(func, "retries", True) else single_attempt)(func)
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         # Get database connection from singleton
@@ -99,117 +52,53 @@ def with_performance_tracking(func):
         collection_name = func.__name__.split('_')[0] if '_' in func.__name__ else "unknown"
         operation = func.__name__.split('_')[-1] if '_' in func.__name__ else func.__name__
         
-        # Track query time
-        start_time = time.time()
-        retry_count = 0
-        last_exception = None
+        # Track query time; details are only built if the query turns out slow
+        start_time = time.perf_counter()
+        query_details = lambda: {"args": str(args), "kwargs": str(kwargs)}
         
-        while retry_count < MAX_RETRIES:
-            try:
-                result = func(*args, **kwargs)
-                
-                # Record successful query
-                duration = time.time() - start_time
-                db_conn.performance_tracker.record_query(
-                    collection_name, 
-                    operation, 
-                    duration,
-                    {"args": str(args), "kwargs": str(kwargs)}
-                )
-                
-                if retry_count > 0:
-                    logger.info(f"Query {func.__name__} succeeded after {retry_count} retries in {duration:.4f}s")
-                    
-                return result
-                
-            except errors.ConnectionFailure as e:
-                retry_count += 1
-                last_exception = e
-                
-                # Use exponential backoff
-                wait_time = min(RETRY_DELAY * (2 ** retry_count), 30)
-                
-                logger.warning(
-                    f"Connection failure in {func.__name__}, attempt {retry_count}/{MAX_RETRIES}. "
-                    f"Retrying in {wait_time:.2f}s: {e}"
-                )
-                
-                # Try to reconnect before next attempt
-                db_conn.reconnect()
-                
-                time.sleep(wait_time)
-                
-            except errors.OperationFailure as e:
-                # Non-retryable errors
-                logger.error(f"Operation failure in {func.__name__}: {e}")
-                
-                # Record failed query
-                duration = time.time() - start_time
-                db_conn.performance_tracker.record_query(
-                    collection_name, 
-                    f"{operation}_error", 
-                    duration,
-                    {"error": str(e), "args": str(args), "kwargs": str(kwargs)}
-                )
-                
-                # Record error in database
-                try:
-                    db_conn.errors.insert_one({
-                        "type": "OperationFailure",
-                        "function": func.__name__,
-                        "message": str(e),
-                        "args": str(args),
-                        "kwargs": str(kwargs),
-                        "timestamp": datetime.now()
-                    })
-                except Exception as log_error:
-                    logger.error(f"Failed to log error: {log_error}")
-                    
+        try:
+            result = guarded(*args, **kwargs)
+        except CircuitOpenError:
+            # Already reported when the circuit opened; don't log every rejected call
+            raise
+        except Exception as e:
+            # Record failed query
+            duration = time.perf_counter() - start_time
+            db_conn.performance_tracker.record_query(
+                collection_name, 
+                f"{operation}_error", 
+                duration,
+                lambda: {"error": str(e), **query_details()}
+            )
+            
+            if isinstance(e, errors.ConnectionFailure):
+                logger.critical(f"Connection failure in {func.__name__} after retries: {e}")
+                # Nothing to record the error into while the database is unreachable
                 raise
-                
-            except Exception as e:
-                retry_count += 1
-                last_exception = e
-                
-                # Use exponential backoff
-                wait_time = min(RETRY_DELAY * (2 ** retry_count), 30)
-                
-                logger.error(
-                    f"Error in {func.__name__}, attempt {retry_count}/{MAX_RETRIES}. "
-                    f"Retrying in {wait_time:.2f}s: {e}"
-                )
-                logger.debug(traceback.format_exc())
-                
-                # Record error in database if possible
-                try:
-                    if hasattr(db_conn, 'errors') and db_conn.errors is not None:
-                        db_conn.errors.insert_one({
-                            "type": type(e).__name__,
-                            "function": func.__name__,
-                            "message": str(e),
-                            "args": str(args),
-                            "kwargs": str(kwargs),
-                            "timestamp": datetime.now()
-                        })
-                except Exception as log_error:
-                    logger.error(f"Failed to log error: {log_error}")
-                
-                if retry_count == MAX_RETRIES:
-                    # Record failed query
-                    duration = time.time() - start_time
-                    db_conn.performance_tracker.record_query(
-                        collection_name, 
-                        f"{operation}_error", 
-                        duration,
-                        {"error": str(e), "args": str(args), "kwargs": str(kwargs)}
-                    )
-                    break
-                    
-                time.sleep(wait_time)
+            
+            logger.error(f"{type(e).__name__} in {func.__name__}: {e}")
+            logger.debug(traceback.format_exc())
+            
+            # Record error in database (buffered)
+            write_behind.enqueue("errors", {
+                "type": type(e).__name__,
+                "function": func.__name__,
+                "message": str(e),
+                "args": str(args),
+                "kwargs": str(kwargs),
+                "timestamp": datetime.now()
+            })
+            raise
         
-        if last_exception:
-            logger.critical(f"Max retries ({MAX_RETRIES}) reached for {func.__name__}: {last_exception}")
-            raise last_exception
+        # Record successful query
+        duration = time.perf_counter() - start_time
+        db_conn.performance_tracker.record_query(
+            collection_name, 
+            operation, 
+            duration,
+            query_details
+        )
+        return result
         
     return wrapper
 
@@ -258,25 +147,14 @@ class DatabaseConnection:
         try:
             self.connection_attempts += 1
             
-            # Improved connection settings for better performance and reliability
-            self.client = MongoClient(
-                MONGO_URI,
-                serverSelectionTimeoutMS=5000,      # 5 second timeout for server selection
-                connectTimeoutMS=10000,             # 10 second timeout for initial connection
-                socketTimeoutMS=45000,              # 45 second timeout for socket operations
-                maxPoolSize=50,                     # Maximum connection pool size
-                minPoolSize=10,                     # Minimum connection pool size
-                maxIdleTimeMS=60000,               # 1 minute maximum idle time
-                waitQueueTimeoutMS=5000,           # 5 second timeout for waiting in queue
-                retryWrites=True,                  # Retry write operations
-                retryReads=True                    # Retry read operations
-            )
+            # Shared process-wide client; pool settings live in utils.mongo
+            self.client = get_client(MONGO_URI)
             
             # Test the connection
             self.client.admin.command('ping')
             
             # Initialize database and collections
-            self.db = self.client['discord_economy']
+            self.db = self.client[DATABASE_NAME]
             self.economies = self.db.economies
             self.shop = self.db.shop
             self.errors = self.db.errors
@@ -321,14 +199,8 @@ class DatabaseConnection:
         logger.info("Attempting to reconnect to MongoDB...")
         
         try:
-            # Safely close existing connection if it exists
-            if self.client:
-                try:
-                    self.client.close()
-                except Exception as e:
-                    logger.warning(f"Error closing existing connection: {e}")
-                    
-            # Try to establish a new connection
+            # The client is shared process-wide and reconnects on its own, so
+            # closing it here would break every other module; just re-check the link
             return self.connect()
             
         except Exception as e:
@@ -341,6 +213,7 @@ class DatabaseConnection:
         try:
             # Economies collection - global currency system
             self.economies.create_index([("user_id", 1)], unique=True)
+            self.economies.create_index([("networth", -1), ("user_id", 1)])
             
             # Shop collection - items for sale
             self.shop.create_index([("item_id", 1)], unique=True)
@@ -365,16 +238,13 @@ class DatabaseConnection:
     
     def _log_server_event(self, event_type, description, level="info"):
         """Log server events to the database for monitoring"""
-        try:
-            if self.connected and self.server_stats:
-                self.server_stats.insert_one({
-                    "event_type": event_type,
-                    "description": description,
-                    "level": level,
-                    "timestamp": datetime.now()
-                })
-        except Exception as e:
-            logger.warning(f"Failed to log server event: {e}")
+        if not write_behind.enqueue("server_stats", {
+            "event_type": event_type,
+            "description": description,
+            "level": level,
+            "timestamp": datetime.now()
+        }):
+            logger.warning(f"Dropped server event {event_type}: write-behind queue is full")
     
     def get_connection_status(self):
         """Get the current connection status details"""
@@ -440,7 +310,8 @@ def get_balance(user_id):
                 "bank": 0,
                 "bank_limit": 10000,  # Default bank limit
                 "luck": 1.0,          # Default luck multiplier for steal/heist
-                "inventory": []       # User's inventory
+                "inventory": [],      # User's inventory
+                "networth": 0         # pocket + bank
             }
             
             # Insert new user data
@@ -456,6 +327,7 @@ def get_balance(user_id):
         raise
 
 @with_performance_tracking
+@single_attempt
 def update_balance(user_id, amount, location="pocket"):
     """
     Update a user's balance with enhanced error handling and performance tracking.
@@ -487,10 +359,14 @@ def update_balance(user_id, amount, location="pocket"):
         else:
             raise ValueError(f"Invalid location: {location}")
             
+        # Keep networth in step with the field being changed
+        other_field = "bank" if update_field == "pocket" else "pocket"
+        networth = new_balance + user_data.get(other_field, 0)
+
         # Update database
         db.economies.update_one(
             {"user_id": user_id},
-            {"$set": {update_field: new_balance}},
+            {"$set": {update_field: new_balance, "networth": networth}},
             upsert=True
         )
         
@@ -525,6 +401,7 @@ def save_balance(user_id, balance_data):
         
         # Ensure user_id is set correctly in data
         balance_data["user_id"] = user_id
+        balance_data["networth"] = balance_data.get("pocket", 0) + balance_data.get("bank", 0)
         
         # Use replace_one with upsert to replace whole document
         result = db.economies.replace_one(
@@ -616,6 +493,7 @@ def update_luck(user_id, new_luck):
         raise
 
 @with_performance_tracking
+@single_attempt
 def add_to_inventory(user_id, item):
     """
     Add an item to user's inventory.
@@ -720,6 +598,7 @@ def get_shop_items():
         raise
 
 @with_performance_tracking
+@single_attempt
 def update_item_stock(item_id, change):
     """
     Update the stock of an item in the shop.
@@ -847,9 +726,9 @@ def record_feedback(user_id, command_name, feedback_type):
             "timestamp": datetime.now()
         }
         
-        # Insert feedback
-        result = db.feedback.insert_one(feedback_doc)
-        feedback_doc["_id"] = result.inserted_id
+        # Queue the insert; the id is assigned here so callers still get it back
+        feedback_doc["_id"] = ObjectId()
+        write_behind.enqueue("feedback", feedback_doc)
         
         logger.info(f"Recorded {feedback_type} feedback for {command_name} from user {user_id}")
         
@@ -960,9 +839,9 @@ def log_error(error_type, function, message, details=None):
             "severity": "error"
         }
         
-        # Insert error
-        result = db.errors.insert_one(error_doc)
-        error_doc["_id"] = result.inserted_id
+        # Queue the insert; the id is assigned here so callers still get it back
+        error_doc["_id"] = ObjectId()
+        write_behind.enqueue("errors", error_doc)
         
         logger.error(f"Logged error: {error_type} in {function}: {message}")
         
@@ -1045,7 +924,8 @@ def get_db_metrics():
             "collections": {},
             "performance": db_connection.performance_tracker.get_stats(),
             "connection_status": db_connection.get_connection_status(),
-            "slow_queries": db_connection.performance_tracker.get_slow_queries()
+            "slow_queries": db_connection.performance_tracker.get_slow_queries(),
+            "recent_slow_queries": db_connection.performance_tracker.get_recent_slow_queries()
         }
         
         # Get collection stats
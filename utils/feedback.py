@@ -1,16 +1,11 @@
 import discord
-import os
 import time
 from discord.ext import commands
-from pymongo import MongoClient
+from utils.mongo import get_database
+from utils.write_behind import write_behind
 
-# MongoDB connection
-mongo_client = MongoClient(os.environ.get("MONGO_URI"))
-db = mongo_client['discord_economy']
-
-# Create a collection for feedback if it doesn't exist
-if 'feedback' not in db.list_collection_names():
-    db.create_collection('feedback')
+# MongoDB connection (collections are created on first insert)
+db = get_database()
 
 class FeedbackView(discord.ui.View):
     def __init__(self, command_name, user_id):
@@ -64,7 +59,8 @@ class FeedbackView(discord.ui.View):
         }
         
         try:
-            db.feedback.insert_one(feedback_data)
+            # Buffered; the button response doesn't wait on MongoDB
+            write_behind.enqueue("feedback", feedback_data)
             
             # Disable all buttons
             for item in self.children:
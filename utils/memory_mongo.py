@@ -0,0 +1,1256 @@
+"""
+In-memory stand-in for pymongo's MongoClient.
+
+Selected with MONGO_BACKEND=memory (see utils.mongo.get_client), so CI,
+benchmarks and load tests can run every cog at full speed with no MongoDB
+server and no network.
+
+It implements the subset of the pymongo API this bot uses:
+- CRUD on collections, with query and projection operators
+- classic update operators and aggregation-pipeline updates
+- bulk writes
+- sessions with transactions that roll back on error
+- aggregation
+- admin commands
+- command monitoring events
+
+Results are pymongo's own result types and errors are pymongo's own
+exceptions. Each client keeps its data in plain dicts behind one lock.
+Single-field indexes are kept as hash maps for equality lookups, and unique
+indexes are enforced. Unsupported operators raise NotImplementedError rather
+than silently matching wrong.
+"""
+import itertools
+import threading
+import time
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from pymongo import errors
+from pymongo.operations import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+_MISSING = object()
+_INDEXES = object()        # undo-log key for a collection's index definitions
+
+def _copy(value):
+    """Deep copy of a document tree (scalars are immutable and shared)."""
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+def _now():
+    # pymongo hands back naive UTC datetimes by default
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+#
+# Comparison
+#
+
+def _type_rank(value):
+    # BSON comparison order, reduced to the types we store
+    if value is None or value is _MISSING:
+        return 0
+    if isinstance(value, bool):
+        return 6
+    if isinstance(value, (int, float)):
+        return 1
+    if isinstance(value, str):
+        return 2
+    if isinstance(value, dict):
+        return 3
+    if isinstance(value, list):
+        return 4
+    if isinstance(value, ObjectId):
+        return 5
+    if isinstance(value, datetime):
+        return 7
+    return 8
+
+def _sort_key(value):
+    rank = _type_rank(value)
+    if rank == 0:
+        return (0, 0)
+    if rank in (3, 4, 8):
+        return (rank, repr(value))
+    return (rank, value)
+
+def _compare(left, right):
+    """-1/0/1 like Mongo's ordering, or None if the types aren't comparable by range operators."""
+    if _type_rank(left) != _type_rank(right):
+        return None
+    left, right = _sort_key(left), _sort_key(right)
+    return (left > right) - (left < right)
+
+def _equal(left, right):
+    if left is _MISSING:
+        left = None
+    if isinstance(left, bool) != isinstance(right, bool):
+        return False
+    return left == right
+
+#
+# Paths
+#
+
+def _values(value, parts):
+    """Every value a dotted path reaches, descending into arrays like Mongo does."""
+    if not parts:
+        return [value]
+    head, rest = parts[0], parts[1:]
+    if isinstance(value, dict):
+        return _values(value[head], rest) if head in value else [_MISSING]
+    if isinstance(value, list):
+        if head.isdigit():
+            index = int(head)
+            return _values(value[index], rest) if index < len(value) else [_MISSING]
+        found = []
+        for item in value:
+            if isinstance(item, (dict, list)):
+                found.extend(v for v in _values(item, parts) if v is not _MISSING)
+        return found or [_MISSING]
+    return [_MISSING]
+
+def _get(doc, path):
+    """Single value at a dotted path (no array fan-out), or _MISSING."""
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return _MISSING
+    return value
+
+def _set(doc, path, value):
+    parts = path.split(".")
+    target = doc
+    for part in parts[:-1]:
+        if isinstance(target, list):
+            target = target[int(part)]
+            continue
+        if not isinstance(target.get(part), (dict, list)):
+            target[part] = {}
+        target = target[part]
+    if isinstance(target, list):
+        index = int(parts[-1])
+        while len(target) <= index:
+            target.append(None)
+        target[index] = value
+    else:
+        target[parts[-1]] = value
+
+def _unset(doc, path):
+    parts = path.split(".")
+    target = doc
+    for part in parts[:-1]:
+        if isinstance(target, dict) and isinstance(target.get(part), (dict, list)):
+            target = target[part]
+        elif isinstance(target, list) and part.isdigit() and int(part) < len(target):
+            target = target[int(part)]
+        else:
+            return
+    if isinstance(target, dict):
+        target.pop(parts[-1], None)
+    elif isinstance(target, list) and parts[-1].isdigit() and int(parts[-1]) < len(target):
+        target[int(parts[-1])] = None
+
+#
+# Queries
+#
+
+def _flatten(values):
+    """Candidates for range/membership operators: each value, plus the elements of array values."""
+    for value in values:
+        yield value
+        if isinstance(value, list):
+            yield from value
+
+class _KeyList(list):
+    """An $in / $nin list of hashable keys, with a set of them for O(1) membership tests."""
+    def __init__(self, values):
+        super().__init__(values)
+        self.keys = set(values)
+
+def _prepare(query):
+    """Copy of a query with key-only $in / $nin lists swapped for _KeyLists, built once per operation."""
+    prepared = {}
+    for key, cond in query.items():
+        if key in ("$and", "$or", "$nor"):
+            cond = [_prepare(sub) for sub in cond]
+        elif isinstance(cond, dict) and any(op in cond for op in ("$in", "$nin")):
+            cond = {
+                op: _KeyList(arg) if op in ("$in", "$nin") and all(_is_key(value) for value in arg) else arg
+                for op, arg in cond.items()
+            }
+        prepared[key] = cond
+    return prepared
+
+def _is_operator_doc(cond):
+    return isinstance(cond, dict) and bool(cond) and all(key.startswith("$") for key in cond)
+
+def _match_operator(values, op, arg):
+    if op == "$eq":
+        return any(_equal(value, arg) for value in _flatten(values))
+    if op == "$ne":
+        return not _match_operator(values, "$eq", arg)
+    if op in ("$gt", "$gte", "$lt", "$lte"):
+        for value in _flatten(values):
+            order = _compare(value, arg) if value is not _MISSING else None
+            if order is None:
+                continue
+            if (op == "$gt" and order > 0 or op == "$gte" and order >= 0
+                    or op == "$lt" and order < 0 or op == "$lte" and order <= 0):
+                return True
+        return False
+    if op == "$in":
+        if isinstance(arg, _KeyList):
+            # Hash lookups for the common list-of-ids case; other values still compare one by one
+            return any(
+                value in arg.keys if _is_key(value) else any(_equal(value, candidate) for candidate in arg)
+                for value in _flatten(values)
+            )
+        return any(_equal(value, candidate) for value in _flatten(values) for candidate in arg)
+    if op == "$nin":
+        return not _match_operator(values, "$in", arg)
+    if op == "$exists":
+        return any(value is not _MISSING for value in values) == bool(arg)
+    if op == "$size":
+        return any(isinstance(value, list) and len(value) == arg for value in values)
+    if op == "$elemMatch":
+        return any(
+            isinstance(value, list) and any(_match_element(item, arg) for item in value)
+            for value in values
+        )
+    if op == "$not":
+        return not _match_values(values, arg)
+    raise NotImplementedError(f"Query operator {op} is not supported by the in-memory backend")
+
+def _match_values(values, cond):
+    if _is_operator_doc(cond):
+        return all(_match_operator(values, op, arg) for op, arg in cond.items())
+    return _match_operator(values, "$eq", cond)
+
+def _match_element(item, cond):
+    """Whether one array element satisfies an $elemMatch / $pull condition."""
+    if isinstance(cond, dict) and cond and not _is_operator_doc(cond):
+        return isinstance(item, dict) and _match(item, cond)
+    return _match_values([item], cond)
+
+def _match(doc, query):
+    for key, cond in query.items():
+        if key == "$and":
+            if not all(_match(doc, sub) for sub in cond):
+                return False
+        elif key == "$or":
+            if not any(_match(doc, sub) for sub in cond):
+                return False
+        elif key == "$nor":
+            if any(_match(doc, sub) for sub in cond):
+                return False
+        elif key == "$expr":
+            if not _truthy(_eval(cond, doc)):
+                return False
+        elif key.startswith("$"):
+            raise NotImplementedError(f"Query operator {key} is not supported by the in-memory backend")
+        elif not _match_values(_values(doc, key.split(".")), cond):
+            return False
+    return True
+
+def _positional_index(doc, query, array_path):
+    """Index of the first element of `array_path` matched by the query, for the positional $ operator."""
+    array = _get(doc, array_path)
+    if not isinstance(array, list):
+        raise errors.WriteError("The positional operator did not find the match needed from the query.", code=2)
+    prefix = array_path + "."
+    conditions = [(key[len(prefix):], cond) for key, cond in query.items() if key.startswith(prefix)]
+    whole = query.get(array_path)
+    elem_match = whole.get("$elemMatch") if isinstance(whole, dict) else None
+    if conditions or elem_match is not None:
+        for index, item in enumerate(array):
+            if elem_match is not None and not _match_element(item, elem_match):
+                continue
+            if all(_match_values(_values(item, sub.split(".")), cond) for sub, cond in conditions):
+                return index
+    raise errors.WriteError("The positional operator did not find the match needed from the query.", code=2)
+
+#
+# Aggregation expressions
+#
+
+def _truthy(value):
+    return value not in (None, False, 0, _MISSING)
+
+def _numbers(values):
+    return [value for value in values if isinstance(value, (int, float)) and not isinstance(value, bool)]
+
+def _eval(expr, doc, variables=None):
+    if isinstance(expr, str):
+        if expr.startswith("$$"):
+            name, _, path = expr[2:].partition(".")
+            if name == "ROOT" or name == "CURRENT":
+                base = doc
+            elif name == "NOW":
+                base = _now()
+            elif variables and name in variables:
+                base = variables[name]
+            else:
+                raise NotImplementedError(f"Variable $${name} is not supported by the in-memory backend")
+            return _get(base, path) if path else base
+        if expr.startswith("$"):
+            return _get(doc, expr[1:])
+        return expr
+    if isinstance(expr, list):
+        return [_eval(item, doc, variables) for item in expr]
+    if not isinstance(expr, dict):
+        return expr
+    if len(expr) == 1:
+        op, arg = next(iter(expr.items()))
+        if op.startswith("$"):
+            return _eval_operator(op, arg, doc, variables)
+    # Object expression; fields that evaluate to nothing are left out, as in Mongo
+    evaluated = ((key, _eval(value, doc, variables)) for key, value in expr.items())
+    return {key: value for key, value in evaluated if value is not _MISSING}
+
+def _args(arg, doc, variables):
+    values = arg if isinstance(arg, list) else [arg]
+    return [_eval(value, doc, variables) for value in values]
+
+def _eval_operator(op, arg, doc, variables):
+    if op == "$literal":
+        return _copy(arg)
+    if op == "$ifNull":
+        values = _args(arg, doc, variables)
+        for value in values[:-1]:
+            if value is not None and value is not _MISSING:
+                return value
+        return values[-1]
+    if op == "$cond":
+        if isinstance(arg, dict):
+            condition, then, otherwise = arg["if"], arg["then"], arg["else"]
+        else:
+            condition, then, otherwise = arg
+        return _eval(then if _truthy(_eval(condition, doc, variables)) else otherwise, doc, variables)
+
+    values = _args(arg, doc, variables)
+    if op in ("$add", "$subtract", "$multiply", "$divide", "$mod"):
+        if any(value is None or value is _MISSING for value in values):
+            return None
+        if op == "$add":
+            return sum(values)
+        left, right = values
+        if op == "$subtract":
+            return left - right
+        if op == "$multiply":
+            result = 1
+            for value in values:
+                result *= value
+            return result
+        return left / right if op == "$divide" else left % right
+    if op in ("$max", "$min", "$sum", "$avg"):
+        if len(values) == 1 and isinstance(values[0], list):
+            values = values[0]
+        present = [value for value in values if value is not None and value is not _MISSING]
+        if op == "$sum":
+            return sum(_numbers(present))
+        if op == "$avg":
+            numbers = _numbers(present)
+            return sum(numbers) / len(numbers) if numbers else None
+        if not present:
+            return None
+        pick = max if op == "$max" else min
+        return pick(present, key=_sort_key)
+    if op in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$cmp"):
+        left, right = values
+        order = (_sort_key(left) > _sort_key(right)) - (_sort_key(left) < _sort_key(right))
+        return {
+            "$eq": order == 0, "$ne": order != 0, "$gt": order > 0, "$gte": order >= 0,
+            "$lt": order < 0, "$lte": order <= 0, "$cmp": order
+        }[op]
+    if op == "$and":
+        return all(_truthy(value) for value in values)
+    if op == "$or":
+        return any(_truthy(value) for value in values)
+    if op == "$not":
+        return not _truthy(values[0])
+    if op == "$in":
+        value, array = values
+        return any(_equal(value, item) for item in array)
+    if op == "$size":
+        return len(values[0])
+    if op == "$arrayElemAt":
+        array, index = values
+        return array[index] if -len(array) <= index < len(array) else _MISSING
+    if op == "$concat":
+        return None if any(value is None or value is _MISSING for value in values) else "".join(values)
+    if op == "$toString":
+        return None if values[0] in (None, _MISSING) else str(values[0])
+    if op == "$type":
+        value = values[0]
+        return {0: "missing" if value is _MISSING else "null", 1: "double" if isinstance(value, float) else "int",
+                2: "string", 3: "object", 4: "array", 5: "objectId", 6: "bool", 7: "date"}.get(_type_rank(value), "unknown")
+    raise NotImplementedError(f"Expression operator {op} is not supported by the in-memory backend")
+
+def _set_stage(doc, fields):
+    # Every expression in a stage sees the document as it was before the stage
+    results = [(path, _eval(expr, doc)) for path, expr in fields.items()]
+    for path, value in results:
+        if value is _MISSING:
+            _unset(doc, path)
+        else:
+            _set(doc, path, _copy(value))
+    return doc
+
+def _unset_stage(doc, fields):
+    for path in [fields] if isinstance(fields, str) else fields:
+        _unset(doc, path)
+    return doc
+
+#
+# Projections
+#
+
+def _project(doc, projection):
+    if projection is None:
+        return _copy(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    include_id = _truthy(projection.get("_id", 1))
+    fields = {key: value for key, value in projection.items() if key != "_id"}
+
+    if fields and all(not isinstance(value, dict) and _truthy(value) for value in fields.values()):
+        projected = {}
+        if include_id and "_id" in doc:
+            projected["_id"] = doc["_id"]
+        for path in fields:
+            value = _get(doc, path)
+            if value is not _MISSING:
+                _set(projected, path, _copy(value))
+        return projected
+
+    if any(isinstance(value, dict) for value in fields.values()):
+        raise NotImplementedError("Projection operators are not supported by the in-memory backend")
+
+    projected = _copy(doc)
+    for path in fields:
+        _unset(projected, path)
+    if not include_id:
+        projected.pop("_id", None)
+    return projected
+
+#
+# Updates
+#
+
+def _sort_items(items, spec):
+    if isinstance(spec, dict):
+        for path, direction in reversed(list(spec.items())):
+            items.sort(key=lambda item: _sort_key(_get(item, path)), reverse=direction < 0)
+    else:
+        items.sort(key=_sort_key, reverse=spec < 0)
+
+def _resolve_path(doc, path, query):
+    if ".$." in path or path.endswith(".$"):
+        array_path = path.split(".$")[0]
+        return path.replace(".$", f".{_positional_index(doc, query, array_path)}", 1)
+    return path
+
+def _apply_update(doc, update, query, inserting=False):
+    """Apply an update document or pipeline to `doc` in place."""
+    if isinstance(update, list):
+        for stage in update:
+            (name, spec), = stage.items()
+            if name in ("$set", "$addFields"):
+                _set_stage(doc, spec)
+            elif name == "$unset":
+                _unset_stage(doc, spec)
+            elif name in ("$replaceRoot", "$replaceWith"):
+                replacement = _eval(spec["newRoot"] if name == "$replaceRoot" else spec, doc)
+                doc_id = doc.get("_id")
+                doc.clear()
+                doc.update(_copy(replacement))
+                if doc_id is not None:
+                    doc["_id"] = doc_id
+            else:
+                raise NotImplementedError(f"Update stage {name} is not supported by the in-memory backend")
+        return doc
+
+    if not update or not all(key.startswith("$") for key in update):
+        raise ValueError("update only works with $ operators")
+
+    for op, fields in update.items():
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, arg in fields.items():
+            path = _resolve_path(doc, path, query)
+            current = _get(doc, path)
+            if op in ("$set", "$setOnInsert"):
+                _set(doc, path, _copy(arg))
+            elif op == "$unset":
+                _unset(doc, path)
+            elif op == "$inc":
+                _set(doc, path, (0 if current is _MISSING else current) + arg)
+            elif op == "$mul":
+                _set(doc, path, (0 if current is _MISSING else current) * arg)
+            elif op in ("$max", "$min"):
+                order = None if current is _MISSING else _compare(arg, current)
+                if order is None or (order > 0 if op == "$max" else order < 0):
+                    _set(doc, path, _copy(arg))
+            elif op == "$currentDate":
+                _set(doc, path, _now())
+            elif op in ("$push", "$addToSet"):
+                array = [] if current is _MISSING else current
+                if not isinstance(array, list):
+                    raise errors.WriteError(f"The field '{path}' must be an array", code=2)
+                each = arg["$each"] if isinstance(arg, dict) and "$each" in arg else [arg]
+                for item in each:
+                    if op == "$push" or not any(_equal(existing, item) for existing in array):
+                        array.append(_copy(item))
+                if op == "$push" and isinstance(arg, dict) and "$each" in arg:
+                    if "$sort" in arg:
+                        _sort_items(array, arg["$sort"])
+                    if "$slice" in arg:
+                        limit = arg["$slice"]
+                        array[:] = array[:limit] if limit >= 0 else array[limit:]
+                _set(doc, path, array)
+            elif op == "$pull":
+                if isinstance(current, list):
+                    current[:] = [item for item in current if not _match_element(item, arg)]
+            elif op == "$rename":
+                if current is not _MISSING:
+                    _unset(doc, path)
+                    _set(doc, arg, current)
+            else:
+                raise NotImplementedError(f"Update operator {op} is not supported by the in-memory backend")
+    return doc
+
+def _seed_from_query(query):
+    """The document an upsert starts from: the query's equality conditions."""
+    doc = {}
+    for key, cond in query.items():
+        if key.startswith("$"):
+            continue
+        if _is_operator_doc(cond):
+            if "$eq" in cond:
+                _set(doc, key, _copy(cond["$eq"]))
+        else:
+            _set(doc, key, _copy(cond))
+    return doc
+
+#
+# Monitoring
+#
+
+class _CommandEvent:
+    """The attributes of pymongo's monitoring events that listeners here read."""
+    __slots__ = ("command", "command_name", "request_id", "database_name", "duration_micros", "failure")
+
+    def __init__(self, command_name, request_id, database_name, command=None, duration_micros=0, failure=None):
+        self.command = command
+        self.command_name = command_name
+        self.request_id = request_id
+        self.database_name = database_name
+        self.duration_micros = duration_micros
+        self.failure = failure
+
+#
+# Client, database, collection
+#
+
+def _is_key(value):
+    """Whether a query value can be looked up in a hash index."""
+    return isinstance(value, (str, int, ObjectId)) and not isinstance(value, bool)
+
+class MemoryClient:
+    """Drop-in for MongoClient(...) holding every database in memory."""
+    def __init__(self, *args, event_listeners=None, **kwargs):
+        self._lock = threading.RLock()
+        self._databases = {}
+        self._listeners = list(event_listeners or [])
+        self._request_ids = itertools.count(1)
+        self._started = time.time()
+        self._undo = None        # (collection, _id or _INDEXES) -> prior state, while a transaction runs
+
+    def __getitem__(self, name):
+        with self._lock:
+            database = self._databases.get(name)
+            if database is None:
+                database = self._databases[name] = MemoryDatabase(self, name)
+            return database
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_database(self, name, **kwargs):
+        return self[name]
+
+    def list_database_names(self):
+        with self._lock:
+            return [name for name, database in self._databases.items() if database.list_collection_names()]
+
+    def server_info(self):
+        return {"version": "memory", "ok": 1.0}
+
+    def start_session(self, **kwargs):
+        return MemorySession(self)
+
+    def close(self):
+        pass
+
+    def _run(self, database_name, command_name, command, func):
+        """Run an operation under the client lock, emitting command monitoring events."""
+        request_id = next(self._request_ids)
+        if self._listeners:
+            started = _CommandEvent(command_name, request_id, database_name, command=command)
+            for listener in self._listeners:
+                listener.started(started)
+        start = time.perf_counter()
+        try:
+            with self._lock:
+                result = func()
+        except Exception as e:
+            if self._listeners:
+                failed = _CommandEvent(command_name, request_id, database_name,
+                                       duration_micros=int((time.perf_counter() - start) * 1e6), failure=e)
+                for listener in self._listeners:
+                    listener.failed(failed)
+            raise
+        if self._listeners:
+            succeeded = _CommandEvent(command_name, request_id, database_name,
+                                      duration_micros=int((time.perf_counter() - start) * 1e6))
+            for listener in self._listeners:
+                listener.succeeded(succeeded)
+        return result
+
+class MemorySession:
+    """Session whose transactions hold the client lock and roll back on error."""
+    def __init__(self, client):
+        self.client = client
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.end_session()
+
+    def end_session(self):
+        pass
+
+    def with_transaction(self, callback, **kwargs):
+        client = self.client
+        with client._lock:
+            # Writes record each touched document's prior state, so rollback costs O(writes), not O(data)
+            outer, client._undo = client._undo, {}
+            try:
+                result = callback(self)
+            except Exception:
+                for (collection, doc_id), before in reversed(list(client._undo.items())):
+                    collection._revert(doc_id, before)
+                raise
+            finally:
+                undo, client._undo = client._undo, outer
+            if outer is not None:
+                # A nested transaction commits into the enclosing one's undo log
+                for key, before in undo.items():
+                    outer.setdefault(key, before)
+            return result
+
+class MemoryDatabase:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._collections = {}
+
+    def __getitem__(self, name):
+        with self.client._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = self._collections[name] = MemoryCollection(self, name)
+            return collection
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name, **kwargs):
+        return self[name]
+
+    def list_collection_names(self, **kwargs):
+        with self.client._lock:
+            return [name for name, collection in self._collections.items() if collection._docs or collection._indexes]
+
+    def drop_collection(self, name):
+        self[name].drop()
+
+    def command(self, command, **kwargs):
+        name = command if isinstance(command, str) else next(iter(command))
+        return self.client._run(self.name, name, {name: 1}, lambda: self._command(name))
+
+    def _command(self, name):
+        if name in ("ping", "isMaster", "ismaster", "hello"):
+            return {"ok": 1.0}
+        if name == "dbStats":
+            collections = [collection for collection in self._collections.values() if collection._docs]
+            objects = sum(len(collection._docs) for collection in collections)
+            size = sum(len(repr(doc)) for collection in collections for doc in collection._docs.values())
+            return {
+                "db": self.name,
+                "collections": len(collections),
+                "objects": objects,
+                "dataSize": size,
+                "storageSize": size,
+                "indexes": sum(len(collection._indexes) + 1 for collection in collections),
+                "indexSize": 0,
+                "ok": 1.0
+            }
+        if name == "serverStatus":
+            return {
+                "host": "memory",
+                "version": "memory",
+                "uptime": time.time() - self.client._started,
+                "connections": {"current": 0, "available": 0},
+                "ok": 1.0
+            }
+        raise errors.OperationFailure(f"no such command: '{name}'", code=59)
+
+class MemoryCursor:
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+        self._results = None
+
+    def sort(self, key_or_list, direction=None):
+        if isinstance(key_or_list, str):
+            key_or_list = [(key_or_list, direction or 1)]
+        self._sort = list(key_or_list.items()) if isinstance(key_or_list, dict) else list(key_or_list)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def _execute(self):
+        # Like pymongo, the query only runs (and is reported to listeners) on first iteration
+        if self._results is None:
+            collection = self._collection
+            self._results = iter(collection._run("find", lambda: collection._find(
+                self._query, self._projection, self._sort, self._skip, self._limit
+            )))
+        return self._results
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._execute())
+
+    def close(self):
+        self._results = iter(())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class MemoryCollection:
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self._docs = {}          # _id -> document, in insertion order
+        self._indexes = {}       # name -> {"keys": [(field, direction)], "unique": bool, "sparse": bool}
+        self._lookup = {}        # field -> {value: set of _id}, for single-field indexes
+
+    @property
+    def _lock(self):
+        return self.database.client._lock
+
+    def _run(self, command_name, func):
+        return self.database.client._run(self.database.name, command_name, {command_name: self.name}, func)
+
+    # Index maintenance
+
+    def _journal(self, key):
+        """Remember a document's (or the index set's) state before its first write in a transaction."""
+        undo = self.database.client._undo
+        if undo is not None and (self, key) not in undo:
+            undo[(self, key)] = dict(self._indexes) if key is _INDEXES else self._docs.get(key, _MISSING)
+
+    def _revert(self, key, before):
+        if key is _INDEXES:
+            self._indexes = before
+            self._rebuild_lookup()
+            return
+        current = self._docs.get(key)
+        if current is not None:
+            self._unindex(current)
+        if before is _MISSING:
+            self._docs.pop(key, None)
+        else:
+            self._docs[key] = before
+            self._index(before)
+
+    def _rebuild_lookup(self):
+        self._lookup = {}
+        for spec in self._indexes.values():
+            if len(spec["keys"]) == 1:
+                self._lookup.setdefault(spec["keys"][0][0], {})
+        for doc in self._docs.values():
+            self._index(doc)
+
+    @staticmethod
+    def _keys(doc, field):
+        keys = []
+        for value in _flatten(_values(doc, field.split("."))):
+            if value is not _MISSING and not isinstance(value, (dict, list)):
+                try:
+                    hash(value)
+                except TypeError:
+                    continue
+                keys.append(value)
+        return keys
+
+    def _index(self, doc):
+        for field, lookup in self._lookup.items():
+            for key in self._keys(doc, field):
+                lookup.setdefault(key, set()).add(doc["_id"])
+
+    def _unindex(self, doc):
+        for field, lookup in self._lookup.items():
+            for key in self._keys(doc, field):
+                ids = lookup.get(key)
+                if ids is not None:
+                    ids.discard(doc["_id"])
+                    if not ids:
+                        del lookup[key]
+
+    def _check_unique(self, doc, replacing=None):
+        for name, spec in self._indexes.items():
+            if not spec["unique"]:
+                continue
+            fields = [field for field, _ in spec["keys"]]
+            key = [_get(doc, field) for field in fields]
+            if spec["sparse"] and all(value is _MISSING for value in key):
+                continue
+            key = [None if value is _MISSING else value for value in key]
+            for other_id in self._candidates({fields[0]: key[0]}) if len(fields) == 1 else list(self._docs):
+                other = self._docs.get(other_id)
+                if other is None or other_id == replacing:
+                    continue
+                if [None if _get(other, field) is _MISSING else _get(other, field) for field in fields] == key:
+                    raise errors.DuplicateKeyError(
+                        f"E11000 duplicate key error collection: {self.database.name}.{self.name} index: {name}",
+                        code=11000
+                    )
+
+    def _ids_for(self, field, value):
+        if field == "_id":
+            return (value,) if value in self._docs else ()
+        return self._lookup[field].get(value, ())
+
+    def _candidates(self, query):
+        """_ids worth matching against the query, narrowed through an index where possible."""
+        for field, cond in query.items():
+            if field != "_id" and field not in self._lookup:
+                continue
+            if _is_key(cond):
+                return list(self._ids_for(field, cond))
+            if isinstance(cond, dict) and list(cond) == ["$in"] and all(_is_key(value) for value in cond["$in"]):
+                ids = set()
+                for value in cond["$in"]:
+                    ids.update(self._ids_for(field, value))
+                return list(ids)
+        return list(self._docs)
+
+    def _matching(self, query):
+        query = query or {}
+        if not isinstance(query, dict):
+            query = {"_id": query}
+        candidates = self._candidates(query)
+        query = _prepare(query)
+        for doc_id in candidates:
+            doc = self._docs.get(doc_id)
+            if doc is not None and _match(doc, query):
+                yield doc
+
+    # Writes
+
+    def _store(self, doc, replacing=None):
+        self._check_unique(doc, replacing)
+        self._journal(doc["_id"])
+        old = self._docs.get(doc["_id"])
+        if old is not None:
+            self._unindex(old)
+        self._docs[doc["_id"]] = doc
+        self._index(doc)
+
+    def _check_new_id(self, doc_id):
+        if doc_id in self._docs:
+            raise errors.DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.database.name}.{self.name} index: _id_",
+                code=11000
+            )
+
+    def _insert(self, document):
+        doc = _copy(document)
+        if "_id" not in doc:
+            doc["_id"] = document["_id"] = ObjectId()
+        self._check_new_id(doc["_id"])
+        self._store(doc)
+        return doc["_id"]
+
+    def _update(self, query, update, upsert, many):
+        """Returns (matched, modified, upserted _id, [(before, after)])."""
+        query = query or {}
+        changes = []
+        matched = modified = 0
+        for doc in list(self._matching(query)):
+            matched += 1
+            updated = _apply_update(_copy(doc), update, query)
+            if updated != doc:
+                modified += 1
+                self._store(updated, replacing=doc["_id"])
+            changes.append((doc, updated))
+            if not many:
+                break
+
+        if matched or not upsert:
+            return matched, modified, None, changes
+
+        doc = _apply_update(_seed_from_query(query), update, query, inserting=True)
+        doc.setdefault("_id", ObjectId())
+        # An upsert whose filter names an existing _id but doesn't match it collides, as on a server
+        self._check_new_id(doc["_id"])
+        self._store(doc)
+        return 0, 0, doc["_id"], [(None, doc)]
+
+    def insert_one(self, document, session=None, **kwargs):
+        return InsertOneResult(self._run("insert", lambda: self._insert(document)), True)
+
+    def insert_many(self, documents, ordered=True, session=None, **kwargs):
+        def run():
+            inserted, write_errors = [], []
+            for index, document in enumerate(documents):
+                try:
+                    inserted.append(self._insert(document))
+                except errors.DuplicateKeyError as e:
+                    write_errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": document})
+                    if ordered:
+                        break
+            if write_errors:
+                raise errors.BulkWriteError({
+                    "writeErrors": write_errors, "writeConcernErrors": [], "nInserted": len(inserted),
+                    "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []
+                })
+            return inserted
+        return InsertManyResult(self._run("insert", run), True)
+
+    def _update_result(self, matched, modified, upserted_id):
+        raw = {"n": matched or (1 if upserted_id is not None else 0), "nModified": modified,
+               "updatedExisting": bool(matched), "ok": 1.0}
+        if upserted_id is not None:
+            raw["upserted"] = upserted_id
+        return UpdateResult(raw, True)
+
+    def update_one(self, filter, update, upsert=False, session=None, **kwargs):
+        matched, modified, upserted_id, _ = self._run("update", lambda: self._update(filter, update, upsert, False))
+        return self._update_result(matched, modified, upserted_id)
+
+    def update_many(self, filter, update, upsert=False, session=None, **kwargs):
+        matched, modified, upserted_id, _ = self._run("update", lambda: self._update(filter, update, upsert, True))
+        return self._update_result(matched, modified, upserted_id)
+
+    def replace_one(self, filter, replacement, upsert=False, session=None, **kwargs):
+        def run():
+            for doc in self._matching(filter):
+                new = _copy(replacement)
+                new["_id"] = doc["_id"]
+                self._store(new, replacing=doc["_id"])
+                return 1, int(new != doc), None
+            if not upsert:
+                return 0, 0, None
+            new = _copy(replacement)
+            new.setdefault("_id", _seed_from_query(filter or {}).get("_id", ObjectId()))
+            self._store(new)
+            return 0, 0, new["_id"]
+        return self._update_result(*self._run("update", run))
+
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                            return_document=False, session=None, **kwargs):
+        def run():
+            query = filter or {}
+            if sort:
+                first = self._find(query, None, list(sort.items()) if isinstance(sort, dict) else sort, 0, 1, copy=False)
+                if not first:
+                    query = {"_id": {"$in": []}}
+                else:
+                    query = {"_id": first[0]["_id"]}
+            _, _, _, changes = self._update(query, update, upsert, False)
+            if not changes:
+                return None
+            before, after = changes[0]
+            # ReturnDocument.AFTER is True, BEFORE is False
+            result = after if return_document else before
+            return None if result is None else _project(result, projection)
+        return self._run("findAndModify", run)
+
+    def delete_one(self, filter, session=None, **kwargs):
+        return DeleteResult({"n": self._run("delete", lambda: self._delete(filter, False))}, True)
+
+    def delete_many(self, filter, session=None, **kwargs):
+        return DeleteResult({"n": self._run("delete", lambda: self._delete(filter, True))}, True)
+
+    def _delete(self, query, many):
+        deleted = 0
+        for doc in list(self._matching(query)):
+            self._journal(doc["_id"])
+            self._unindex(doc)
+            del self._docs[doc["_id"]]
+            deleted += 1
+            if not many:
+                break
+        return deleted
+
+    def bulk_write(self, requests, ordered=True, session=None, **kwargs):
+        def run():
+            result = {"writeErrors": [], "writeConcernErrors": [], "nInserted": 0, "nUpserted": 0,
+                      "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []}
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        self._insert(request._doc)
+                        result["nInserted"] += 1
+                    elif isinstance(request, (DeleteOne, DeleteMany)):
+                        result["nRemoved"] += self._delete(request._filter, isinstance(request, DeleteMany))
+                    elif isinstance(request, (UpdateOne, UpdateMany)):
+                        matched, modified, upserted_id, _ = self._update(
+                            request._filter, request._doc, request._upsert, isinstance(request, UpdateMany)
+                        )
+                        result["nMatched"] += matched
+                        result["nModified"] += modified
+                        if upserted_id is not None:
+                            result["nUpserted"] += 1
+                            result["upserted"].append({"index": index, "_id": upserted_id})
+                    elif isinstance(request, ReplaceOne):
+                        existing = next(self._matching(request._filter), None)
+                        new = _copy(request._doc)
+                        if existing is not None:
+                            new["_id"] = existing["_id"]
+                            self._store(new, replacing=existing["_id"])
+                            result["nMatched"] += 1
+                            result["nModified"] += int(new != existing)
+                        elif request._upsert:
+                            new.setdefault("_id", ObjectId())
+                            self._check_new_id(new["_id"])
+                            self._store(new)
+                            result["nUpserted"] += 1
+                            result["upserted"].append({"index": index, "_id": new["_id"]})
+                    else:
+                        raise NotImplementedError(f"{type(request).__name__} is not supported by the in-memory backend")
+                except errors.DuplicateKeyError as e:
+                    result["writeErrors"].append({"index": index, "code": 11000, "errmsg": str(e)})
+                    if ordered:
+                        break
+            if result["writeErrors"]:
+                raise errors.BulkWriteError(result)
+            return result
+        return BulkWriteResult(self._run("update", run), True)
+
+    # Reads
+
+    def _find(self, query, projection, sort, skip, limit, copy=True):
+        docs = list(self._matching(query))
+        if sort:
+            for path, direction in reversed(sort):
+                docs.sort(key=lambda doc: _sort_key(_get(doc, path)), reverse=direction < 0)
+        if skip:
+            docs = docs[skip:]
+        if limit:
+            docs = docs[:abs(limit)]
+        return [_project(doc, projection) for doc in docs] if copy else docs
+
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0, session=None, **kwargs):
+        cursor = MemoryCursor(self, filter, projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit)
+
+    def find_one(self, filter=None, projection=None, *args, sort=None, session=None, **kwargs):
+        def run():
+            docs = self._find(filter, projection, list(sort.items()) if isinstance(sort, dict) else sort, 0, 1)
+            return docs[0] if docs else None
+        return self._run("find", run)
+
+    def count_documents(self, filter, skip=0, limit=0, session=None, **kwargs):
+        def run():
+            count = max(0, sum(1 for _ in self._matching(filter)) - skip)
+            return min(count, limit) if limit else count
+        return self._run("aggregate", run)
+
+    def estimated_document_count(self, **kwargs):
+        return self._run("count", lambda: len(self._docs))
+
+    def distinct(self, key, filter=None, session=None, **kwargs):
+        def run():
+            values = []
+            for doc in self._matching(filter):
+                for value in _flatten(_values(doc, key.split("."))):
+                    if value is not _MISSING and not isinstance(value, list) and not any(_equal(value, v) for v in values):
+                        values.append(_copy(value))
+            return values
+        return self._run("distinct", run)
+
+    def aggregate(self, pipeline, session=None, **kwargs):
+        def run():
+            # A leading $match can use the indexes
+            query, stages = ({}, pipeline) if not pipeline or "$match" not in pipeline[0] else (pipeline[0]["$match"], pipeline[1:])
+            return _aggregate([_copy(doc) for doc in self._matching(query)], stages)
+        return iter(self._run("aggregate", run))
+
+    # Indexes
+
+    def create_index(self, keys, unique=False, sparse=False, name=None, session=None, **kwargs):
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        keys = list(keys.items()) if isinstance(keys, dict) else [tuple(key) for key in keys]
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+
+        def run():
+            spec = {"keys": keys, "unique": unique, "sparse": sparse}
+            if self._indexes.get(name) != spec:
+                self._journal(_INDEXES)
+                self._indexes[name] = spec
+                self._rebuild_lookup()
+                if unique:
+                    for doc in list(self._docs.values()):
+                        self._check_unique(doc, replacing=doc["_id"])
+            return name
+        return self._run("createIndexes", run)
+
+    def index_information(self):
+        with self._lock:
+            info = {"_id_": {"key": [("_id", 1)]}}
+            for name, spec in self._indexes.items():
+                info[name] = {"key": spec["keys"], "unique": spec["unique"], "sparse": spec["sparse"]}
+            return info
+
+    def drop_index(self, name):
+        with self._lock:
+            self._journal(_INDEXES)
+            self._indexes.pop(name, None)
+            self._rebuild_lookup()
+
+    def drop(self, session=None, **kwargs):
+        def run():
+            for doc_id in self._docs:
+                self._journal(doc_id)
+            self._journal(_INDEXES)
+            self._docs = {}
+            self._indexes = {}
+            self._lookup = {}
+        self._run("drop", run)
+
+#
+# Aggregation pipeline
+#
+
+def _accumulate(op, arg, docs):
+    if op == "$count":
+        return len(docs)
+    values = [_eval(arg, doc) for doc in docs]
+    if op == "$push":
+        return [value for value in values if value is not _MISSING]
+    if op == "$addToSet":
+        unique = []
+        for value in values:
+            if value is not _MISSING and not any(_equal(value, existing) for existing in unique):
+                unique.append(value)
+        return unique
+    if op == "$first":
+        return values[0] if values else None
+    if op == "$last":
+        return values[-1] if values else None
+    return _eval_operator(op, [{"$literal": value} for value in values], {}, None)
+
+def _aggregate(docs, pipeline):
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == "$match":
+            docs = [doc for doc in docs if _match(doc, spec)]
+        elif name in ("$set", "$addFields"):
+            docs = [_set_stage(doc, spec) for doc in docs]
+        elif name == "$unset":
+            docs = [_unset_stage(doc, spec) for doc in docs]
+        elif name == "$project":
+            computed = {key: value for key, value in spec.items() if not isinstance(value, (int, float, bool))}
+            included = {key: value for key, value in spec.items() if key not in computed and key != "_id" and _truthy(value)}
+            if not computed and not included:
+                docs = [_project(doc, spec) for doc in docs]
+                continue
+            projected = []
+            for doc in docs:
+                out = _project(doc, {**included, "_id": spec.get("_id", 1)}) if included else (
+                    {"_id": doc["_id"]} if "_id" in doc and _truthy(spec.get("_id", 1)) else {}
+                )
+                for key, expr in computed.items():
+                    value = _eval(expr, doc)
+                    if value is not _MISSING:
+                        _set(out, key, value)
+                projected.append(out)
+            docs = projected
+        elif name == "$group":
+            groups = {}
+            for doc in docs:
+                key = _eval(spec["_id"], doc)
+                key = None if key is _MISSING else key
+                groups.setdefault(repr(key), (key, []))[1].append(doc)
+            docs = []
+            for key, members in groups.values():
+                out = {"_id": key}
+                for field, accumulator in spec.items():
+                    if field != "_id":
+                        (op, arg), = accumulator.items()
+                        out[field] = _accumulate(op, arg, members)
+                docs.append(out)
+        elif name == "$sort":
+            for path, direction in reversed(list(spec.items())):
+                docs.sort(key=lambda doc: _sort_key(_get(doc, path)), reverse=direction < 0)
+        elif name == "$skip":
+            docs = docs[spec:]
+        elif name == "$limit":
+            docs = docs[:spec]
+        elif name == "$count":
+            docs = [{spec: len(docs)}] if docs else []
+        elif name == "$unwind":
+            path = (spec["path"] if isinstance(spec, dict) else spec)[1:]
+            unwound = []
+            for doc in docs:
+                value = _get(doc, path)
+                if isinstance(value, list):
+                    for item in value:
+                        copied = _copy(doc)
+                        _set(copied, path, _copy(item))
+                        unwound.append(copied)
+                elif value is not _MISSING and value is not None:
+                    unwound.append(doc)
+            docs = unwound
+        else:
+            raise NotImplementedError(f"Aggregation stage {name} is not supported by the in-memory backend")
+    return docs
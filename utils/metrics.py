@@ -0,0 +1,224 @@
+"""
+Process metrics and their Prometheus text exposition.
+
+Collects command latencies per cog, MongoDB command latencies (fed by the
+command listener in utils.mongo), cache hit rates, gateway latency and
+event-loop lag, and renders them in the Prometheus text format for the
+dashboard's /metrics route and the bot's optional metrics server
+(METRICS_PORT).
+"""
+import asyncio
+import math
+import os
+import sys
+import time
+
+from utils.query_stats import (
+    LatencyHistogram, QueryPerformanceTracker, SUB_BUCKETS, BUCKET_COUNT, bucket_upper_bound
+)
+
+METRIC_PREFIX = "devbot"
+
+# Port for the bot process's own /metrics server; unset disables it
+METRICS_PORT = os.getenv("METRICS_PORT")
+
+# If set, scrapers must send "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Commands slower than this (seconds) are logged
+SLOW_COMMAND_THRESHOLD = float(os.getenv("SLOW_COMMAND_THRESHOLD", "2.0"))
+
+# How often (seconds) the event loop lag is sampled
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+
+# Command latency per (cog, command)
+command_stats = QueryPerformanceTracker(slow_query_threshold=SLOW_COMMAND_THRESHOLD, label="command")
+command_errors = {}  # (cog, command) -> count
+
+def record_command_error(cog, command):
+    key = (cog, command)
+    command_errors[key] = command_errors.get(key, 0) + 1
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes up from a fixed sleep."""
+    def __init__(self, interval=LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.histogram = LatencyHistogram()
+        self.last_lag = 0.0
+
+    async def run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            self.last_lag = lag
+            self.histogram.record(lag)
+
+loop_lag = LoopLagMonitor()
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+def _format(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+class _Writer:
+    def __init__(self):
+        self.lines = []
+        self._declared = set()
+
+    def declare(self, name, metric_type, help_text):
+        name = f"{METRIC_PREFIX}_{name}"
+        if name not in self._declared:
+            self._declared.add(name)
+            self.lines.append(f"# HELP {name} {help_text}")
+            self.lines.append(f"# TYPE {name} {metric_type}")
+        return name
+
+    def sample(self, name, value, **labels):
+        self.lines.append(f"{name}{_labels(**labels)} {_format(value)}")
+
+    def histogram(self, name, help_text, histogram, **labels):
+        name = self.declare(name, "histogram", help_text)
+        # Export one bucket per power of two; those boundaries are exact in our layout
+        cumulative = 0
+        for index, count in enumerate(histogram.counts):
+            cumulative += count
+            if index % SUB_BUCKETS == 0 and index < BUCKET_COUNT - 1:
+                self.sample(f"{name}_bucket", cumulative, **labels, le=_format(bucket_upper_bound(index)))
+        self.sample(f"{name}_bucket", histogram.count, **labels, le="+Inf")
+        self.sample(f"{name}_sum", histogram.total, **labels)
+        self.sample(f"{name}_count", histogram.count, **labels)
+
+    def gauge(self, name, help_text, value, **labels):
+        self.sample(self.declare(name, "gauge", help_text), value, **labels)
+
+    def counter(self, name, help_text, value, **labels):
+        self.sample(self.declare(f"{name}_total", "counter", help_text), value, **labels)
+
+    def render(self):
+        return "\n".join(self.lines) + "\n"
+
+def _split(key):
+    first, _, second = key.partition(".")
+    return first, second
+
+def is_authorized(authorization_header):
+    return not METRICS_TOKEN or authorization_header == f"Bearer {METRICS_TOKEN}"
+
+def _cache_stats():
+    """(cache name, stats) for every cache loaded in this process."""
+    caches = []
+    # Only report the balance cache if this process actually uses it
+    database = sys.modules.get("utils.database")
+    if database is not None:
+        caches.append(("balance", database.get_balance_cache_stats()))
+    cooldown_module = sys.modules.get("utils.cooldowns")
+    if cooldown_module is not None:
+        caches.append(("cooldowns", cooldown_module.cooldowns.stats()))
+
+    from utils.users import user_names
+    caches.append(("user_names", user_names.stats()))
+    return caches
+
+def render_metrics(bot=None):
+    """Render every metric available in this process in the Prometheus text format."""
+    from utils.mongo import command_stats as mongo_stats
+
+    out = _Writer()
+
+    commands = sorted(command_stats.histograms().items())
+    for key, histogram in commands:
+        cog, command = _split(key)
+        out.histogram("command_duration_seconds", "Command latency by cog and command.", histogram,
+                      cog=cog, command=command)
+    for (cog, command), count in sorted(command_errors.items()):
+        out.counter("command_errors", "Commands that raised an error.", count, cog=cog, command=command)
+
+    mongo = sorted(mongo_stats.histograms().items())
+    for key, histogram in mongo:
+        collection, operation = _split(key)
+        out.histogram("mongo_command_duration_seconds", "MongoDB command latency by collection and operation.",
+                      histogram, collection=collection, operation=operation)
+    for key, histogram in mongo:
+        collection, operation = _split(key)
+        out.counter("mongo_slow_commands", "MongoDB commands slower than the slow query threshold.",
+                    histogram.slow, collection=collection, operation=operation)
+
+    from utils.resilience import retrying
+    resilience = retrying.stats()
+    out.gauge("mongo_circuit_open", "1 while the MongoDB circuit breaker is rejecting calls.",
+              0 if resilience["circuit"]["state"] == "closed" else 1)
+    out.counter("mongo_circuit_rejected", "Calls rejected by the open MongoDB circuit breaker.",
+                resilience["circuit"]["rejected"])
+    out.counter("mongo_retry_budget_exhausted", "Retries skipped because the retry budget was spent.",
+                resilience["retry_budget"]["exhausted"])
+
+    # Each metric family has to be contiguous, so emit one family at a time across caches
+    caches = _cache_stats()
+    for cache, stats in caches:
+        out.counter("cache_hits", "Cache lookups served from memory.", stats["hits"], cache=cache)
+    for cache, stats in caches:
+        out.counter("cache_misses", "Cache lookups that missed.", stats["misses"], cache=cache)
+    for cache, stats in caches:
+        out.gauge("cache_entries", "Entries currently cached.", stats["size"], cache=cache)
+
+    from utils.rank_index import rank_index
+    out.gauge("rank_index_accounts", "Accounts held by the in-memory rank index.", rank_index.stats()["accounts"])
+
+    # Importing the catalog would connect to MongoDB and run startup migrations, so only read a loaded one
+    catalog_module = sys.modules.get("utils.shop_catalog")
+    if catalog_module is not None:
+        out.gauge("shop_catalog_version", "Restock generation of the in-memory shop catalog.",
+                  catalog_module.shop_catalog.version)
+
+    from utils.write_behind import write_behind
+    queue = write_behind.stats()
+    out.gauge("write_behind_queued", "Documents waiting in the write-behind queue.", queue["queued"])
+    out.counter("write_behind_written", "Documents flushed by the write-behind queue.", queue["written"])
+    out.counter("write_behind_dropped", "Documents dropped because the write-behind queue was full.", queue["dropped"])
+    out.counter("write_behind_failed", "Documents the write-behind queue failed to insert.", queue["failed"])
+
+    if loop_lag.histogram.count:
+        out.histogram("event_loop_lag_seconds", "How late the event loop woke from a timed sleep.", loop_lag.histogram)
+
+    from utils.watchdog import loop_watchdog
+    offenders = loop_watchdog.top_offenders(count=None)
+    for entry in offenders:
+        out.counter("event_loop_blocks", "Times a command blocked the event loop past the watchdog threshold.",
+                    entry["count"], cog=entry["cog"], command=entry["command"])
+    for entry in offenders:
+        out.counter("event_loop_blocked_seconds", "Seconds the event loop spent blocked, by command.",
+                    entry["total"], cog=entry["cog"], command=entry["command"])
+
+    if bot is not None:
+        latency = bot.latency
+        if latency is not None and math.isfinite(latency):
+            out.gauge("gateway_latency_seconds", "Discord gateway heartbeat latency.", latency)
+        out.gauge("guilds", "Guilds the bot is in.", len(bot.guilds))
+
+    return out.render()
+
+async def start_metrics_server(bot, port):
+    """Serve /metrics from the bot process with a minimal aiohttp server."""
+    from aiohttp import web
+
+    async def handle(request):
+        if not is_authorized(request.headers.get("Authorization")):
+            return web.Response(status=401)
+        return web.Response(text=render_metrics(bot), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", int(port)).start()
+    return runner
@@ -0,0 +1,112 @@
+"""
+Process-wide MongoClient registry.
+
+Every module gets its client (or database) from here instead of constructing its
+own MongoClient, so the process holds one connection pool and one set of monitor
+threads per URI. Clients are created lazily and don't connect until first use.
+
+With MONGO_BACKEND=memory every client is an in-memory stand-in instead
+(utils.memory_mongo) and MONGO_URI isn't needed; CI and benchmarks use this.
+"""
+import os
+import threading
+import time
+
+from pymongo import MongoClient, monitoring
+from dotenv import load_dotenv
+
+from utils.query_stats import QueryPerformanceTracker
+from utils.tracing import tracer
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+DATABASE_NAME = os.getenv("MONGO_DATABASE", "discord_economy")
+
+# "mongo" (default) or "memory"
+MONGO_BACKEND = os.getenv("MONGO_BACKEND", "mongo").lower()
+
+# Connection pool settings shared by every client in the process
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+
+_clients = {}
+_lock = threading.Lock()
+
+# Latency of every command any shared client sends, per collection.operation
+command_stats = QueryPerformanceTracker()
+
+class _CommandTimer(monitoring.CommandListener):
+    """Feeds command_stats from pymongo's command monitoring events."""
+    def __init__(self):
+        self._collections = {}  # request_id -> collection name
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if not isinstance(target, str):
+            # getMore names its collection separately; admin commands have none
+            target = event.command.get("collection", event.database_name)
+        self._collections[event.request_id] = target
+
+    def succeeded(self, event):
+        collection = self._collections.pop(event.request_id, "unknown")
+        duration = event.duration_micros / 1e6
+        command_stats.record_query(collection, event.command_name, duration)
+        tracer.add_span(f"mongo {event.command_name} {collection}", time.perf_counter() - duration, duration)
+
+    def failed(self, event):
+        collection = self._collections.pop(event.request_id, "unknown")
+        command_stats.record_query(collection, f"{event.command_name}_error", event.duration_micros / 1e6)
+
+_command_timer = _CommandTimer()
+
+def uses_memory_backend():
+    return MONGO_BACKEND == "memory"
+
+def require_mongo_uri():
+    """Fail fast at startup when a real MongoDB is needed but not configured."""
+    if not MONGO_URI and not uses_memory_backend():
+        raise Exception("MONGO_URI environment variable not found")
+
+def get_client(uri=None):
+    """Get the shared MongoClient for a URI (MONGO_URI by default), creating it on first use."""
+    if uses_memory_backend():
+        # One in-memory deployment per process, whatever URI was asked for
+        uri = "memory"
+    uri = uri or MONGO_URI
+    if not uri:
+        raise Exception("MONGO_URI environment variable not found")
+
+    with _lock:
+        client = _clients.get(uri)
+        if client is None and uses_memory_backend():
+            from utils.memory_mongo import MemoryClient
+            client = _clients[uri] = MemoryClient(event_listeners=[_command_timer])
+        if client is None:
+            client = MongoClient(
+                uri,
+                connect=False,                      # Connect lazily on the first operation
+                serverSelectionTimeoutMS=5000,      # 5 second timeout for server selection
+                connectTimeoutMS=10000,             # 10 second timeout for initial connection
+                socketTimeoutMS=45000,              # 45 second timeout for socket operations
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                maxIdleTimeMS=60000,                # 1 minute maximum idle time
+                waitQueueTimeoutMS=5000,            # 5 second timeout for waiting in queue
+                retryWrites=True,
+                retryReads=True,
+                event_listeners=[_command_timer]
+            )
+            _clients[uri] = client
+        return client
+
+def get_database(name=DATABASE_NAME, uri=None):
+    """Get a database handle backed by the shared client."""
+    return get_client(uri)[name]
+
+def close_all():
+    """Close every registered client; used on shutdown."""
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
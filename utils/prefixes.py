@@ -0,0 +1,96 @@
+"""
+In-memory guild prefix cache.
+
+Prefixes are loaded once at startup, filled lazily for guilds we haven't seen and
+updated in place when a prefix is changed, so resolving the prefix for a message
+does no database I/O in steady state. Every write stamps the document with the
+server's `updated_at`, which other bot processes poll for to pick up changes.
+"""
+import asyncio
+import os
+
+from utils.database_async import run_in_db_executor
+from utils.mongo import get_database
+
+DEFAULT_PREFIX = "d!"
+
+# How often (seconds) to poll for prefix changes made by other processes
+PREFIX_SYNC_INTERVAL = int(os.getenv("PREFIX_SYNC_INTERVAL", "30"))
+
+_PROJECTION = {"_id": 0, "guild_id": 1, "prefix": 1, "updated_at": 1}
+
+class PrefixCache:
+    def __init__(self):
+        self._prefixes = {}     # guild_id -> prefix
+        self._last_sync = None  # Newest updated_at stamp seen so far
+
+    @property
+    def collection(self):
+        return get_database().prefixes
+
+    def _remember(self, doc):
+        self._prefixes[doc["guild_id"]] = doc.get("prefix") or DEFAULT_PREFIX
+        updated_at = doc.get("updated_at")
+        if updated_at is not None and (self._last_sync is None or updated_at > self._last_sync):
+            self._last_sync = updated_at
+
+    async def load(self):
+        """Load every stored prefix; called once at startup."""
+        def fetch():
+            self.collection.create_index([("guild_id", 1)])
+            self.collection.create_index([("updated_at", 1)])
+            return list(self.collection.find({}, _PROJECTION))
+
+        for doc in await run_in_db_executor(fetch):
+            self._remember(doc)
+
+    def get(self, guild_id):
+        """Cached prefix for a guild, or None if it hasn't been resolved yet."""
+        if guild_id is None:
+            return DEFAULT_PREFIX
+        return self._prefixes.get(str(guild_id))
+
+    async def resolve(self, guild_id):
+        """Prefix for a guild, hitting the database only the first time a guild is seen."""
+        prefix = self.get(guild_id)
+        if prefix is not None:
+            return prefix
+
+        doc = await run_in_db_executor(self.collection.find_one, {"guild_id": str(guild_id)}, _PROJECTION)
+        if doc:
+            self._remember(doc)
+        else:
+            self._prefixes[str(guild_id)] = DEFAULT_PREFIX
+        return self._prefixes[str(guild_id)]
+
+    async def set(self, guild_id, prefix):
+        """Persist a new prefix for a guild and update the cache."""
+        await run_in_db_executor(
+            self.collection.update_one,
+            {"guild_id": str(guild_id)},
+            {"$set": {"prefix": prefix}, "$currentDate": {"updated_at": True}},
+            upsert=True
+        )
+        self._prefixes[str(guild_id)] = prefix
+
+    async def sync(self):
+        """Pick up prefixes changed by other processes since the last sync."""
+        if self._last_sync is None:
+            query = {"updated_at": {"$exists": True}}
+        else:
+            query = {"updated_at": {"$gt": self._last_sync}}
+
+        docs = await run_in_db_executor(lambda: list(self.collection.find(query, _PROJECTION)))
+        for doc in docs:
+            self._remember(doc)
+
+    async def watch(self, interval=PREFIX_SYNC_INTERVAL):
+        """Background task that keeps the cache in step with other processes."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                print(f"Error syncing prefixes: {e}")
+
+prefix_cache = PrefixCache()
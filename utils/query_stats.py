@@ -0,0 +1,200 @@
+"""
+Low-overhead query latency tracking.
+
+Latencies are recorded into fixed log-scale histograms (8 buckets per power of
+two, ~9% relative error, from 1us to ~4.5min) kept per collection.operation and
+per thread, so the hot path is a few arithmetic operations on thread-local state
+with no lock and no allocation. Per-thread histograms are merged only when
+stats are read. Query details are captured lazily and only for slow queries.
+
+Overhead budget: record_query must stay under OVERHEAD_BUDGET_NS per call
+(see benchmarks/query_stats_overhead.py).
+"""
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger('database')
+
+# Histogram layout
+MIN_LATENCY = 1e-6   # seconds; everything faster lands in the first bucket
+SUB_BUCKETS = 8      # buckets per power of two
+OCTAVES = 28         # 1us * 2**28 ~= 268s
+BUCKET_COUNT = OCTAVES * SUB_BUCKETS + 2  # plus underflow and overflow buckets
+
+SLOW_QUERY_THRESHOLD = float(os.getenv("SLOW_QUERY_THRESHOLD", "0.5"))  # seconds
+SLOW_QUERY_LOG_SIZE = 100
+
+OVERHEAD_BUDGET_NS = 2000
+
+def bucket_index(seconds):
+    """Histogram bucket for a latency in seconds."""
+    if seconds < MIN_LATENCY:
+        return 0
+    mantissa, exponent = math.frexp(seconds / MIN_LATENCY)
+    index = (exponent - 1) * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS) + 1
+    return index if index < BUCKET_COUNT else BUCKET_COUNT - 1
+
+def bucket_upper_bound(index):
+    """Largest latency (seconds) that falls into a bucket."""
+    if index == 0:
+        return MIN_LATENCY
+    if index == BUCKET_COUNT - 1:
+        return math.inf
+    octave, sub = divmod(index - 1, SUB_BUCKETS)
+    return MIN_LATENCY * 2 ** octave * (1 + (sub + 1) / SUB_BUCKETS)
+
+class LatencyHistogram:
+    __slots__ = ("counts", "count", "total", "min", "max", "slow")
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.slow = 0
+
+    def record(self, seconds):
+        self.counts[bucket_index(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            if count:
+                self.counts[i] += count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.slow += other.slow
+
+    def percentile(self, q):
+        """Latency (seconds) below which a fraction `q` of samples fall, to bucket precision."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bucket_upper_bound(i), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_time": self.total,
+            "avg_time": self.total / self.count if self.count else 0.0,
+            "min_time": self.min if self.count else 0.0,
+            "max_time": self.max,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "p999": self.percentile(0.999),
+            "slow_queries": self.slow
+        }
+
+class QueryPerformanceTracker:
+    """
+    Track and analyze database query performance.
+
+    Also used for any other keyed latency (e.g. commands per cog); `label`
+    names what is being timed in slow-sample warnings.
+    """
+    def __init__(self, slow_query_threshold=SLOW_QUERY_THRESHOLD, slow_log_size=SLOW_QUERY_LOG_SIZE, label="query"):
+        self.slow_query_threshold = slow_query_threshold
+        self.label = label
+        self.started_at = time.time()
+        self._local = threading.local()
+        self._shards = []            # Each thread's {(collection, operation): LatencyHistogram}
+        self._shards_lock = threading.Lock()
+        self._slow_log = deque(maxlen=slow_log_size)
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def record_query(self, collection, operation, duration, query_details=None):
+        """
+        Record a database query for performance tracking.
+
+        Args:
+            collection: Collection name
+            operation: Operation type (find, update, insert, etc.)
+            duration: Query duration in seconds
+            query_details: Optional dict, or a callable returning one, describing
+                the query. It is only evaluated for slow queries.
+        """
+        shard = self._shard()
+        key = (collection, operation)
+        histogram = shard.get(key)
+        if histogram is None:
+            histogram = shard[key] = LatencyHistogram()
+        histogram.record(duration)
+
+        if duration > self.slow_query_threshold:
+            histogram.slow += 1
+            details = query_details() if callable(query_details) else query_details
+            self._slow_log.append({
+                "query": f"{collection}.{operation}",
+                "duration": duration,
+                "details": details,
+                "timestamp": time.time()
+            })
+            logger.warning(
+                f"Slow {self.label}: {collection}.{operation} took {duration:.4f}s. "
+                f"Details: {details or 'not provided'}"
+            )
+
+    def histograms(self):
+        """Merge every thread's histograms into {"collection.operation": LatencyHistogram}."""
+        with self._shards_lock:
+            shards = list(self._shards)
+
+        merged = {}
+        for shard in shards:
+            for (collection, operation), histogram in list(shard.items()):
+                key = f"{collection}.{operation}"
+                if key not in merged:
+                    merged[key] = LatencyHistogram()
+                merged[key].merge(histogram)
+        return merged
+
+    def get_stats(self):
+        """Get all recorded query statistics, including latency percentiles."""
+        return {key: histogram.summary() for key, histogram in self.histograms().items()}
+
+    def get_slow_queries(self):
+        """Get statistics for operations that have had slow queries only."""
+        return {key: stats for key, stats in self.get_stats().items() if stats["slow_queries"] > 0}
+
+    def get_recent_slow_queries(self):
+        """The most recent slow queries with their captured details, newest last."""
+        return list(self._slow_log)
+
+    def reset_stats(self):
+        """Reset all statistics."""
+        with self._shards_lock:
+            for shard in self._shards:
+                shard.clear()
+        self._slow_log.clear()
+        self.started_at = time.time()
+
+    def rate(self):
+        """Average recorded operations per second since creation (or the last reset)."""
+        elapsed = time.time() - self.started_at
+        total = sum(histogram.count for histogram in self.histograms().values())
+        return total / elapsed if elapsed > 0 else 0.0
@@ -0,0 +1,257 @@
+"""
+In-process networth rank index.
+
+Keeps every known account ordered by networth so leaderboards and "your rank"
+lookups are answered from memory without touching MongoDB. The index is rebuilt
+from `economies` at startup and kept current by the balance mutation path in
+utils.database. Guilds are tracked on demand as a subset index over their
+member ids.
+"""
+import threading
+from bisect import bisect_left, insort
+
+class _Fenwick:
+    """Fenwick (binary indexed) tree of block sizes for O(log n) prefix counts."""
+    def __init__(self, sizes):
+        self._tree = [0] + list(sizes)
+        for i in range(1, len(self._tree)):
+            parent = i + (i & -i)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[i]
+
+    def add(self, index, delta):
+        index += 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def prefix(self, index):
+        """Sum of the first `index` block sizes."""
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+class OrderedKeys:
+    """
+    Sorted list of unique keys split into bounded blocks.
+
+    Inserts and removals shift at most one block, and the position of a key is
+    found with a bisect over block maxima plus a Fenwick prefix count, so rank
+    queries stay logarithmic as the list grows.
+    """
+    BLOCK_SIZE = 512
+
+    def __init__(self, keys=()):
+        keys = sorted(keys)
+        self._blocks = [keys[i:i + self.BLOCK_SIZE] for i in range(0, len(keys), self.BLOCK_SIZE)]
+        self._reindex()
+
+    def _reindex(self):
+        self._maxes = [block[-1] for block in self._blocks]
+        self._sizes = _Fenwick(len(block) for block in self._blocks)
+        self._len = sum(len(block) for block in self._blocks)
+
+    def __len__(self):
+        return self._len
+
+    def add(self, key):
+        if not self._blocks:
+            self._blocks.append([key])
+            self._reindex()
+            return
+
+        index = min(bisect_left(self._maxes, key), len(self._blocks) - 1)
+        block = self._blocks[index]
+        insort(block, key)
+        self._maxes[index] = block[-1]
+        self._len += 1
+
+        if len(block) > 2 * self.BLOCK_SIZE:
+            self._blocks[index:index + 1] = [block[:self.BLOCK_SIZE], block[self.BLOCK_SIZE:]]
+            self._reindex()
+        else:
+            self._sizes.add(index, 1)
+
+    def remove(self, key):
+        index = bisect_left(self._maxes, key)
+        if index == len(self._blocks):
+            return False
+        block = self._blocks[index]
+        position = bisect_left(block, key)
+        if position == len(block) or block[position] != key:
+            return False
+
+        del block[position]
+        self._len -= 1
+        if block:
+            self._maxes[index] = block[-1]
+            self._sizes.add(index, -1)
+        else:
+            del self._blocks[index]
+            self._reindex()
+        return True
+
+    def count_before(self, key):
+        """Number of keys strictly less than `key`."""
+        index = bisect_left(self._maxes, key)
+        if index == len(self._blocks):
+            return self._len
+        return self._sizes.prefix(index) + bisect_left(self._blocks[index], key)
+
+    def head(self, count):
+        """The `count` smallest keys in order."""
+        result = []
+        for block in self._blocks:
+            if len(result) >= count:
+                break
+            result.extend(block[:count - len(result)])
+        return result
+
+def _key(user_id, networth):
+    # Ascending order of (-networth, user_id) is the leaderboard order
+    return (-networth, user_id)
+
+class RankIndex:
+    """
+    Networth ordering of every account, globally and per tracked guild.
+
+    Rank follows the leaderboard's definition: one plus the number of accounts
+    with strictly more money. Safe to update from database executor threads
+    while the event loop reads it.
+    """
+    def __init__(self):
+        self.ready = False
+        self._balances = {}      # user_id -> (pocket, bank)
+        self._global = OrderedKeys()
+        self._guilds = {}        # guild_id -> OrderedKeys over member accounts
+        self._members = {}       # guild_id -> set of member user_ids
+        self._user_guilds = {}   # user_id -> set of tracked guild_ids
+        self._lock = threading.Lock()
+
+    def load(self, docs):
+        """Replace the index with `docs` (economies documents with user_id, pocket and bank)."""
+        balances = {}
+        for doc in docs:
+            balances[str(doc["user_id"])] = (doc.get("pocket", 0), doc.get("bank", 0))
+
+        keys = [_key(user_id, pocket + bank) for user_id, (pocket, bank) in balances.items()]
+        with self._lock:
+            self._balances = balances
+            self._global = OrderedKeys(keys)
+            for guild_id, members in self._members.items():
+                self._guilds[guild_id] = self._build_guild(members)
+            self.ready = True
+
+    def _build_guild(self, members):
+        return OrderedKeys(
+            _key(user_id, sum(self._balances[user_id]))
+            for user_id in members if user_id in self._balances
+        )
+
+    def update(self, user_id, pocket, bank):
+        """Record a user's new pocket and bank balances."""
+        user_id = str(user_id)
+        with self._lock:
+            previous = self._balances.get(user_id)
+            if previous == (pocket, bank):
+                return
+            old_key = _key(user_id, sum(previous)) if previous is not None else None
+            new_key = _key(user_id, pocket + bank)
+            self._balances[user_id] = (pocket, bank)
+
+            indexes = [self._global] + [self._guilds[guild_id] for guild_id in self._user_guilds.get(user_id, ())]
+            for index in indexes:
+                if old_key is not None:
+                    index.remove(old_key)
+                index.add(new_key)
+
+    def track_guild(self, guild_id, member_ids):
+        """Start (or restart) maintaining a per-guild index for the given members."""
+        guild_id = str(guild_id)
+        members = {str(user_id) for user_id in member_ids}
+        with self._lock:
+            for user_id in self._members.get(guild_id, ()):
+                self._user_guilds[user_id].discard(guild_id)
+            for user_id in members:
+                self._user_guilds.setdefault(user_id, set()).add(guild_id)
+            self._members[guild_id] = members
+            self._guilds[guild_id] = self._build_guild(members)
+
+    def is_tracked(self, guild_id):
+        return str(guild_id) in self._guilds
+
+    def add_member(self, guild_id, user_id):
+        guild_id, user_id = str(guild_id), str(user_id)
+        with self._lock:
+            members = self._members.get(guild_id)
+            if members is None or user_id in members:
+                return
+            members.add(user_id)
+            self._user_guilds.setdefault(user_id, set()).add(guild_id)
+            if user_id in self._balances:
+                self._guilds[guild_id].add(_key(user_id, sum(self._balances[user_id])))
+
+    def remove_member(self, guild_id, user_id):
+        guild_id, user_id = str(guild_id), str(user_id)
+        with self._lock:
+            members = self._members.get(guild_id)
+            if members is None or user_id not in members:
+                return
+            members.discard(user_id)
+            self._user_guilds[user_id].discard(guild_id)
+            if user_id in self._balances:
+                self._guilds[guild_id].remove(_key(user_id, sum(self._balances[user_id])))
+
+    def forget_guild(self, guild_id):
+        guild_id = str(guild_id)
+        with self._lock:
+            for user_id in self._members.pop(guild_id, ()):
+                self._user_guilds[user_id].discard(guild_id)
+            self._guilds.pop(guild_id, None)
+
+    def _index(self, guild_id):
+        if guild_id is None:
+            return self._global
+        index = self._guilds.get(str(guild_id))
+        if index is None:
+            raise KeyError(f"Guild {guild_id} is not tracked")
+        return index
+
+    def top(self, count=10, guild_id=None):
+        """The richest `count` accounts as dicts with user_id, pocket, bank and networth."""
+        with self._lock:
+            result = []
+            for _, user_id in self._index(guild_id).head(count):
+                pocket, bank = self._balances[user_id]
+                result.append({"user_id": user_id, "pocket": pocket, "bank": bank, "networth": pocket + bank})
+            return result
+
+    def rank(self, user_id, guild_id=None):
+        """A user's 1-based rank, or None if the user has no account (or isn't in the guild)."""
+        user_id = str(user_id)
+        with self._lock:
+            index = self._index(guild_id)
+            balance = self._balances.get(user_id)
+            if balance is None:
+                return None
+            if guild_id is not None and user_id not in self._members[str(guild_id)]:
+                return None
+            # (-networth,) sorts before every key with that networth, so this counts richer accounts only
+            return index.count_before((-sum(balance),)) + 1
+
+    def networth(self, user_id):
+        with self._lock:
+            balance = self._balances.get(str(user_id))
+            return sum(balance) if balance is not None else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "accounts": len(self._global),
+                "guilds": len(self._guilds)
+            }
+
+rank_index = RankIndex()
@@ -0,0 +1,264 @@
+"""
+Retry policy and circuit breaker for MongoDB calls.
+
+Connection failures are retried with full-jitter exponential backoff, so many
+callers failing together don't retry together. Retries are limited in two ways:
+- A process-wide retry budget: retries can't exceed a fraction of recent calls
+  and hammer a struggling server.
+- A circuit breaker: after CIRCUIT_FAILURE_THRESHOLD consecutive connection
+  failures it opens, and every call fails fast with CircuitOpenError for
+  CIRCUIT_RESET_TIMEOUT seconds. Then a single probe call is let through
+  (half-open): success closes the circuit, failure opens it again.
+
+retrying() handles both kinds of functions:
+- Coroutine functions back off with asyncio.sleep.
+- Plain functions back off with time.sleep, but only off the event loop, e.g.
+  on the database thread pool. Called on the event loop thread they get a
+  single attempt, so an outage never freezes the bot.
+When retrying calls are nested, only the outermost one retries.
+
+Only reads and idempotent writes may be retried. A non-idempotent write ($inc,
+a bulk write, a transaction) can fail with a connection error after it has
+already been applied, and running it again would apply it twice. Those use
+single_attempt instead. It puts them behind the same circuit breaker but never
+re-runs them, and leaves retries to pymongo's retryWrites, which can tell
+whether the first attempt went through. run_in_db_executor() checks the
+`retries` attribute these wrappers carry to pick a policy.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import random
+import threading
+import time
+
+from pymongo import errors
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.1"))  # seconds
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "2.0"))    # seconds
+
+# Each call earns RETRY_BUDGET_RATIO retries, banked up to RETRY_BUDGET_MAX
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MAX = float(os.getenv("RETRY_BUDGET_MAX", "50"))
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "15"))  # seconds
+
+# True while inside a retrying call, so nested ones make a single attempt
+_in_retry = contextvars.ContextVar("in_retry", default=False)
+
+class CircuitOpenError(errors.ConnectionFailure):
+    """Raised instead of calling MongoDB while the circuit breaker is open."""
+    pass
+
+class RetryBudget:
+    """Token bucket limiting retries to a fraction of calls."""
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, max_tokens=RETRY_BUDGET_MAX):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+        self.exhausted = 0
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        """Take one retry from the budget; False if there is none left."""
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            self.exhausted += 1
+            return False
+
+    def stats(self):
+        with self._lock:
+            return {"tokens": self._tokens, "exhausted": self.exhausted}
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def before_call(self):
+        """
+        Raise CircuitOpenError unless a call may go through right now.
+
+        Returns True if the call is the half-open probe, which must end in
+        record_success, record_failure or release_probe.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True  # Let exactly one probe through
+                return True
+            self.rejected += 1
+            raise CircuitOpenError("MongoDB is unavailable; failing fast until it recovers")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print("MongoDB circuit closed")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def release_probe(self):
+        """Give up the probe slot without a verdict, e.g. when the probe was cancelled."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"MongoDB circuit opened after {self._failures} connection failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "failures": self._failures, "rejected": self.rejected}
+
+class RetryPolicy:
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY,
+                 budget=None, breaker=None, on_retry=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.on_retry = on_retry
+
+    def delay(self, attempt):
+        """Full-jitter backoff before retry number `attempt` (1-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _attempt(self, call):
+        """Run one guarded attempt; returns (result, None) or (None, connection error)."""
+        probe = self.breaker.before_call()
+        try:
+            result = call()
+        except CircuitOpenError:
+            raise
+        except errors.ConnectionFailure as e:
+            self.breaker.record_failure()
+            return None, e
+        except Exception:
+            self.breaker.record_success()  # The server answered; only connection failures trip the breaker
+            raise
+        except BaseException:
+            # Interrupted before an answer: free the probe or the circuit stays half-open for good
+            if probe:
+                self.breaker.release_probe()
+            raise
+        self.breaker.record_success()
+        return result, None
+
+    def _should_retry(self, func, attempt, error):
+        if attempt >= self.max_attempts or not self.budget.withdraw():
+            return False
+        if self.on_retry is not None:
+            self.on_retry(func, attempt, error)
+        return True
+
+    @property
+    def retries(self):
+        return self.max_attempts > 1
+
+    def __call__(self, func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _in_retry.get():
+                    return await func(*args, **kwargs)
+                token = _in_retry.set(True)
+                try:
+                    self.budget.deposit()
+                    attempt = 0
+                    while True:
+                        attempt += 1
+                        probe = self.breaker.before_call()
+                        try:
+                            result = await func(*args, **kwargs)
+                        except CircuitOpenError:
+                            raise
+                        except errors.ConnectionFailure as e:
+                            self.breaker.record_failure()
+                            if not self._should_retry(func, attempt, e):
+                                raise
+                            await asyncio.sleep(self.delay(attempt))
+                            continue
+                        except Exception:
+                            self.breaker.record_success()
+                            raise
+                        except BaseException:
+                            # Cancelled (timeout, shutdown) while probing: let the next call probe instead
+                            if probe:
+                                self.breaker.release_probe()
+                            raise
+                        self.breaker.record_success()
+                        return result
+                finally:
+                    _in_retry.reset(token)
+            async_wrapper.retries = self.retries
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _in_retry.get():
+                return func(*args, **kwargs)
+            token = _in_retry.set(True)
+            try:
+                self.budget.deposit()
+                try:
+                    asyncio.get_running_loop()
+                    on_event_loop = True
+                except RuntimeError:
+                    on_event_loop = False
+
+                attempt = 0
+                while True:
+                    attempt += 1
+                    result, error = self._attempt(lambda: func(*args, **kwargs))
+                    if error is None:
+                        return result
+                    # Never sleep on the event loop thread: fail fast and let the caller report it
+                    if on_event_loop or not self._should_retry(func, attempt, error):
+                        raise error
+                    time.sleep(self.delay(attempt))
+            finally:
+                _in_retry.reset(token)
+        wrapper.retries = self.retries
+        return wrapper
+
+    def stats(self):
+        return {"circuit": self.breaker.stats(), "retry_budget": self.budget.stats()}
+
+def _log_retry(func, attempt, error):
+    print(f"Connection failure in {func.__name__} (attempt {attempt}), retrying: {error}")
+
+# Shared by every MongoDB call in the process: one budget, one breaker
+mongo_breaker = CircuitBreaker()
+retrying = RetryPolicy(breaker=mongo_breaker, on_retry=_log_retry)
+# For non-idempotent writes: guarded by the breaker, never re-run
+single_attempt = RetryPolicy(max_attempts=1, budget=retrying.budget, breaker=mongo_breaker)
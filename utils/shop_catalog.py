@@ -0,0 +1,109 @@
+"""
+In-memory shop catalog.
+
+The current shop (items, stock and last restock time) is a single `shop`
+document. It is loaded once at startup and served from memory, so `shop` and
+`buy` don't read MongoDB. A background task restocks it every
+SHOP_RESTOCK_INTERVAL seconds and otherwise polls for changes made by other
+processes.
+
+Every restock bumps the document's `version`, and the write only applies if the
+stored version is still the one being replaced. When several processes try to
+restock at once, exactly one wins and the others load its result.
+"""
+import asyncio
+import os
+import time
+
+from utils.database_async import load_shop, restock_shop
+
+# How often (seconds) the shop is restocked
+SHOP_RESTOCK_INTERVAL = int(os.getenv("SHOP_RESTOCK_INTERVAL", "10800"))
+
+# How often (seconds) to poll for restocks and stock changes made by other processes
+SHOP_SYNC_INTERVAL = int(os.getenv("SHOP_SYNC_INTERVAL", "60"))
+
+class ShopCatalog:
+    def __init__(self, restock_interval=SHOP_RESTOCK_INTERVAL):
+        self.restock_interval = restock_interval
+        self._items = {}        # item id -> item, in display order
+        self.version = 0        # Restock generation of the loaded document
+        self.last_reset = None
+        self.ready = False
+        self._restock_lock = asyncio.Lock()
+
+    def _apply(self, doc):
+        self._items = {item["id"]: item for item in doc.get("items", [])}
+        self.version = doc.get("version", 0)
+        self.last_reset = doc.get("last_reset", 0)
+        self.ready = True
+
+    @property
+    def next_reset(self):
+        return (self.last_reset or time.time()) + self.restock_interval
+
+    def due(self):
+        return self.last_reset is None or time.time() >= self.next_reset
+
+    async def load(self):
+        """Load the current shop, stocking it first if it's missing or overdue."""
+        doc = await load_shop()
+        if doc is not None:
+            self._apply(doc)
+        if doc is None or self.due():
+            await self.restock()
+
+    async def items(self):
+        """Every item in the current shop, including sold-out ones."""
+        if not self.ready:
+            await self.load()
+        return list(self._items.values())
+
+    async def get(self, item_id):
+        """An item in the current shop, or None."""
+        if not self.ready:
+            await self.load()
+        return self._items.get(item_id)
+
+    def set_stock(self, item_id, stock):
+        """Mirror stock read back from MongoDB after a purchase."""
+        item = self._items.get(item_id)
+        if item is not None:
+            item["stock"] = stock
+
+    async def restock(self):
+        """Roll new stock, unless another process restocked since our last load."""
+        async with self._restock_lock:
+            doc = await restock_shop(self.version)
+            if doc is None:
+                # Lost the race; take the winner's stock
+                doc = await load_shop()
+            if doc is not None:
+                self._apply(doc)
+
+    async def sync(self):
+        doc = await load_shop()
+        if doc is not None:
+            self._apply(doc)
+
+    async def watch(self, interval=SHOP_SYNC_INTERVAL):
+        """Background task that restocks on schedule and picks up other processes' changes."""
+        while True:
+            await asyncio.sleep(max(1, min(interval, self.next_reset - time.time())))
+            try:
+                if self.due():
+                    await self.restock()
+                else:
+                    await self.sync()
+            except Exception as e:
+                print(f"Error refreshing shop: {e}")
+
+    def stats(self):
+        return {
+            "ready": self.ready,
+            "version": self.version,
+            "items": len(self._items),
+            "next_reset": self.next_reset if self.ready else None
+        }
+
+shop_catalog = ShopCatalog()
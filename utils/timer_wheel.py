@@ -0,0 +1,88 @@
+"""
+Hashed timer wheel for scheduling many short-lived game timers.
+
+One asyncio task ticks every `tick` seconds and walks a ring of slots, instead
+of every game holding its own sleeping task. A timer due in `t` ticks goes
+into the slot `t` positions ahead of the cursor, with a count of full turns to
+wait when `t` is longer than the ring. Scheduling and cancelling are O(1).
+Every timer that comes due on the same tick is handed to `on_expire` in a
+single call, so the owner can process them as one batch.
+
+Timers fire up to one tick late; that's the trade for not keeping a task per
+timer.
+"""
+import asyncio
+import itertools
+import math
+
+class TimerWheel:
+    def __init__(self, on_expire, tick=1.0, slots=64):
+        self.on_expire = on_expire  # async callable taking the list of expired items
+        self.tick = tick
+        self._slots = [{} for _ in range(slots)]  # handle -> [turns left, item]
+        self._where = {}                          # handle -> slot index
+        self._cursor = 0
+        self._next_tick = 0.0  # Loop time of the next cursor move
+        self._handles = itertools.count(1)
+        self._task = None
+
+    def __len__(self):
+        return len(self._where)
+
+    def schedule(self, delay, item):
+        """Hand `item` to on_expire after `delay` seconds; returns a handle for cancel()."""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done():
+            self._next_tick = loop.time() + self.tick
+            self._task = loop.create_task(self._run())
+
+        # Cursor moves needed so the slot is reached no earlier than `delay` from now
+        ticks = max(1, math.ceil((delay - (self._next_tick - loop.time())) / self.tick) + 1)
+        index = (self._cursor + ticks) % len(self._slots)
+        handle = next(self._handles)
+        self._slots[index][handle] = [(ticks - 1) // len(self._slots), item]
+        self._where[handle] = index
+        return handle
+
+    def cancel(self, handle):
+        """Drop a pending timer; returns False if it already fired or was cancelled."""
+        index = self._where.pop(handle, None)
+        if index is None:
+            return False
+        del self._slots[index][handle]
+        return True
+
+    def _advance(self):
+        """Move the cursor one slot and collect the items that came due."""
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        slot = self._slots[self._cursor]
+        due = []
+        for handle, entry in list(slot.items()):
+            if entry[0]:
+                entry[0] -= 1
+                continue
+            del slot[handle]
+            del self._where[handle]
+            due.append(entry[1])
+        return due
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._where:
+            await asyncio.sleep(max(0, self._next_tick - loop.time()))
+            self._next_tick += self.tick
+            due = self._advance()
+            if due:
+                # Don't hold up the wheel while the batch is processed
+                loop.create_task(self._fire(due))
+
+    async def _fire(self, due):
+        try:
+            await self.on_expire(due)
+        except Exception as e:
+            print(f"Error handling {len(due)} expired timers: {e}")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,216 @@
+"""
+Per-command latency tracing.
+
+Every command invocation gets a trace made of timed spans:
+- prefix: prefix resolution and command lookup
+- checks: checks, cooldowns and argument conversion
+- callback: the command body
+- db ...: database calls
+- discord ...: Discord REST calls
+
+The trace also records total time and time to first response. The bot starts
+and finishes traces (see ExtendedBot in bot.py). The database and HTTP layers
+add spans to whatever trace is current, found through a context variable, so
+nothing needs to be passed around.
+
+Every span is folded into per-command latency histograms for the dashboard's
+/commands page. A sampled fraction of whole traces (TRACE_SAMPLE_RATE) is also
+appended to a JSONL file (TRACE_EXPORT_PATH) by a background thread.
+"""
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from utils.query_stats import QueryPerformanceTracker
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "traces.jsonl")
+TRACE_EXPORT_MAX_BYTES = int(os.getenv("TRACE_EXPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_EXPORT_INTERVAL = 1.0  # seconds between file writes
+
+# Spans that aren't part of the summary breakdown
+TOTAL_SPAN = "total"
+FIRST_RESPONSE_SPAN = "first_response"
+
+_current = contextvars.ContextVar("trace", default=None)
+
+def _is_response(method, path):
+    """Whether a REST call delivers a command's reply."""
+    return method == "POST" and path.endswith(("/messages", "/callback"))
+
+class Trace:
+    __slots__ = ("kind", "cog", "command", "started", "started_at", "spans", "first_response", "sampled", "finished")
+
+    def __init__(self, kind, sampled):
+        self.kind = kind
+        self.cog = "none"
+        self.command = None
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.spans = [] if sampled else None  # (name, offset, duration, attrs)
+        self.first_response = None
+        self.sampled = sampled
+        self.finished = False
+
+    def to_dict(self, duration, error):
+        return {
+            "kind": self.kind,
+            "cog": self.cog,
+            "command": self.command,
+            "timestamp": self.started_at,
+            "duration": duration,
+            "first_response": self.first_response,
+            "error": error,
+            "spans": [
+                {"name": name, "offset": offset, "duration": span_duration, **attrs}
+                for name, offset, span_duration, attrs in self.spans
+            ]
+        }
+
+class _JsonlExporter:
+    """Appends sampled traces to a JSONL file from a background thread."""
+    def __init__(self, path=TRACE_EXPORT_PATH, max_bytes=TRACE_EXPORT_MAX_BYTES, max_queued=1000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._pending = deque(maxlen=max_queued)  # Oldest traces are dropped if the writer falls behind
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def export(self, record):
+        with self._cond:
+            self._pending.append(record)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(TRACE_EXPORT_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        with self._cond:
+            records = list(self._pending)
+            self._pending.clear()
+        if not records:
+            return
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+            with open(self.path, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, default=str) + "\n")
+        except OSError as e:
+            print(f"Failed to export traces to {self.path}: {e}")
+
+class Tracer:
+    def __init__(self, sample_rate=TRACE_SAMPLE_RATE, exporter=None):
+        self.sample_rate = sample_rate
+        self.exporter = exporter or _JsonlExporter()
+        # Latency per (command, span name), plus TOTAL_SPAN and FIRST_RESPONSE_SPAN
+        self.stats = QueryPerformanceTracker(slow_query_threshold=float("inf"), label="span")
+        self.traces = 0
+
+    def start(self, kind):
+        """Start a trace for the current task; returns it so the caller can fill in the command."""
+        trace = Trace(kind, sampled=random.random() < self.sample_rate)
+        _current.set(trace)
+        return trace
+
+    def current(self):
+        return _current.get()
+
+    def discard(self):
+        """Drop the current trace (e.g. a message that turned out not to be a command)."""
+        _current.set(None)
+
+    def add_span(self, name, start, duration, **attrs):
+        """Record a span that started at perf_counter() time `start` in the current trace."""
+        trace = _current.get()
+        if trace is None or trace.finished:
+            return
+        if trace.command is not None:
+            self.stats.record_query(trace.command, name, duration)
+        if trace.spans is not None:
+            trace.spans.append((name, start - trace.started, duration, attrs))
+
+    @contextmanager
+    def span(self, name, **attrs):
+        trace = _current.get()
+        if trace is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.perf_counter() - start, **attrs)
+
+    def mark_response(self):
+        """Note that the current command's reply has been delivered."""
+        trace = _current.get()
+        if trace is not None and trace.first_response is None:
+            trace.first_response = time.perf_counter() - trace.started
+
+    def finish(self, error=False):
+        trace = _current.get()
+        if trace is None or trace.finished or trace.command is None:
+            return
+        trace.finished = True
+        duration = time.perf_counter() - trace.started
+        self.traces += 1
+        self.stats.record_query(trace.command, TOTAL_SPAN, duration)
+        if trace.first_response is not None:
+            self.stats.record_query(trace.command, FIRST_RESPONSE_SPAN, trace.first_response)
+        if trace.sampled:
+            self.exporter.export(trace.to_dict(duration, error))
+
+    def instrument_http(self, http):
+        """Wrap a discord.py HTTPClient (or webhook adapter) so each REST call becomes a span."""
+        request = http.request
+
+        async def traced_request(route, *args, **kwargs):
+            if _current.get() is None:
+                return await request(route, *args, **kwargs)
+            with self.span(f"discord {route.method} {route.path}"):
+                result = await request(route, *args, **kwargs)
+            if _is_response(route.method, route.path):
+                self.mark_response()
+            return result
+
+        http.request = traced_request
+
+    def summary(self):
+        """
+        Per-command latency breakdown for the dashboard.
+
+        Returns:
+            List of {"command", "count", "total", "first_response", "spans"}
+            sorted by call count, where each latency entry is a histogram summary
+        """
+        commands = {}
+        for key, histogram in self.stats.histograms().items():
+            command, _, span = key.partition(".")
+            entry = commands.setdefault(command, {"command": command, "spans": {}})
+            if span == TOTAL_SPAN:
+                entry["total"] = histogram.summary()
+                entry["count"] = histogram.count
+            elif span == FIRST_RESPONSE_SPAN:
+                entry["first_response"] = histogram.summary()
+            else:
+                entry["spans"][span] = histogram.summary()
+
+        summary = [entry for entry in commands.values() if "total" in entry]
+        for entry in summary:
+            entry.setdefault("first_response", None)
+            # Slowest parts first
+            entry["spans"] = dict(sorted(entry["spans"].items(), key=lambda item: item[1]["total_time"], reverse=True))
+        summary.sort(key=lambda entry: entry["count"], reverse=True)
+        return summary
+
+tracer = Tracer()
@@ -0,0 +1,84 @@
+"""
+Display-name resolution for rendering lists of users.
+
+Names come from a bounded TTL cache, then discord.py's member/user caches, and
+only as a last resort from the REST API, with every missing user fetched
+concurrently instead of one request per row.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+# Name cache settings
+USER_NAME_CACHE_SIZE = int(os.getenv("USER_NAME_CACHE_SIZE", "5000"))
+USER_NAME_CACHE_TTL = float(os.getenv("USER_NAME_CACHE_TTL", "600"))  # seconds
+
+class UserNameResolver:
+    def __init__(self, max_size=USER_NAME_CACHE_SIZE, ttl=USER_NAME_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._names = OrderedDict()  # user_id -> (expires_at, name)
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, user_id):
+        entry = self._names.get(user_id)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._names[user_id]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._names.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def _put(self, user_id, name):
+        self._names[user_id] = (time.monotonic() + self.ttl, name)
+        self._names.move_to_end(user_id)
+        while len(self._names) > self.max_size:
+            self._names.popitem(last=False)
+
+    async def resolve(self, bot, user_ids, guild=None):
+        """
+        Look up names for several users at once.
+
+        Returns:
+            Dict of int user_id -> name; users that can't be fetched are left out
+        """
+        names = {}
+        missing = []
+        for user_id in map(int, user_ids):
+            name = self._get(user_id)
+            if name is None:
+                user = (guild.get_member(user_id) if guild else None) or bot.get_user(user_id)
+                if user is not None:
+                    name = user.name
+                    self._put(user_id, name)
+            if name is None:
+                missing.append(user_id)
+            else:
+                names[user_id] = name
+
+        if missing:
+            results = await asyncio.gather(*(bot.fetch_user(user_id) for user_id in missing), return_exceptions=True)
+            for user_id, user in zip(missing, results):
+                if isinstance(user, Exception):
+                    print(f"Error fetching user {user_id}: {user}")
+                    continue
+                names[user_id] = user.name
+                self._put(user_id, user.name)
+
+        return names
+
+    def stats(self):
+        return {"size": len(self._names), "hits": self.hits, "misses": self.misses}
+
+    def invalidate(self, user_id=None):
+        if user_id is None:
+            self._names.clear()
+        else:
+            self._names.pop(int(user_id), None)
+
+user_names = UserNameResolver()
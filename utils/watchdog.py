@@ -0,0 +1,155 @@
+"""
+Event-loop blocking detector.
+
+A heartbeat coroutine stamps the time every LOOP_WATCHDOG_INTERVAL seconds and a
+watcher thread checks the stamp. Once the heartbeat is more than
+LOOP_BLOCK_THRESHOLD seconds late the loop is blocked. The watcher then
+captures the loop thread's stack and finds out which command is running. When
+the loop recovers, it records the whole stall against that command.
+
+Commands are attributed through command_started(), which the bot calls from its
+before_invoke hook for prefix commands and its tree's interaction_check for
+slash commands. Stalls outside any command are attributed to the first frame
+under commands/ in the captured stack, or to "unknown".
+
+Opt-in: set LOOP_WATCHDOG=1.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+
+LOOP_WATCHDOG_ENABLED = os.getenv("LOOP_WATCHDOG", "").lower() in ("1", "true", "yes")
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.25"))  # seconds
+LOOP_WATCHDOG_INTERVAL = float(os.getenv("LOOP_WATCHDOG_INTERVAL", "0.05"))  # seconds
+BLOCKING_LOG_SIZE = 50
+
+_COMMANDS_DIR = os.sep + "commands" + os.sep
+
+class LoopWatchdog:
+    def __init__(self, threshold=LOOP_BLOCK_THRESHOLD, interval=LOOP_WATCHDOG_INTERVAL, log_size=BLOCKING_LOG_SIZE):
+        self.threshold = threshold
+        self.interval = interval
+        self.running = False
+        self._loop = None
+        self._loop_thread_id = None
+        self._beat = time.monotonic()
+        self._active = weakref.WeakKeyDictionary()  # task -> (cog, command)
+        self._lock = threading.Lock()
+        self._offenders = {}  # (cog, command) -> {"count", "total", "max", "stack"}
+        self._recent = deque(maxlen=log_size)
+
+    def command_started(self, cog, command):
+        """Attribute anything that blocks the current task to `cog`/`command`."""
+        if not self.running:
+            return
+        task = asyncio.current_task()
+        if task is not None:
+            self._active[task] = (cog, command)
+
+    def command_finished(self):
+        if not self.running:
+            return
+        task = asyncio.current_task()
+        if task is not None:
+            self._active.pop(task, None)
+
+    async def run(self):
+        """Heartbeat; also starts the watcher thread on first use."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        if not self.running:
+            self.running = True
+            threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _owner(self, frame):
+        owner = self._active.get(asyncio.current_task(self._loop))
+        if owner is not None:
+            return owner
+
+        # Not inside a tracked command: use the innermost frame from a cog module
+        innermost = None
+        while frame is not None:
+            if _COMMANDS_DIR in frame.f_code.co_filename and innermost is None:
+                innermost = frame
+            frame = frame.f_back
+        if innermost is not None:
+            module = os.path.splitext(os.path.basename(innermost.f_code.co_filename))[0]
+            return module, innermost.f_code.co_name
+        return "unknown", "unknown"
+
+    def _watch(self):
+        blocked = None  # (beat, owner, stack) while the loop is stalled
+        while True:
+            time.sleep(self.interval)
+            beat = self._beat
+
+            if blocked is not None:
+                if beat == blocked[0]:
+                    continue
+                # The loop is back; the stall lasted from the missed beat to now
+                self._record(blocked[1], max(0.0, beat - blocked[0] - self.interval), blocked[2])
+                blocked = None
+                continue
+
+            if time.monotonic() - beat < self.interval + self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame))
+            blocked = (beat, self._owner(frame), stack)
+            del frame
+
+    def _record(self, owner, duration, stack):
+        cog, command = owner
+        with self._lock:
+            entry = self._offenders.get(owner)
+            if entry is None:
+                entry = self._offenders[owner] = {"count": 0, "total": 0.0, "max": 0.0, "stack": stack}
+            entry["count"] += 1
+            entry["total"] += duration
+            if duration >= entry["max"]:
+                entry["max"] = duration
+                entry["stack"] = stack
+            self._recent.append({
+                "cog": cog,
+                "command": command,
+                "duration": duration,
+                "timestamp": time.time(),
+                "stack": stack
+            })
+        print(f"Event loop blocked for {duration:.3f}s in {cog}.{command}\n{stack}")
+
+    def top_offenders(self, count=10):
+        """Commands that blocked the loop the longest in total, worst first."""
+        with self._lock:
+            offenders = [
+                {"cog": cog, "command": command, **entry}
+                for (cog, command), entry in self._offenders.items()
+            ]
+        offenders.sort(key=lambda entry: entry["total"], reverse=True)
+        return offenders[:count]
+
+    def recent_blocks(self):
+        with self._lock:
+            return list(self._recent)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "running": self.running,
+                "threshold": self.threshold,
+                "blocks": sum(entry["count"] for entry in self._offenders.values()),
+                "blocked_seconds": sum(entry["total"] for entry in self._offenders.values())
+            }
+
+loop_watchdog = LoopWatchdog()
@@ -0,0 +1,143 @@
+"""
+Write-behind queue for non-critical inserts (feedback, server events, errors).
+
+Documents are buffered in memory and written by a background thread with
+insert_many(ordered=False) every WRITE_BEHIND_INTERVAL_MS milliseconds or as soon
+as WRITE_BEHIND_BATCH_SIZE documents are waiting, so telemetry never adds a
+round-trip to a user interaction. The buffer is bounded: when it is full new
+documents are dropped (and counted) rather than growing memory or blocking the
+event loop. Call close() on shutdown to flush whatever is still queued.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from pymongo import errors
+
+from utils.mongo import get_database
+
+WRITE_BEHIND_INTERVAL_MS = int(os.getenv("WRITE_BEHIND_INTERVAL_MS", "500"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000"))
+
+class WriteBehindQueue:
+    def __init__(self, interval_ms=WRITE_BEHIND_INTERVAL_MS, batch_size=WRITE_BEHIND_BATCH_SIZE,
+                 max_queued=WRITE_BEHIND_MAX_QUEUE, database=None):
+        self.interval = interval_ms / 1000
+        self.batch_size = batch_size
+        self.max_queued = max_queued
+        self._database = database
+        self._pending = deque()   # (collection name, document)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def database(self):
+        if self._database is None:
+            self._database = get_database()
+        return self._database
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, collection, document, timeout=0):
+        """
+        Queue a document for insertion into `collection`.
+
+        When the queue is full the flusher is woken and the caller waits up to
+        `timeout` seconds for room (never, by default, so event-loop callers
+        don't block). Returns False if the document had to be dropped.
+        """
+        with self._cond:
+            if self._closed:
+                self.dropped += 1
+                return False
+            self._ensure_thread()
+
+            deadline = time.monotonic() + timeout
+            while len(self._pending) >= self.max_queued:
+                self._cond.notify_all()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.dropped += 1
+                    return False
+                self._cond.wait(remaining)
+
+            self._pending.append((collection, document))
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    def _take(self):
+        with self._cond:
+            batch = list(self._pending)
+            self._pending.clear()
+            self._cond.notify_all()  # Wake producers waiting for room
+            return batch
+
+    def _write(self, batch):
+        by_collection = {}
+        for collection, document in batch:
+            by_collection.setdefault(collection, []).append(document)
+
+        for collection, documents in by_collection.items():
+            for start in range(0, len(documents), self.batch_size):
+                chunk = documents[start:start + self.batch_size]
+                try:
+                    result = self.database[collection].insert_many(chunk, ordered=False)
+                    self.written += len(result.inserted_ids)
+                except errors.BulkWriteError as e:
+                    # ordered=False keeps going past bad documents; count what landed
+                    inserted = e.details.get("nInserted", 0)
+                    self.written += inserted
+                    self.failed += len(chunk) - inserted
+                    print(f"Write-behind insert into {collection} partially failed: {e}")
+                except Exception as e:
+                    self.failed += len(chunk)
+                    print(f"Write-behind insert into {collection} failed: {e}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._pending) < self.batch_size:
+                    self._cond.wait(self.interval)
+                closed = self._closed
+            batch = self._take()
+            if batch:
+                self._write(batch)
+            if closed:
+                return
+
+    def flush(self):
+        """Write everything queued so far from the calling thread."""
+        batch = self._take()
+        if batch:
+            self._write(batch)
+
+    def close(self, timeout=10):
+        """Stop accepting documents and flush the rest; called on shutdown."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": len(self._pending),
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed
+            }
+
+write_behind = WriteBehindQueue()